@@ -0,0 +1,276 @@
+"""
+選手成績の逐次集計
+確定したレース結果（get_race_results の DataFrame）を1レースずつ取り込み、選手IDごとの
+通算・直近N走の成績（勝率・連対率・平均上がり・S/B回数・決まり手の内訳）を更新する。
+1レースの取り込みはそのレースの行数分の計算だけで、過去の結果を集計し直すことはない。
+同じレースを何度取り込んでも1回分としか数えない（race_id で重複除外）。
+
+取り込んだ結果は追記専用の JSON Lines に保存し、起動時に読み直す。保存するのは選手コード・選手名で、
+読み直すときは選手マスター索引（RiderIndex）で選手IDに戻す。索引を指定しない場合は集計ファイルの隣
+（rider_stats_riders.jsonl）に索引も保存するので、読み直した集計は保存前と同じ選手IDになる。
+
+使い方:
+    stats = RiderStats(path="rider_stats.jsonl")                       # 索引は rider_stats_riders.jsonl
+    scraper = KdreamsScraper(rider_stats=stats)                          # 結果取得のたびに自動で取り込む
+    card = stats.join(scraper.get_race_card(race_url))                 # 出走表に成績列を追加
+
+    python kdreams_aggregates.py                                       # モックサーバーで「読み直し = 取り込み時」を確認
+"""
+import bisect
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from kdreams_riders import RiderIndex
+
+
+KIMARITE = ('逃げ', '捲り', '差し', 'マーク')
+
+# join() で出走表に追加する列
+STAT_COLUMNS = ['出走数', '勝率', '2連対率', '3連対率', '平均上がり', 'S回数', 'B回数',
+                '直近勝率', '直近3連対率', '直近平均上がり'] + [f'決まり手_{k}' for k in KIMARITE]
+
+# 出走していない扱いの着順
+_NOT_STARTED = ('欠',)
+
+
+def _place(value) -> Optional[int]:
+    """着順 → int（失格・落車などは None）"""
+    text = str(value).strip()
+    return int(text) if text.isdigit() else None
+
+
+def _agari(value) -> Optional[float]:
+    try:
+        result = float(str(value).strip())
+    except ValueError:
+        return None
+    return result if result == result else None
+
+
+def index_path(path: str) -> str:
+    """集計ファイルに対応する選手マスター索引のパス（rider_stats.jsonl → rider_stats_riders.jsonl）"""
+    root, ext = os.path.splitext(path)
+    return f"{root}_riders{ext or '.jsonl'}"
+
+
+def _sort_key(race_id: str) -> str:
+    """直近N走の並び順（開催日 → race_id）"""
+    return f"{race_id[2:10]}{race_id}"
+
+
+class _Rider:
+    """1選手の集計値"""
+
+    __slots__ = ('races', 'wins', 'top2', 'top3', 'agari_sum', 'agari_n', 's', 'b', 'kimarite', 'recent')
+
+    def __init__(self):
+        self.races = 0
+        self.wins = 0
+        self.top2 = 0
+        self.top3 = 0
+        self.agari_sum = 0.0
+        self.agari_n = 0
+        self.s = 0
+        self.b = 0
+        self.kimarite: Dict[str, int] = {}
+        # 直近の (並び順キー, 着順, 上がり)
+        self.recent: List[Tuple[str, Optional[int], Optional[float]]] = []
+
+
+class RiderStats:
+    """
+    選手IDごとの成績集計（スレッドセーフ）
+    """
+
+    def __init__(self, rider_index: Optional[RiderIndex] = None, path: Optional[str] = None, window: int = 10):
+        """
+        Args:
+            rider_index: 選手IDの採番に使う索引（スクレイパーと同じものを渡す。省略時は path の隣に保存する索引、
+                         path もなければメモリ上のみの索引）
+            path: 永続化先（JSON Lines、省略時はメモリ上のみ）
+            window: 直近成績の対象レース数
+        """
+        if rider_index is None:
+            rider_index = RiderIndex(index_path(path) if path else None)
+        self.rider_index = rider_index
+        self.path = path
+        self.window = window
+        self._lock = threading.Lock()
+        self._riders: Dict[int, _Rider] = {}
+        self._races: set = set()
+        self._frame: Optional[pd.DataFrame] = None
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self) -> None:
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                entry = json.loads(line)
+                if entry['race_id'] in self._races:
+                    continue
+                rows = [(self.rider_index.get_id(code, name), place, agari, kimarite, sb)
+                        for code, name, place, agari, kimarite, sb in entry['rows']]
+                self._apply(entry['race_id'], rows)
+
+    # ── 取り込み ──────────────────────────────────────
+
+    def update(self, race_id: str, results: pd.DataFrame) -> bool:
+        """
+        確定した1レースの結果を取り込む
+
+        Args:
+            race_id: レースID（16桁）
+            results: get_race_results() の結果（選手ID列がなければ rider_index で採番する）
+
+        Returns:
+            取り込んだら True（結果が空・取り込み済みなら False）
+        """
+        race_id = str(race_id)
+        if results is None or results.empty or not race_id:
+            return False
+        with self._lock:
+            if race_id in self._races:
+                return False
+        if '選手ID' not in results.columns:
+            results = self.rider_index.assign(results.copy())
+
+        rows, records = [], []
+        for rider_id, code, name, place, agari, kimarite, sb in zip(
+                results['選手ID'],
+                results['選手コード'] if '選手コード' in results.columns else [''] * len(results),
+                results['選手名'], results['着順'], results['上がり'], results['決まり手'], results['S/B']):
+            if str(place).strip() in _NOT_STARTED:
+                continue
+            row = (_place(place), _agari(agari), str(kimarite or '').strip(), str(sb or '').strip())
+            rows.append((int(rider_id),) + row)
+            records.append([str(code or ''), str(name)] + list(row))
+
+        with self._lock:
+            if race_id in self._races:
+                return False
+            self._apply(race_id, rows)
+            if self.path:
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps({'race_id': race_id, 'rows': records}, ensure_ascii=False) + '\n')
+        return True
+
+    def _apply(self, race_id: str, rows: List[Tuple]) -> None:
+        self._races.add(race_id)
+        key = _sort_key(race_id)
+        for rider_id, place, agari, kimarite, sb in rows:
+            rider = self._riders.get(rider_id)
+            if rider is None:
+                rider = self._riders[rider_id] = _Rider()
+            rider.races += 1
+            if place is not None:
+                rider.wins += place == 1
+                rider.top2 += place <= 2
+                rider.top3 += place <= 3
+            if agari is not None:
+                rider.agari_sum += agari
+                rider.agari_n += 1
+            rider.s += 'S' in sb
+            rider.b += 'B' in sb
+            if kimarite:
+                rider.kimarite[kimarite] = rider.kimarite.get(kimarite, 0) + 1
+            bisect.insort(rider.recent, (key, place, agari))
+            if len(rider.recent) > self.window:
+                del rider.recent[0]
+        self._frame = None
+
+    # ── 参照 ──────────────────────────────────────────
+
+    def __len__(self) -> int:
+        return len(self._riders)
+
+    @property
+    def race_count(self) -> int:
+        return len(self._races)
+
+    def __contains__(self, race_id: str) -> bool:
+        return str(race_id) in self._races
+
+    def get(self, rider_id: int) -> Optional[Dict]:
+        """1選手の成績（STAT_COLUMNS の辞書、未集計なら None）"""
+        frame = self.to_frame()
+        if rider_id not in frame.index:
+            return None
+        return frame.loc[rider_id].to_dict()
+
+    def to_frame(self) -> pd.DataFrame:
+        """選手ID を索引にした成績表（取り込みがあるまで同じものを返す）"""
+        with self._lock:
+            if self._frame is not None:
+                return self._frame
+            records = []
+            for rider_id, rider in self._riders.items():
+                recent_places = [p for _, p, _ in rider.recent]
+                recent_agari = [a for _, _, a in rider.recent if a is not None]
+                record = {
+                    '選手ID': rider_id,
+                    '出走数': rider.races,
+                    '勝率': rider.wins / rider.races,
+                    '2連対率': rider.top2 / rider.races,
+                    '3連対率': rider.top3 / rider.races,
+                    '平均上がり': rider.agari_sum / rider.agari_n if rider.agari_n else None,
+                    'S回数': rider.s,
+                    'B回数': rider.b,
+                    '直近勝率': sum(p == 1 for p in recent_places) / len(recent_places),
+                    '直近3連対率': sum(p is not None and p <= 3 for p in recent_places) / len(recent_places),
+                    '直近平均上がり': sum(recent_agari) / len(recent_agari) if recent_agari else None,
+                }
+                for kimarite in KIMARITE:
+                    record[f'決まり手_{kimarite}'] = rider.kimarite.get(kimarite, 0)
+                records.append(record)
+            frame = pd.DataFrame(records, columns=['選手ID'] + STAT_COLUMNS).set_index('選手ID')
+            self._frame = frame
+            return frame
+
+    def join(self, card: pd.DataFrame) -> pd.DataFrame:
+        """
+        出走表に成績列（STAT_COLUMNS）を追加したDataFrameを返す
+
+        未集計の選手は 出走数 0、率・平均は NaN。
+        """
+        if card.empty or '選手ID' not in card.columns:
+            return card
+        joined = card.join(self.to_frame(), on='選手ID')
+        count_columns = ['出走数', 'S回数', 'B回数'] + [f'決まり手_{k}' for k in KIMARITE]
+        joined[count_columns] = joined[count_columns].fillna(0).astype('int64')
+        return joined
+
+
+if __name__ == "__main__":
+    import argparse
+    import contextlib
+    import io
+    import tempfile
+
+    from kdreams_mock_server import MockKdreamsServer
+    from kdreams_scraper import KdreamsScraper, RateLimiter
+
+    parser = argparse.ArgumentParser(description="ローカルモックサーバーの結果を取り込み、読み直した集計が取り込み時と一致するか確認する")
+    parser.add_argument("--venues", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory, MockKdreamsServer(venues=args.venues) as server:
+        path = os.path.join(directory, 'rider_stats.jsonl')
+        live = RiderStats(path=path)
+        scraper = KdreamsScraper(rate_limiter=RateLimiter(0.0), base_url=server.url, rider_stats=live)
+        with contextlib.redirect_stdout(io.StringIO()):
+            for venue in scraper.get_races('today'):
+                for race in scraper.get_all_races_from_venue(venue['url']):
+                    scraper.get_race_card(race['url'])
+                    scraper.get_race_results(race['url'])
+        reloaded = RiderStats(path=path)
+        same = reloaded.race_count == live.race_count and reloaded.to_frame().equals(live.to_frame())
+        print(f"{'✅' if same else '❌'} {live.race_count}レース / 選手 {len(live)}人 → 読み直し {len(reloaded)}人"
+              f"（{'一致' if same else '不一致'}）")
+        raise SystemExit(0 if same else 1)
@@ -4,11 +4,152 @@ Streamlitを使用したWebアプリケーション
 """
 import streamlit as st
 import pandas as pd
-from kdreams_scraper import KdreamsScraper
+from kdreams_scraper import KdreamsScraper, ResponseCache
+from kdreams_aggregates import STAT_COLUMNS, RiderStats
+from kdreams_parser import format_lines_text
+from kdreams_store import DataStore
+from kdreams_governor import Governor, request_context
+from kdreams_export import export_book
+from kdreams_live import VenueIndex, format_event
+from kdreams_prefetch import Prefetcher
+from kdreams_racebook import RaceBook
+import hashlib
 import io
+import os
+import tempfile
+import uuid
+
+
+# バージョン番号を上げると共有スクレイパーインスタンスを作り直す
+SCRAPER_VERSION = "4"
+
+# 共有ストアの上限（MB）と各データの有効期限（秒）
+STORE_MAX_MB = 512
+RACE_DATA_TTL = 300
+BULK_DATA_TTL = 600
+
+# 先読みしたページを再利用する期間（秒）
+RESPONSE_TTL = 300
+
+# Kドリームスへのリクエスト間隔（秒、全ユーザー・全プロセス合計）と、プロセス間で共有するロックファイル
+REQUEST_INTERVAL = 1.0
+GOVERNOR_LOCK_PATH = os.path.join(tempfile.gettempdir(), 'kdreams_governor.lock')
+
+# 開催場一覧のバックグラウンド更新間隔（秒）
+VENUE_REFRESH_INTERVAL = 60
+
+# 選手成績の集計（取得した結果を取り込み、再起動後も引き継ぐ。選手マスター索引は隣の *_riders.jsonl）
+RIDER_STATS_PATH = os.path.join(tempfile.gettempdir(), 'kdreams_rider_stats.jsonl')
+
+
+@st.cache_resource
+def get_governor() -> Governor:
+    """リクエスト総量の制御（同じロックファイルを使う全プロセスで予算を共有）"""
+    return Governor(min_interval=REQUEST_INTERVAL, lock_path=GOVERNOR_LOCK_PATH)
+
+
+@st.cache_resource
+def get_scraper(version: str) -> KdreamsScraper:
+    """全セッションで共有するスクレイパー（1プロセスに1つ）"""
+    return KdreamsScraper(rate_limiter=get_governor(), response_cache=ResponseCache(ttl=RESPONSE_TTL),
+                          rider_stats=RiderStats(path=RIDER_STATS_PATH))
+
+
+def _remove_export_file(key, value) -> None:
+    """ストアから外れたエクスポート（ZIP・Excel）の一時ファイルを削除する"""
+    if isinstance(key, tuple) and key and key[0] in ('bulk_zip', 'bulk_excel') and os.path.exists(value):
+        os.remove(value)
+
+
+@st.cache_resource
+def get_store() -> DataStore:
+    """全セッションで共有するデータストア（1プロセスに1つ）"""
+    return DataStore(max_bytes=STORE_MAX_MB * 1024 * 1024, on_remove=_remove_export_file)
+
+
+@st.cache_resource
+def get_venue_index(version: str) -> VenueIndex:
+    """全セッションで共有する開催場一覧（バックグラウンドで更新し続ける）"""
+    return VenueIndex(get_scraper(version), interval=VENUE_REFRESH_INTERVAL).start()
+
+
+@st.cache_resource
+def get_prefetcher(version: str) -> Prefetcher:
+    """選択中の開催場の先読みワーカー（1プロセスに1つ）"""
+    return Prefetcher(get_scraper(version)).start()
+
+
+@st.cache_resource
+def get_export_dir() -> str:
+    """ZIPエクスポートの書き出し先（1プロセスに1つ）"""
+    return tempfile.mkdtemp(prefix='kdreams_app_export_')
+
+
+def get_bulk_book(store: DataStore, bulk_key, generation: int, bulk_data) -> RaceBook:
+    """
+    一括取得データの RaceBook（一括取得データの世代ごとに1回だけ作り、全セッションで共有する）
+
+    一括取得データと同じ有効期限でストアに置くので、取得し直したデータには新しい RaceBook を作る。
+    """
+    return store.get_or_fetch(('bulk_book', bulk_key, generation), lambda: RaceBook.from_bulk(bulk_data),
+                              ttl=BULK_DATA_TTL)
+
+
+def _bulk_export_path(store: DataStore, kind: str, bulk_key, generation: int, write) -> str:
+    """
+    一括取得データのエクスポートファイルのパスを返す
+
+    一括取得データの世代ごとに1回だけ write(一時パス) で一時ファイルへ書き出し、以降は同じファイルを使う。
+    パスは一括取得データと同じ有効期限でストアに置き、ストアから外れたらファイルも削除する。
+    """
+    key = (kind, bulk_key, generation)
+    suffix = {'bulk_zip': 'zip', 'bulk_excel': 'xlsx'}[kind]
+
+    def _write() -> str:
+        digest = hashlib.sha1(repr(bulk_key).encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(get_export_dir(), f"{digest}-{generation}.{suffix}")
+        tmp_path = f"{path}.{os.getpid()}.tmp.{suffix}"
+        write(tmp_path)
+        os.replace(tmp_path, path)
+        return path
+
+    path = store.get_or_fetch(key, _write, ttl=BULK_DATA_TTL)
+    if not os.path.exists(path):
+        # 一時ディレクトリが掃除された場合は書き出し直す
+        store.discard(key)
+        path = store.get_or_fetch(key, _write, ttl=BULK_DATA_TTL)
+    return path
+
+
+def get_bulk_zip(store: DataStore, bulk_key, generation: int, book: RaceBook) -> str:
+    """一括取得データのZIP（開催場別CSV）のパスを返す（世代ごとに1回だけストリーミングで書き出す）"""
+    return _bulk_export_path(store, 'bulk_zip', bulk_key, generation,
+                             lambda path: export_book(book, path, fmt='csv'))
+
+
+def get_bulk_excel(store: DataStore, bulk_key, generation: int, bulk_data: dict) -> str:
+    """一括取得データの統合Excel（出走表・ライン情報・レース結果の3シート）のパスを返す（世代ごとに1回だけ書き出す）"""
+    def _write(path: str) -> None:
+        with pd.ExcelWriter(path, engine='openpyxl') as writer:
+            if not bulk_data['race_cards'].empty:
+                bulk_data['race_cards'].to_excel(writer, sheet_name='出走表', index=False)
+            if not bulk_data['lines_list'].empty:
+                bulk_data['lines_list'].to_excel(writer, sheet_name='ライン情報', index=False)
+            if not bulk_data['results_list'].empty:
+                bulk_data['results_list'].to_excel(writer, sheet_name='レース結果', index=False)
+
+    return _bulk_export_path(store, 'bulk_excel', bulk_key, generation, _write)
 
 
 def main():
+    # セッションごとにクライアントIDを振り、リクエストの送信枠をユーザー間で公平に割り当てる
+    if 'client_id' not in st.session_state:
+        st.session_state.client_id = uuid.uuid4().hex[:8]
+    with request_context(client=st.session_state.client_id):
+        render()
+
+
+def render():
     st.set_page_config(
         page_title="Kドリームス競輪データ取得",
         page_icon="🚴",
@@ -18,15 +159,15 @@ def main():
     st.title("🚴 Kドリームス競輪データスクレイピング")
     st.markdown("**当日のS級レースデータを取得・CSV出力**")
     
-    # セッション状態の初期化
-    # バージョン番号を上げると古いスクレイパーインスタンスをリセットする
-    SCRAPER_VERSION = "2"
-    if 'scraper' not in st.session_state or st.session_state.get('scraper_version') != SCRAPER_VERSION:
-        st.session_state.scraper = KdreamsScraper()
-        st.session_state.scraper_version = SCRAPER_VERSION
-
-    if 'race_data' not in st.session_state:
-        st.session_state.race_data = None
+    # 共有リソース（スクレイパー・データストア）
+    # セッションにはデータ本体ではなくストアのキーだけを保持する
+    scraper = get_scraper(SCRAPER_VERSION)
+    store = get_store()
+    venue_index = get_venue_index(SCRAPER_VERSION)
+    
+    for key_name in ('bulk_key', 'race_key'):
+        if key_name not in st.session_state:
+            st.session_state[key_name] = None
     
     # サイドバー: レース選択
     st.sidebar.header("📋 レース選択")
@@ -46,30 +187,56 @@ def main():
     st.sidebar.markdown("---")
     st.sidebar.markdown(f"### 📍 {date_option}のレース")
     
-    # レース一覧取得ボタン
-    if st.sidebar.button(f"🔄  {date_option}の開催場一覧を取得", use_container_width=True):
+    # 開催場一覧はバックグラウンドで更新されているインデックスから読む（通信なし）
+    if st.sidebar.button(f"🔄  {date_option}の開催場一覧を取得", use_container_width=True) or not venue_index.ready:
         with st.spinner("開催場一覧を取得中..."):
-            races = st.session_state.scraper.get_races(date_type)
-            st.session_state.races = races
-            st.session_state.current_date_type = date_type
-            if races:
-                venues = {}
-                for race in races:
-                    velodrome = race['velodrome']
-                    if velodrome not in venues:
-                        venues[velodrome] = []
-                    venues[velodrome].append(race)
-                st.session_state.venues = venues
-                st.sidebar.success(f"✅ {len(venues)}場の開催場を取得")
-            else:
-                st.sidebar.error("❌ レースが見つかりませんでした")
+            venue_index.refresh()
+    
+    venues = venue_index.by_velodrome(date_type)
+    if venue_index.ready:
+        if venues:
+            st.sidebar.caption(f"🕒 {venue_index.age:.0f}秒前に更新（{VENUE_REFRESH_INTERVAL}秒ごとに自動更新） / {len(venues)}場")
+        else:
+            st.sidebar.error("❌ レースが見つかりませんでした")
+    if venue_index.last_error:
+        st.sidebar.warning(f"⚠️ 開催場一覧の更新に失敗しました: {venue_index.last_error}")
+    
+    recent = [e for e in venue_index.recent_events if e['date_type'] == date_type]
+    if recent:
+        with st.sidebar.expander(f"🔔 状態の変化（{len(recent)}件）"):
+            for event in reversed(recent[-10:]):
+                st.markdown(f"- {format_event(event)}")
+    
+    # 全開催場一括取得ボタン
+    if venues:
+        if st.sidebar.button(f"🌐 全{len(venues)}場の全レースを一括取得", use_container_width=True):
+            venue_heads = [races[0] for races in venues.values()]
+            bulk_date_type = date_type
+            with st.spinner(f"全開催場のデータを取得中... ({len(venue_heads)}場)"):
+                progress_bar = st.progress(0)
+                
+                def _on_progress(done, total):
+                    progress_bar.progress(done / total if total else 1.0, text=f"{done}/{total} レース")
+                
+                st.session_state.bulk_key = ('bulk_all', bulk_date_type, tuple(v['url'] for v in venue_heads))
+                store.get_or_fetch(
+                    st.session_state.bulk_key,
+                    lambda: scraper.get_all_venues_data(
+                        bulk_date_type,
+                        venues=venue_heads,
+                        progress_callback=_on_progress
+                    ),
+                    ttl=BULK_DATA_TTL
+                )
+                st.session_state.race_key = None
+                st.rerun()
     
     # 2段階選択: 開催場 → レース
-    if 'venues' in st.session_state and st.session_state.venues:
+    if venues:
         st.sidebar.markdown("### ステップ1: 開催場を選択")
         
         venue_options = []
-        for velodrome, races in st.session_state.venues.items():
+        for velodrome, races in venues.items():
             grade = races[0]['grade']
             day = races[0].get('day', '')
             venue_options.append(f"{velodrome} ({grade}) {day}")
@@ -81,11 +248,18 @@ def main():
             key="venue_select"
         )
         
-        selected_venue_name = list(st.session_state.venues.keys())[selected_venue_idx]
-        venue_info = st.session_state.venues[selected_venue_name][0]
+        selected_venue_name = list(venues.keys())[selected_venue_idx]
+        venue_info = venues[selected_venue_name][0]
         
         # 全レースURLを生成（1R-12R）
-        all_races = st.session_state.scraper.get_all_races_from_venue(venue_info['url'])
+        all_races = scraper.get_all_races_from_venue(venue_info['url'])
+        
+        # 選んだ時点で全レースのページをバックグラウンドで先読みする
+        prefetcher = get_prefetcher(SCRAPER_VERSION)
+        prefetcher.prefetch_venue(venue_info['url'])
+        prefetch_status = prefetcher.status()
+        if prefetch_status['total']:
+            st.sidebar.caption(f"⚡ 先読み: {prefetch_status['done']}/{prefetch_status['total']}ページ")
         
         # 一括取得ボタン
         st.sidebar.markdown("---")
@@ -94,14 +268,14 @@ def main():
                 progress_container = st.empty()
                 progress_bar = progress_container.progress(0)
                 
-                bulk_data = st.session_state.scraper.get_venue_all_data(
-                    selected_venue_name,
-                    venue_info['url']
-                )
-                bulk_data['grade'] = venue_info['grade']
+                def _fetch_venue():
+                    bulk_data = scraper.get_venue_all_data(selected_venue_name, venue_info['url'])
+                    bulk_data['grade'] = venue_info['grade']
+                    return bulk_data
                 
-                st.session_state.bulk_data = bulk_data
-                st.session_state.race_data = None
+                st.session_state.bulk_key = ('bulk', venue_info['url'])
+                store.get_or_fetch(st.session_state.bulk_key, _fetch_venue, ttl=BULK_DATA_TTL)
+                st.session_state.race_key = None
                 
                 progress_bar.progress(100)
                 st.rerun()
@@ -130,84 +304,132 @@ def main():
             
             # データ取得ボタン（オッズ削除、ライン情報追加）
             if st.sidebar.button("📥 データを取得", use_container_width=True, type="primary"):
-                with st.spinner("データを取得中... (20〜30秒かかります)"):
-                    race_card = st.session_state.scraper.get_race_card(selected_race['url'])
-                    race_results = st.session_state.scraper.get_race_results(selected_race['url'])
-                    lines = st.session_state.scraper.get_race_lines(selected_race['url'])
-                    lines_text = st.session_state.scraper.get_race_lines_text(selected_race['url'])
+                def _fetch_race():
+                    # 出走表とラインは同じページから取り出す（racedetail・結果の2ページのみ取得）
+                    fetched = scraper.fetch_race(selected_race['url'], ('card', 'lines', 'results'))
+                    return {
+                        'race_card': fetched['card'],
+                        'race_results': fetched['results'],
+                        'lines': fetched['lines'],
+                        'lines_text': format_lines_text(fetched['lines']),
+                        'race_name': selected_race['name'],
+                        'race_url': selected_race['url']
+                    }
                 
-                st.session_state.race_data = {
-                    'race_card': race_card,
-                    'race_results': race_results,
-                    'lines': lines,
-                    'lines_text': lines_text,
-                    'race_name': selected_race['name'],
-                    'race_url': selected_race['url']
-                }
+                with st.spinner("データを取得中..."):
+                    st.session_state.race_key = ('race', selected_race['url'])
+                    store.get_or_fetch(st.session_state.race_key, _fetch_race, ttl=RACE_DATA_TTL)
                 
                 st.rerun()
     
     else:
         st.sidebar.info("👆 まず「本日のレース一覧を取得」ボタンを押してください")
     
+    # 共有キャッシュのメモリ使用状況
+    with st.sidebar.expander("🧠 共有キャッシュ"):
+        report = store.memory_report()
+        st.markdown(
+            f"**使用量:** {report['total_mb']:.1f} / {report['max_mb']:.0f} MB  \n"
+            f"**件数:** {report['entries']}件 / **ヒット率:** {report['hit_rate']:.0%} / **削除:** {report['evictions']}件"
+        )
+        if report['items']:
+            st.dataframe(pd.DataFrame(report['items']), use_container_width=True, hide_index=True)
+        governor_stats = get_governor().stats()
+        waiting = governor_stats['waiting']
+        st.caption(
+            f"🚦 リクエスト制御: {governor_stats['min_interval']:.1f}秒に1件"
+            f"{'（プロセス間で共有）' if governor_stats['shared'] else ''} / "
+            f"待機中 表示{waiting['interactive']}・一括{waiting['bulk']}・先読み{waiting['background']}"
+        )
+    
+    bulk_data, bulk_generation = store.lookup(st.session_state.bulk_key)
+    race_data = store.get(st.session_state.race_key)
+    
     # ──────────────────────────────────────────────────────────
     # メインエリア: 一括取得データ表示
     # ──────────────────────────────────────────────────────────
-    if 'bulk_data' in st.session_state and st.session_state.bulk_data:
-        bulk_data = st.session_state.bulk_data
-        
-        st.header(f"📦 {bulk_data['venue_name']} ({bulk_data['grade']}) - 一括取得データ")
+    if bulk_data:
+        book = get_bulk_book(store, st.session_state.bulk_key, bulk_generation, bulk_data)
+        grade_label = f" ({bulk_data['grade']})" if bulk_data['grade'] else ""
+        st.header(f"📦 {bulk_data['venue_name']}{grade_label} - 一括取得データ")
         
         # 統合Excelダウンロードボタン（上部に配置）
         st.markdown("### 📥 統合ダウンロード")
         
-        excel_buffer = io.BytesIO()
-        with pd.ExcelWriter(excel_buffer, engine='openpyxl') as writer:
-            if not bulk_data['race_cards'].empty:
-                bulk_data['race_cards'].to_excel(writer, sheet_name='出走表', index=False)
-            if not bulk_data['lines_list'].empty:
-                bulk_data['lines_list'].to_excel(writer, sheet_name='ライン情報', index=False)
-            if not bulk_data['results_list'].empty:
-                bulk_data['results_list'].to_excel(writer, sheet_name='レース結果', index=False)
-        
-        excel_data = excel_buffer.getvalue()
-        
-        col1, col2, col3 = st.columns([1, 2, 1])
+        col1, col2 = st.columns(2)
+        with col1:
+            # 統合Excelも世代ごとに1回だけ一時ファイルに書き出し、再実行のたびには作り直さない
+            excel_path = get_bulk_excel(store, st.session_state.bulk_key, bulk_generation, bulk_data)
+            with open(excel_path, 'rb') as excel_file:
+                st.download_button(
+                    label="📊 Excelファイルをダウンロード（出走表・ライン・結果統合）",
+                    data=excel_file,
+                    file_name=f"{bulk_data['venue_name']}_全レースデータ.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    use_container_width=True,
+                    type="primary"
+                )
         with col2:
-            st.download_button(
-                label="📊 Excelファイルをダウンロード（出走表・ライン・結果統合）",
-                data=excel_data,
-                file_name=f"{bulk_data['venue_name']}_全レースデータ.xlsx",
-                mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-                use_container_width=True,
-                type="primary"
-            )
+            # 開催場別CSVのZIPは一時ファイルに書き出したものをそのまま渡す
+            zip_path = get_bulk_zip(store, st.session_state.bulk_key, bulk_generation, book)
+            with open(zip_path, 'rb') as zip_file:
+                st.download_button(
+                    label="🗜️ ZIPファイルをダウンロード（開催場別CSV）",
+                    data=zip_file,
+                    file_name=f"{bulk_data['venue_name']}_全レースデータ.zip",
+                    mime="application/zip",
+                    use_container_width=True
+                )
         
         st.markdown("---")
         
-        tab1, tab2, tab3 = st.tabs(["🏁 出走表（全レース）", "🔗 ライン情報（全レース）", "🏆 結果（全レース）"])
+        # 開催場・レースで絞り込む（RaceBook の slice をそのまま表示するのでコピーは発生しない）
+        filter_col1, filter_col2 = st.columns(2)
+        with filter_col1:
+            venue_filter = st.selectbox("開催場", ["すべて"] + book.venues, key="bulk_venue_filter")
+        venue_filter = None if venue_filter == "すべて" else venue_filter
+        with filter_col2:
+            book_races = book.races_of(venue_filter) if venue_filter else []
+            race_filter = st.selectbox(
+                "レース",
+                [None] + [race_id for race_id, _ in book_races],
+                format_func=lambda race_id: "すべて" if race_id is None else dict(book_races)[race_id],
+                disabled=venue_filter is None,
+                key="bulk_race_filter"
+            )
+        scope_label = "全レース" if venue_filter is None else (venue_filter if race_filter is None else
+                                                               f"{venue_filter} {dict(book_races)[race_filter]}")
+
+        def book_table(name):
+            table = book.table(name, venue=venue_filter, race_id=race_filter if venue_filter else None)
+            return table.drop(['race_id']) if 'race_id' in table.column_names else table
+
+        tab1, tab2, tab3 = st.tabs([f"🏁 出走表（{scope_label}）", f"🔗 ライン情報（{scope_label}）", f"🏆 結果（{scope_label}）"])
         
         with tab1:
-            st.subheader("出走表データ（全レース統合）")
-            if not bulk_data['race_cards'].empty:
-                st.markdown(f"**取得データ数:** {len(bulk_data['race_cards'])}行")
-                st.dataframe(bulk_data['race_cards'], use_container_width=True, height=500)
+            st.subheader(f"出走表データ（{scope_label}）")
+            cards = book_table('card')
+            if cards.num_rows:
+                st.markdown(f"**取得データ数:** {cards.num_rows}行")
+                st.dataframe(cards, use_container_width=True, height=500)
             else:
                 st.warning("出走表データが取得できませんでした")
         
         with tab2:
-            st.subheader("ライン情報（全レース統合）")
-            if not bulk_data['lines_list'].empty:
-                st.markdown(f"**取得ライン数:** {len(bulk_data['lines_list'])}件")
-                st.dataframe(bulk_data['lines_list'], use_container_width=True, height=500)
+            st.subheader(f"ライン情報（{scope_label}）")
+            lines = book_table('lines')
+            if lines.num_rows:
+                st.markdown(f"**取得ライン数:** {lines.num_rows}件")
+                st.dataframe(lines, use_container_width=True, height=500)
             else:
                 st.warning("ライン情報が取得できませんでした")
         
         with tab3:
-            st.subheader("レース結果（全レース統合）")
-            if not bulk_data['results_list'].empty:
-                st.markdown(f"**取得データ数:** {len(bulk_data['results_list'])}行")
-                st.dataframe(bulk_data['results_list'], use_container_width=True, height=500)
+            st.subheader(f"レース結果（{scope_label}）")
+            results = book_table('results')
+            if results.num_rows:
+                st.markdown(f"**取得データ数:** {results.num_rows}行")
+                st.dataframe(results, use_container_width=True, height=500)
             else:
                 st.info("レース結果がまだ確定していないか、データが取得できませんでした")
         
@@ -215,14 +437,14 @@ def main():
         col1, col2, col3 = st.columns([2, 1, 1])
         with col3:
             if st.button("🗑️ データをクリア", use_container_width=True):
-                st.session_state.bulk_data = None
+                st.session_state.bulk_key = None
                 st.rerun()
     
     # ──────────────────────────────────────────────────────────
     # メインエリア: 個別レース表示
     # ──────────────────────────────────────────────────────────
-    if st.session_state.race_data:
-        data = st.session_state.race_data
+    if race_data:
+        data = race_data
         
         st.header(f"📊 {data['race_name']} - データ")
         
@@ -230,7 +452,7 @@ def main():
         
         # タブ1: 出走表
         with tab1:
-            st.subheader("出走表データ（19カラム）")
+            st.subheader(f"出走表データ（{len(data['race_card'].columns)}カラム）")
             if not data['race_card'].empty:
                 st.markdown(f"**取得選手数:** {len(data['race_card'])}名")
                 st.dataframe(data['race_card'], use_container_width=True, height=400)
@@ -252,6 +474,11 @@ def main():
                     with st.expander("📋 表をコピー（CSV形式）"):
                         st.caption("下のボックス右上のコピーアイコンをクリックしてコピーできます")
                         st.code(csv_data, language="csv")
+                
+                rider_stats = get_scraper(SCRAPER_VERSION).rider_stats
+                with st.expander(f"📈 選手成績（取得済みの結果 {rider_stats.race_count}レースから集計）"):
+                    enriched = rider_stats.join(data['race_card'])
+                    st.dataframe(enriched[['車番', '選手名'] + STAT_COLUMNS], use_container_width=True, hide_index=True)
             else:
                 st.warning("出走表データが取得できませんでした")
         
@@ -318,10 +545,10 @@ def main():
         col1, col2 = st.columns(2)
         with col2:
             if st.button("🗑️ データをクリア", use_container_width=True):
-                st.session_state.race_data = None
+                st.session_state.race_key = None
                 st.rerun()
     
-    elif not ('bulk_data' in st.session_state and st.session_state.bulk_data):
+    elif not bulk_data:
         st.info("👈 サイドバーから開催場とレースを選択してデータを取得してください")
         
         with st.expander("📖 使い方ガイド"):
@@ -335,7 +562,7 @@ def main():
             4. 「データを取得」ボタンをクリック
             
             **取得データ:**
-            - 出走表: 19カラムの詳細データ
+            - 出走表: 19カラムの詳細データ + 選手コード・選手ID
             - ライン情報: 並び予想（ライン番号・車番）
             - レース結果: 着順、車番、選手名、着差、上がり、決まり手、S/B
             
@@ -354,6 +581,13 @@ def main():
             
             ---
             
+            ### 方法3: 全開催場一括取得 🌐
+            1. サイドバーの「本日の開催場一覧を取得」ボタンをクリック
+            2. 「🌐 全○場の全レースを一括取得」ボタンをクリック
+            3. 全開催場のデータが「開催場」列付きで1つのExcelファイルに統合されます
+            
+            ---
+            
             ### ⚠️ 注意事項
             - 一括取得は2〜3分程度かかります
             - サーバーに過度な負荷をかけないよう、連続実行は避けてください
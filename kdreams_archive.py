@@ -0,0 +1,266 @@
+"""
+取得ページの生HTMLアーカイブ
+取得したページ本文をzstd圧縮して追記専用のセグメントファイルに保存し、
+race_id・ページ種別・取得時刻・位置を固定長の索引に記録する。
+読み出しは mmap で行い、ランダムアクセスと先頭からの高速な走査の両方に対応する。
+
+ディレクトリ構成:
+    index.bin          索引（1件32バイトの固定長レコード）
+    seg-00000.zst      セグメント（[URL長 u16][URL][zstd圧縮本文] の連結）
+    seg-00001.zst      ...
+"""
+import mmap
+import os
+import re
+import struct
+import threading
+import time
+from collections import namedtuple
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - 依存がない環境ではアーカイブ機能のみ無効
+    zstandard = None
+
+from kdreams_parser import (
+    parse_odds, parse_race_card, parse_race_lines, parse_race_results, parse_races,
+)
+
+
+# ページ種別コード
+PAGE_TYPES = {
+    'other': 0,
+    'top': 1,
+    'racecard': 2,
+    'racedetail': 3,
+    'result': 4,
+    'odds': 5,
+}
+PAGE_TYPE_NAMES = {code: name for name, code in PAGE_TYPES.items()}
+
+# 索引レコード: race_id(u64) 取得時刻(f64) オフセット(u64) 長さ(u32) セグメント番号(u16) ページ種別(u8) 予備(u8)
+INDEX_RECORD = struct.Struct('<QdQIHBB')
+FRAME_HEADER = struct.Struct('<H')
+
+IndexRecord = namedtuple('IndexRecord', ['race_id', 'timestamp', 'offset', 'length', 'segment', 'page_type'])
+
+_ID_RE = re.compile(r'/(racecard|raceresult|racedetail)/(\d+)')
+
+
+def classify_url(url: str) -> Tuple[int, str]:
+    """
+    URLから (race_id, ページ種別) を判定する
+
+    racecard / raceresult は開催ID（14桁）、racedetail はレースID（16桁）を race_id とする。
+    トップページなどIDを含まないページは race_id=0。
+    """
+    parts = urlsplit(url)
+    if parts.path in ('', '/'):
+        return 0, 'top'
+    m = _ID_RE.search(parts.path)
+    if not m:
+        return 0, 'other'
+    kind, page_id = m.group(1), int(m.group(2))
+    if kind != 'racedetail':
+        return page_id, 'racecard'
+    page_type = parse_qs(parts.query).get('pageType', [''])[0]
+    if page_type == 'result':
+        return page_id, 'result'
+    if page_type == 'odds' or '/odds/' in parts.path:
+        return page_id, 'odds'
+    return page_id, 'racedetail'
+
+
+def _require_zstd():
+    if zstandard is None:
+        raise ImportError("アーカイブには zstandard が必要です: pip install zstandard")
+
+
+def _segment_path(directory: str, segment: int) -> str:
+    return os.path.join(directory, f"seg-{segment:05d}.zst")
+
+
+class PageArchive:
+    """
+    追記専用のページアーカイブ（書き込み側、スレッドセーフ）
+
+    使い方:
+        archive = PageArchive("archive/")
+        scraper = KdreamsScraper(archive=archive)
+    """
+
+    def __init__(self, directory: str, segment_size: int = 256 * 1024 * 1024, level: int = 3):
+        """
+        Args:
+            directory: 保存先ディレクトリ（なければ作成）
+            segment_size: 1セグメントの上限サイズ（バイト、超えたら次のセグメントへ）
+            level: zstd圧縮レベル
+        """
+        _require_zstd()
+        self.directory = directory
+        self.segment_size = segment_size
+        self._compressor = zstandard.ZstdCompressor(level=level)
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+        # 既存の最後のセグメントから追記を再開
+        segments = sorted(int(name[4:9]) for name in os.listdir(directory)
+                          if name.startswith('seg-') and name.endswith('.zst'))
+        self._segment = segments[-1] if segments else 0
+        self._seg_file = open(_segment_path(directory, self._segment), 'ab')
+        self._index_file = open(os.path.join(directory, 'index.bin'), 'ab')
+
+    def append(self, url: str, body: bytes, timestamp: Optional[float] = None) -> IndexRecord:
+        """ページ本文を1件追記し、索引レコードを返す"""
+        race_id, page_type = classify_url(url)
+        url_bytes = url.encode('utf-8')[:0xFFFF]
+        frame = FRAME_HEADER.pack(len(url_bytes)) + url_bytes + self._compressor.compress(body)
+        timestamp = time.time() if timestamp is None else timestamp
+
+        with self._lock:
+            if self._seg_file.tell() > 0 and self._seg_file.tell() + len(frame) > self.segment_size:
+                self._seg_file.close()
+                self._segment += 1
+                self._seg_file = open(_segment_path(self.directory, self._segment), 'ab')
+            offset = self._seg_file.tell()
+            self._seg_file.write(frame)
+            self._seg_file.flush()
+            record = IndexRecord(race_id, timestamp, offset, len(frame), self._segment, PAGE_TYPES[page_type])
+            self._index_file.write(INDEX_RECORD.pack(*record, 0))
+            self._index_file.flush()
+        return record
+
+    def close(self) -> None:
+        with self._lock:
+            self._seg_file.close()
+            self._index_file.close()
+
+    def __enter__(self) -> 'PageArchive':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ArchiveReader:
+    """
+    アーカイブの読み出し側（索引・セグメントとも mmap）
+
+    get() で (race_id, ページ種別) の最新ページを取り出し、
+    iter_pages() / parse() で保存順に全ページを走査する。
+    """
+
+    def __init__(self, directory: str):
+        _require_zstd()
+        self.directory = directory
+        self._segments: Dict[int, mmap.mmap] = {}
+        self._local = threading.local()
+        self._index: Optional[mmap.mmap] = None
+        self._latest: Dict[Tuple[int, int], int] = {}
+        self.refresh()
+
+    def refresh(self) -> None:
+        """書き込み側で追記された分を読み込み直す"""
+        self.close()
+        path = os.path.join(self.directory, 'index.bin')
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        self._count = size // INDEX_RECORD.size
+        if self._count:
+            with open(path, 'rb') as f:
+                self._index = mmap.mmap(f.fileno(), self._count * INDEX_RECORD.size, access=mmap.ACCESS_READ)
+        self._latest = {}
+        for i, record in enumerate(self.records()):
+            self._latest[(record.race_id, record.page_type)] = i
+
+    def _decompressor(self):
+        # ZstdDecompressor はスレッド間で共有できないためスレッドごとに持つ
+        if not hasattr(self._local, 'dctx'):
+            self._local.dctx = zstandard.ZstdDecompressor()
+        return self._local.dctx
+
+    def _segment(self, segment: int) -> mmap.mmap:
+        mm = self._segments.get(segment)
+        if mm is None:
+            with open(_segment_path(self.directory, segment), 'rb') as f:
+                mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._segments[segment] = mm
+        return mm
+
+    def __len__(self) -> int:
+        return self._count
+
+    def record(self, i: int) -> IndexRecord:
+        return IndexRecord._make(INDEX_RECORD.unpack_from(self._index, i * INDEX_RECORD.size)[:6])
+
+    def records(self, page_type: Optional[str] = None) -> Iterator[IndexRecord]:
+        """索引レコードを保存順に返す（page_type 指定時はその種別のみ）"""
+        if not self._count:
+            return
+        code = PAGE_TYPES[page_type] if page_type else None
+        for fields in INDEX_RECORD.iter_unpack(self._index):
+            record = IndexRecord._make(fields[:6])
+            if code is None or record.page_type == code:
+                yield record
+
+    def read(self, record: IndexRecord) -> Tuple[str, bytes]:
+        """索引レコードが指すページの (URL, 本文) を返す"""
+        mm = self._segment(record.segment)
+        frame = memoryview(mm)[record.offset:record.offset + record.length]
+        (url_len,) = FRAME_HEADER.unpack_from(frame)
+        url = bytes(frame[FRAME_HEADER.size:FRAME_HEADER.size + url_len]).decode('utf-8')
+        body = self._decompressor().decompress(frame[FRAME_HEADER.size + url_len:])
+        frame.release()
+        return url, body
+
+    def get(self, race_id: int, page_type: str) -> Optional[bytes]:
+        """(race_id, ページ種別) の最新ページ本文（なければ None）"""
+        i = self._latest.get((int(race_id), PAGE_TYPES[page_type]))
+        if i is None:
+            return None
+        return self.read(self.record(i))[1]
+
+    def iter_pages(self, page_type: Optional[str] = None) -> Iterator[Tuple[IndexRecord, str, bytes]]:
+        """全ページを (索引レコード, URL, 本文) で保存順に返す"""
+        for record in self.records(page_type):
+            url, body = self.read(record)
+            yield record, url, body
+
+    def parse(self, page_type: str) -> Iterator[Tuple[IndexRecord, object]]:
+        """
+        指定種別の全ページを kdreams_parser で解析して返す
+
+        page_type:
+            "top" → parse_races, "racedetail" → parse_race_card,
+            "lines" → racedetailページを parse_race_lines, "result" → parse_race_results,
+            "odds" → parse_odds
+        """
+        source_type, parser = {
+            'top': ('top', parse_races),
+            'racedetail': ('racedetail', parse_race_card),
+            'lines': ('racedetail', parse_race_lines),
+            'result': ('result', parse_race_results),
+            'odds': ('odds', parse_odds),
+        }[page_type]
+        for record, _, body in self.iter_pages(source_type):
+            yield record, parser(body)
+
+    def race_ids(self, page_type: Optional[str] = None) -> List[int]:
+        """保存されている race_id の一覧（重複なし、昇順）"""
+        code = PAGE_TYPES[page_type] if page_type else None
+        return sorted({rid for rid, pt in self._latest if rid and (code is None or pt == code)})
+
+    def close(self) -> None:
+        for mm in self._segments.values():
+            mm.close()
+        self._segments = {}
+        if self._index is not None:
+            self._index.close()
+            self._index = None
+
+    def __enter__(self) -> 'ArchiveReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
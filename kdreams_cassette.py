@@ -0,0 +1,148 @@
+"""
+HTTPカセット（記録/再生）モジュール
+スクレイパーの全リクエスト/レスポンスをローカルファイルに記録し、
+ネットワークに接続せずに同じレスポンスを再生する
+"""
+import base64
+import gzip
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class CassetteMiss(requests.ConnectionError):
+    """再生モードで記録にないリクエストが来た場合の例外"""
+
+
+class Cassette:
+    """
+    リクエスト/レスポンスの記録ファイル
+
+    1行1レスポンスのJSON Lines形式（拡張子 .gz ならgzip圧縮）で保存する。
+    同じURLが複数回記録されている場合、再生時は記録順に返し、最後の1件を繰り返す。
+    """
+
+    def __init__(self, path: str, mode: str = "replay", latency: float = 0.0,
+                 jitter: float = 0.0, recorded_latency: bool = False):
+        """
+        Args:
+            path: カセットファイルのパス（.jsonl または .jsonl.gz）
+            mode: "record" (記録) または "replay" (再生)
+            latency: 再生時に1レスポンスごとに加える待ち時間（秒）
+            jitter: 再生時の待ち時間に加えるランダム幅（0〜jitter秒）
+            recorded_latency: Trueなら記録時の応答時間を再現する（latencyに加算）
+        """
+        if mode not in ("record", "replay"):
+            raise ValueError(f"不正なモード: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self.jitter = jitter
+        self.recorded_latency = recorded_latency
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict]] = defaultdict(list)
+        self._cursor: Dict[str, int] = defaultdict(int)
+
+        if mode == "replay":
+            self._load()
+        else:
+            # 記録モードは新規作成（既存の記録は上書き）
+            with self._open("wt"):
+                pass
+
+    def _open(self, mode: str):
+        if self.path.endswith(".gz"):
+            return gzip.open(self.path, mode, encoding="utf-8")
+        return open(self.path, mode, encoding="utf-8")
+
+    def _load(self) -> None:
+        with self._open("rt") as f:
+            for line in f:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    self._entries[entry["key"]].append(entry)
+        print(f"カセット読み込み: {sum(len(v) for v in self._entries.values())}件 ({self.path})")
+
+    @staticmethod
+    def make_key(method: str, url: str) -> str:
+        return f"{method.upper()} {url}"
+
+    def record(self, method: str, url: str, response: requests.Response) -> None:
+        """レスポンスを1件追記する（url はリダイレクト前のリクエストURL）"""
+        entry = {
+            "key": self.make_key(method, url),
+            "url": response.url,
+            "status": response.status_code,
+            "reason": response.reason,
+            "headers": dict(response.headers),
+            "encoding": response.encoding,
+            "elapsed": response.elapsed.total_seconds(),
+            "recorded_at": time.time(),
+            "body": base64.b64encode(response.content).decode("ascii"),
+        }
+        line = json.dumps(entry, ensure_ascii=False)
+        with self._lock:
+            self._entries[entry["key"]].append(entry)
+            with self._open("at") as f:
+                f.write(line + "\n")
+
+    def play(self, method: str, url: str) -> requests.Response:
+        """記録済みレスポンスを返す（記録がなければ CassetteMiss）"""
+        key = self.make_key(method, url)
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(f"カセットに記録がありません: {key}")
+            index = min(self._cursor[key], len(entries) - 1)
+            self._cursor[key] += 1
+            entry = entries[index]
+
+        delay = self.latency
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        if self.recorded_latency:
+            delay += entry.get("elapsed", 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry.get("reason", "")
+        response.headers = CaseInsensitiveDict(entry.get("headers", {}))
+        response.encoding = entry.get("encoding")
+        response.url = entry["url"]
+        response._content = base64.b64decode(entry["body"])
+        response.request = requests.Request(method.upper(), url).prepare()
+        return response
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._entries.values())
+
+
+class CassetteSession(requests.Session):
+    """
+    Cassette を通してリクエストを処理する requests.Session
+
+    記録モードでは通常通り送信してレスポンスを記録し、
+    再生モードではネットワークに一切接続せず記録から返す。
+    """
+
+    def __init__(self, cassette: Cassette):
+        super().__init__()
+        self.cassette = cassette
+
+    def request(self, method, url, params=None, **kwargs):
+        prepared_url = requests.Request(method.upper(), url, params=params).prepare().url
+        if self.cassette.mode == "replay":
+            return self.cassette.play(method, prepared_url)
+
+        response = super().request(method, url, params=params, **kwargs)
+        self.cassette.record(method, prepared_url, response)
+        return response
@@ -0,0 +1,214 @@
+"""
+3連単の期待値エンジン
+多数のレースのオッズと確率を (レース数, 9, 9, 9) の配列（[レース, 1着, 2着, 3着]、車番-1 が添字）にそろえ、
+期待値・ケリー比率・期待値上位の組み合わせを全レースまとめて計算する。レースや組み合わせのPythonループはない。
+
+確率はモデルの出力をそのまま渡すか、出走表の競走得点とライン構成（kdreams_formation）から
+Harville 式で作る。
+
+使い方:
+    data = scraper.fetch_venue(venue_url, parts={'card', 'lines', 'odds'})
+    top = evaluate(data['race_cards'], data['lines_list'], data['odds_list'], k=5)
+
+    races = race_index(cards)                    # 行番号 = 配列の行
+    odds = odds_tensor(odds_list, races)         # (N, 9, 9, 9)、オッズ未掲載は NaN
+    probs = harville(strengths(score_matrix(cards, races), formation_matrix(lines, races)))
+    ev = expected_value(probs, odds)
+"""
+from itertools import permutations
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from kdreams_features import race_keys
+from kdreams_formation import MAX_BIBS, from_lines_frame, line_ids
+
+
+# 3連単の全組み合わせ（車番-1、(504, 3)）と、1着・2着・3着が互いに異なるかのマスク (9, 9, 9)
+COMBOS = np.array(list(permutations(range(MAX_BIBS), 3)), dtype=np.int64)
+DISTINCT = np.zeros((MAX_BIBS,) * 3, dtype=bool)
+DISTINCT[COMBOS[:, 0], COMBOS[:, 1], COMBOS[:, 2]] = True
+
+
+def race_index(cards: pd.DataFrame) -> pd.DataFrame:
+    """出走表のレース識別列（開催場・レース）の一覧（行番号 = 配列の行）"""
+    keys = race_keys(cards)
+    return cards[keys].drop_duplicates().reset_index(drop=True)
+
+
+def _rows(df: pd.DataFrame, races: pd.DataFrame) -> np.ndarray:
+    """df の各行が races の何行目か（races にないレースは -1）"""
+    keys = list(races.columns)
+    row_of = races.assign(_row=np.arange(len(races)))
+    return df[keys].merge(row_of, on=keys, how='left')['_row'].fillna(-1).to_numpy(dtype=np.int64)
+
+
+def _parse_combinations(combinations: pd.Series) -> np.ndarray:
+    """'1-2-3' 形式の組み合わせを (M, 3) の float 配列にする（解釈できない行は NaN）"""
+    text = combinations.to_numpy(dtype=str)
+    if text.dtype.itemsize == 5 * 4:
+        # 全行が5文字以内なら、文字コードの配列として 0・2・4文字目を直接読む（正規表現なし）
+        codes = text.view(np.uint32).reshape(-1, 5).astype(np.int64)
+        digits = codes[:, [0, 2, 4]] - ord('0')
+        seps = codes[:, [1, 3]]
+        ok = ((digits >= 1) & (digits <= 9)).all(axis=1) & (seps > 0).all(axis=1) & \
+             ((seps < ord('0')) | (seps > ord('9'))).all(axis=1)
+        return np.where(ok[:, None], digits, np.nan)
+    parts = combinations.astype(str).str.extract(r'^(\d)\D+(\d)\D+(\d)$')
+    return parts.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+
+
+def odds_tensor(odds: pd.DataFrame, races: pd.DataFrame) -> np.ndarray:
+    """
+    人気順オッズ（レース識別列 + 組み合わせ '1-2-3' + オッズ）を (N, 9, 9, 9) の float 配列にする
+
+    オッズが掲載されていない組み合わせ・数値にならないオッズ（欠場など）は NaN。
+    """
+    out = np.full((len(races),) + (MAX_BIBS,) * 3, np.nan)
+    if odds is None or odds.empty:
+        return out
+    rows = _rows(odds, races)
+    bibs = _parse_combinations(odds['組み合わせ']) - 1
+    values = pd.to_numeric(odds['オッズ'].astype(str).str.replace(',', ''), errors='coerce').to_numpy()
+    valid = (rows >= 0) & ~np.isnan(values) & ~np.isnan(bibs).any(axis=1)
+    valid[valid] = ((bibs[valid] >= 0) & (bibs[valid] < MAX_BIBS)).all(axis=1)
+    bibs = bibs[valid].astype(np.int64)
+    out[rows[valid], bibs[:, 0], bibs[:, 1], bibs[:, 2]] = values[valid]
+    return out
+
+
+def score_matrix(cards: pd.DataFrame, races: pd.DataFrame, column: str = '競走得点') -> np.ndarray:
+    """出走表の数値列を (N, 9) の配列にする（欠車・数値でない値は NaN）"""
+    out = np.full((len(races), MAX_BIBS), np.nan)
+    rows = _rows(cards, races)
+    bibs = pd.to_numeric(cards['車番'], errors='coerce').to_numpy()
+    values = pd.to_numeric(cards[column], errors='coerce').to_numpy()
+    valid = (rows >= 0) & (bibs >= 1) & (bibs <= MAX_BIBS)
+    out[rows[valid], bibs[valid].astype(np.int64) - 1] = values[valid]
+    return out
+
+
+def formation_matrix(lines: pd.DataFrame, races: pd.DataFrame) -> np.ndarray:
+    """ライン情報（'7-1-3' 形式）を races の行順の (N, 9) の int8 配列にする（ライン情報がないレースは 0）"""
+    out = np.zeros((len(races), MAX_BIBS), dtype=np.int8)
+    if lines is None or lines.empty:
+        return out
+    line_races, formations = from_lines_frame(lines, keys=list(races.columns))
+    rows = _rows(line_races, races)
+    out[rows[rows >= 0]] = formations[rows >= 0]
+    return out
+
+
+def strengths(scores: np.ndarray, formations: Optional[np.ndarray] = None,
+              temperature: float = 5.0, line_weight: float = 0.5) -> np.ndarray:
+    """
+    競走得点（とライン構成）から各選手の強さ (N, 9) を作る（欠車は 0）
+
+    強さ = exp((得点 - レース平均) / temperature + line_weight × (所属ライン平均得点 - レース平均) / temperature)
+    ライン情報がない・単騎の選手は自分の得点をライン平均とする。
+    """
+    present = ~np.isnan(scores)
+    filled = np.where(present, scores, 0.0)
+    count = present.sum(axis=1, keepdims=True)
+    race_mean = np.divide(filled.sum(axis=1, keepdims=True), count, out=np.zeros_like(count, dtype=float), where=count > 0)
+    logit = (filled - race_mean) / temperature
+    if formations is not None and line_weight:
+        ids = line_ids(formations).astype(np.int64)
+        # (N, 9, 9): 同じラインの選手（出走している選手のみ）
+        same = (ids[:, :, None] == ids[:, None, :]) & (ids[:, :, None] > 0) & present[:, None, :]
+        line_count = same.sum(axis=2)
+        line_mean = np.where(line_count > 0, (same * filled[:, None, :]).sum(axis=2) / np.maximum(line_count, 1), filled)
+        logit = logit + line_weight * (line_mean - race_mean) / temperature
+    # レースごとに最大値を引いてからexp（オーバーフロー防止）
+    logit = np.where(present, logit, -np.inf)
+    peak = logit.max(axis=1, keepdims=True)
+    peak = np.where(np.isfinite(peak), peak, 0.0)
+    return np.where(present, np.exp(logit - peak), 0.0)
+
+
+def harville(strength: np.ndarray) -> np.ndarray:
+    """
+    強さ (N, 9) から Harville 式の3連単確率 (N, 9, 9, 9) を作る
+
+    P(i, j, k) = p_i × p_j / (1 - p_i) × p_k / (1 - p_i - p_j)、p = 強さ / レース内合計
+    """
+    total = strength.sum(axis=1, keepdims=True)
+    p = np.divide(strength, total, out=np.zeros_like(strength, dtype=float), where=total > 0)
+    p1 = p[:, :, None, None]
+    p2 = p[:, None, :, None]
+    p3 = p[:, None, None, :]
+    rest1 = 1.0 - p1
+    rest2 = 1.0 - p1 - p2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        probs = p1 * np.where(rest1 > 0, p2 / rest1, 0.0) * np.where(rest2 > 1e-12, p3 / rest2, 0.0)
+    return np.where(DISTINCT, np.nan_to_num(probs), 0.0)
+
+
+def expected_value(probs: np.ndarray, odds: np.ndarray) -> np.ndarray:
+    """1単位あたりの払戻期待値（= 確率 × オッズ、オッズなしは NaN）"""
+    return probs * odds
+
+
+def kelly(probs: np.ndarray, odds: np.ndarray) -> np.ndarray:
+    """
+    組み合わせごとに単独で賭けた場合のケリー比率 (p × o - 1) / (o - 1)（負なら 0、オッズなしは NaN）
+
+    複数の組み合わせに同時に賭ける場合の配分ではない。
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fraction = (probs * odds - 1.0) / (odds - 1.0)
+    return np.where(np.isnan(odds), np.nan, np.clip(np.nan_to_num(fraction, nan=0.0), 0.0, None))
+
+
+def top_k(races: pd.DataFrame, probs: np.ndarray, odds: np.ndarray, k: int = 5,
+          min_ev: Optional[float] = None) -> pd.DataFrame:
+    """
+    レースごとに期待値の高い組み合わせ上位 k 件
+
+    Returns:
+        レース識別列 + 順位, 組み合わせ, 確率, オッズ, 期待値, ケリー（オッズのない組み合わせは含めない）
+    """
+    n = len(races)
+    ev = expected_value(probs, odds).reshape(n, -1)
+    ranked = np.where(np.isnan(ev), -np.inf, ev)
+    k = min(k, ranked.shape[1])
+    if n == 0 or k <= 0:
+        return pd.DataFrame(columns=list(races.columns) + ['順位', '組み合わせ', '確率', 'オッズ', '期待値', 'ケリー'])
+    # 上位 k 件を選んでから、その中だけを並べ替える
+    part = np.argpartition(-ranked, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(ranked, part, axis=1), axis=1, kind='stable')
+    flat = np.take_along_axis(part, order, axis=1)
+
+    race_rows = np.repeat(np.arange(n), k)
+    flat = flat.ravel()
+    first, second, third = np.unravel_index(flat, (MAX_BIBS,) * 3)
+    frame = races.iloc[race_rows].reset_index(drop=True)
+    frame['順位'] = np.tile(np.arange(1, k + 1), n)
+    frame['組み合わせ'] = [f"{a}-{b}-{c}" for a, b, c in zip(first + 1, second + 1, third + 1)]
+    frame['確率'] = probs.reshape(n, -1)[race_rows, flat]
+    frame['オッズ'] = odds.reshape(n, -1)[race_rows, flat]
+    frame['期待値'] = ev[race_rows, flat]
+    frame['ケリー'] = kelly(frame['確率'].to_numpy(), frame['オッズ'].to_numpy())
+    frame = frame[frame['期待値'].notna()]
+    if min_ev is not None:
+        frame = frame[frame['期待値'] >= min_ev]
+    return frame.reset_index(drop=True)
+
+
+def evaluate(cards: pd.DataFrame, lines: pd.DataFrame, odds: pd.DataFrame,
+             probs: Optional[np.ndarray] = None, k: int = 5, min_ev: Optional[float] = None,
+             temperature: float = 5.0, line_weight: float = 0.5) -> pd.DataFrame:
+    """
+    一括取得データ（race_cards, lines_list, odds_list）から全レースの期待値上位 k 件を返す
+
+    Args:
+        probs: race_index(cards) の行順の (N, 9, 9, 9) 確率（省略時は競走得点+ライン構成の Harville 確率）
+    """
+    races = race_index(cards)
+    if probs is None:
+        probs = harville(strengths(score_matrix(cards, races), formation_matrix(lines, races),
+                                   temperature=temperature, line_weight=line_weight))
+    elif probs.shape != (len(races),) + (MAX_BIBS,) * 3:
+        raise ValueError(f"確率の形が不正です: {probs.shape}（{(len(races),) + (MAX_BIBS,) * 3} が必要）")
+    return top_k(races, probs, odds_tensor(odds, races), k=k, min_ev=min_ev)
@@ -0,0 +1,342 @@
+"""
+ストリーミングエクスポート
+開催場ごと・テーブルごと（出走表 / ライン情報 / レース結果）のCSVまたはParquetファイルを、
+データを全件メモリに載せずに少しずつ書き出す。
+出力先が .zip ならZIPに、それ以外ならディレクトリに書き出す。
+
+長時間のクロールには、テーブルごとに1ファイルへ行グループ単位で書き出す ParquetSink を使う。
+
+使い方:
+    with StreamingExporter("out.zip", fmt="csv") as exporter:
+        scraper.crawl(venues, exporter)
+    with ParquetSink("crawl/", flush_rows=50000) as sink:
+        scraper.crawl(venues, sink)
+"""
+import os
+import re
+import shutil
+import tempfile
+import zipfile
+from typing import Dict, Iterable, Optional, Tuple
+
+import pandas as pd
+
+
+# テーブル名（ファイル名）
+TABLES = {
+    'race_cards': '出走表',
+    'lines_list': 'ライン情報',
+    'results_list': 'レース結果',
+}
+
+_UNSAFE_RE = re.compile(r'[\\/:*?"<>|\s]+')
+
+
+def _safe_name(name: str) -> str:
+    return _UNSAFE_RE.sub('_', str(name)).strip('_') or '_'
+
+
+def _parquet_schema(df: pd.DataFrame):
+    """最初のチャンクから Parquet のスキーマを決める（全行が欠損の列は型が決まらないため文字列として扱う）"""
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(df, preserve_index=False)
+    return pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema]).remove_metadata()
+
+
+def _parquet_table(df: pd.DataFrame, schema, warned: set):
+    """
+    チャンクをファイルのスキーマに合わせて pyarrow の Table にする
+
+    スキーマにない列は書けないので落とし、ファイルごとに1回だけ警告する（warned に記録）。
+    文字列の列は、後のチャンクで数値などが入っていても文字列にそろえる
+    （最初のチャンクで全行が欠損だった列は、_parquet_schema() で文字列になっている）。
+    """
+    import pyarrow as pa
+
+    unknown = [c for c in df.columns if c not in schema.names and c not in warned]
+    if unknown:
+        warned.update(unknown)
+        print(f"⚠️ スキーマにない列を書き出せません（最初のチャンクになかった列）: {', '.join(map(str, unknown))}")
+    df = df.reindex(columns=schema.names)
+    for field in schema:
+        if pa.types.is_string(field.type) and df[field.name].dtype != object:
+            column = df[field.name]
+            df[field.name] = column.astype(object).where(column.isna(), column.astype(str))
+    return pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+
+
+class StreamingExporter:
+    """
+    開催場 × テーブル ごとのファイルにチャンク単位で追記するエクスポーター
+
+    CSVは追記モードで書き、ヘッダーは各ファイルの最初の書き込み時のみ出力する。
+    Parquetは pyarrow の ParquetWriter で1チャンク = 1行グループとして追記する。
+    ZIP出力時は一時ディレクトリに書き出し、close() でファイルごとにZIPへ格納する。
+    """
+
+    def __init__(self, dest: str, fmt: str = 'csv', encoding: str = 'utf-8-sig'):
+        """
+        Args:
+            dest: 出力先（.zip ならZIPファイル、それ以外はディレクトリ）
+            fmt: "csv" または "parquet"
+            encoding: CSVの文字コード（既定はExcelで文字化けしない utf-8-sig）
+        """
+        if fmt not in ('csv', 'parquet'):
+            raise ValueError(f"不正な形式: {fmt}")
+        self.dest = dest
+        self.fmt = fmt
+        self.encoding = encoding
+        self.is_zip = dest.lower().endswith('.zip')
+        self.directory = tempfile.mkdtemp(prefix='kdreams_export_') if self.is_zip else dest
+        os.makedirs(self.directory, exist_ok=True)
+        self._written: Dict[str, int] = {}
+        self._parquet_writers: Dict[str, object] = {}
+        self._dropped: Dict[str, set] = {}
+        self._closed = False
+
+    def _path(self, venue: Optional[str], table: str) -> str:
+        filename = f"{TABLES.get(table, table)}.{self.fmt}"
+        if venue:
+            return os.path.join(self.directory, _safe_name(venue), filename)
+        return os.path.join(self.directory, filename)
+
+    def write(self, table: str, df: pd.DataFrame, venue: Optional[str] = None) -> None:
+        """1チャンクを追記する（空のDataFrameは無視）"""
+        if df is None or df.empty:
+            return
+        path = self._path(venue, table)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        first = path not in self._written
+
+        if self.fmt == 'csv':
+            # utf-8-sig のBOMはファイル先頭にだけ書く
+            encoding = self.encoding if first else self.encoding.replace('-sig', '')
+            df.to_csv(path, mode='w' if first else 'a', header=first, index=False, encoding=encoding)
+        else:
+            import pyarrow.parquet as pq
+
+            writer = self._parquet_writers.get(path)
+            if writer is None:
+                writer = pq.ParquetWriter(path, _parquet_schema(df))
+                self._parquet_writers[path] = writer
+            writer.write_table(_parquet_table(df, writer.schema, self._dropped.setdefault(path, set())))
+
+        self._written[path] = self._written.get(path, 0) + len(df)
+
+    def write_race(self, item: Dict) -> None:
+        """
+        1レース分の出走表・ライン情報・レース結果を書き出す
+
+        Args:
+            item: KdreamsScraper.iter_races_data() が返す辞書
+        """
+        venue = item['venue_name']
+        if item.get('race_card') is not None:
+            self.write('race_cards', item['race_card'], venue)
+        if item.get('lines'):
+            self.write('lines_list', pd.DataFrame(item['lines']), venue)
+        if item.get('results') is not None:
+            self.write('results_list', item['results'], venue)
+
+    def write_bulk(self, bulk_data: Dict, chunk_rows: int = 5000) -> None:
+        """
+        一括取得データ（get_venue_all_data / get_all_venues_data の結果）を書き出す
+
+        「開催場」列があれば開催場ごとのファイルに分け、chunk_rows 行ずつ追記する。
+        """
+        for table in TABLES:
+            df = bulk_data.get(table)
+            if df is None or df.empty:
+                continue
+            if '開催場' in df.columns:
+                groups: Iterable[Tuple[str, pd.DataFrame]] = df.groupby('開催場', sort=False)
+            else:
+                groups = [(bulk_data.get('venue_name', ''), df)]
+            for venue, venue_df in groups:
+                for start in range(0, len(venue_df), chunk_rows):
+                    self.write(table, venue_df.iloc[start:start + chunk_rows], venue)
+
+    def write_book(self, book, chunk_rows: int = 5000) -> None:
+        """
+        RaceBook を開催場ごとのファイルに書き出す
+
+        開催場の行は RaceBook 内で連続しているため、グループ分けせずに slice を chunk_rows 行ずつ変換して追記する。
+        """
+        from kdreams_racebook import BULK_TABLES
+
+        for venue, tables in book.iter_venues():
+            for table, name in BULK_TABLES.items():
+                data = tables.get(name)
+                if data is None:
+                    continue
+                data = data.drop(['race_id'])
+                for start in range(0, data.num_rows, chunk_rows):
+                    self.write(table, data.slice(start, chunk_rows).to_pandas(), venue)
+
+    def close(self) -> str:
+        """書き出しを完了して出力先のパスを返す"""
+        if self._closed:
+            return self.dest
+        self._closed = True
+        for writer in self._parquet_writers.values():
+            writer.close()
+        self._parquet_writers = {}
+
+        if self.is_zip:
+            os.makedirs(os.path.dirname(os.path.abspath(self.dest)), exist_ok=True)
+            # zipfile.write はファイルを少しずつ読み込むため、ここでもメモリ使用量は一定
+            with zipfile.ZipFile(self.dest, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+                for path in sorted(self._written):
+                    zf.write(path, arcname=os.path.relpath(path, self.directory))
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+        print(f"✅ エクスポート完了: {self.dest} ({len(self._written)}ファイル, {sum(self._written.values())}行)")
+        return self.dest
+
+    @property
+    def files(self) -> Dict[str, int]:
+        """書き出したファイルと行数"""
+        return dict(self._written)
+
+    def __enter__(self) -> 'StreamingExporter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+class ParquetSink:
+    """
+    テーブルごとに1つのParquetファイルへ行グループ単位で書き出すシンク（長時間クロール用）
+
+    レースごとのデータはテーブル別のバッファに溜め、flush_rows 行を超えたら1つの行グループとして書き出す。
+    メモリ上に残るのは各テーブル最大 flush_rows 行分だけなので、クロールの長さに関係なくメモリ使用量は一定。
+    出力は <directory>/出走表.parquet などで、各行に「開催場」「レース」列が付く。
+    """
+
+    def __init__(self, directory: str, flush_rows: int = 50000, compression: str = 'zstd'):
+        """
+        Args:
+            directory: 出力先ディレクトリ
+            flush_rows: 行グループ1つあたりの行数（バッファがこの行数を超えたら書き出す）
+            compression: Parquetの圧縮方式
+        """
+        import pyarrow  # noqa: F401  pyarrow がなければここで ImportError にする
+
+        self.directory = directory
+        self.flush_rows = max(1, flush_rows)
+        self.compression = compression
+        os.makedirs(directory, exist_ok=True)
+        self._buffers: Dict[str, list] = {table: [] for table in TABLES}
+        self._buffered: Dict[str, int] = {table: 0 for table in TABLES}
+        self._writers: Dict[str, object] = {}
+        self._dropped: Dict[str, set] = {}
+        self.rows_written: Dict[str, int] = {table: 0 for table in TABLES}
+        self.row_groups = 0
+        self._closed = False
+
+    def path(self, table: str) -> str:
+        return os.path.join(self.directory, f"{TABLES.get(table, table)}.parquet")
+
+    def write(self, table: str, df: pd.DataFrame) -> None:
+        """行をバッファに追加する（flush_rows を超えたら書き出す）"""
+        if df is None or df.empty:
+            return
+        self._buffers[table].append(df)
+        self._buffered[table] += len(df)
+        if self._buffered[table] >= self.flush_rows:
+            self.flush(table)
+
+    def write_race(self, item: Dict) -> None:
+        """
+        1レース分の出走表・ライン情報・レース結果を追加する
+
+        Args:
+            item: KdreamsScraper.iter_races_data() が返す辞書
+        """
+        venue = item['venue_name']
+        if item.get('race_card') is not None:
+            self.write('race_cards', item['race_card'].assign(開催場=venue))
+        if item.get('lines'):
+            self.write('lines_list', pd.DataFrame(item['lines']).assign(開催場=venue))
+        if item.get('results') is not None:
+            self.write('results_list', item['results'].assign(開催場=venue))
+
+    def flush(self, table: Optional[str] = None) -> None:
+        """バッファの内容を行グループとして書き出す（table 省略時は全テーブル）"""
+        import pyarrow.parquet as pq
+
+        for name in ([table] if table else list(TABLES)):
+            if not self._buffers[name]:
+                continue
+            df = pd.concat(self._buffers[name], ignore_index=True)
+            # 「開催場」「レース」を先頭の列にそろえる
+            front = [c for c in ('開催場', 'レース') if c in df.columns]
+            df = df[front + [c for c in df.columns if c not in front]]
+            self._buffers[name] = []
+            self._buffered[name] = 0
+
+            writer = self._writers.get(name)
+            if writer is None:
+                writer = pq.ParquetWriter(self.path(name), _parquet_schema(df), compression=self.compression)
+                self._writers[name] = writer
+            writer.write_table(_parquet_table(df, writer.schema, self._dropped.setdefault(name, set())))
+            self.rows_written[name] += len(df)
+            self.row_groups += 1
+
+    def close(self) -> Dict[str, int]:
+        """残りを書き出してファイルを閉じ、テーブルごとの書き出し行数を返す"""
+        if not self._closed:
+            self._closed = True
+            self.flush()
+            for writer in self._writers.values():
+                writer.close()
+            self._writers = {}
+            print(f"✅ Parquet書き出し完了: {self.directory} ({self.row_groups}行グループ, "
+                  + ", ".join(f"{TABLES[t]} {n}行" for t, n in self.rows_written.items()) + ")")
+        return dict(self.rows_written)
+
+    def __enter__(self) -> 'ParquetSink':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def export_bulk_data(bulk_data: Dict, dest: str, fmt: str = 'csv') -> str:
+    """一括取得データをZIPまたはディレクトリに書き出してパスを返す"""
+    with StreamingExporter(dest, fmt=fmt) as exporter:
+        exporter.write_bulk(bulk_data)
+    return dest
+
+
+def export_book(book, dest: str, fmt: str = 'csv') -> str:
+    """RaceBook をZIPまたはディレクトリに書き出してパスを返す"""
+    with StreamingExporter(dest, fmt=fmt) as exporter:
+        exporter.write_book(book)
+    return dest
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from kdreams_scraper import KdreamsScraper
+
+    parser = argparse.ArgumentParser(description="全開催場のデータを取得しながらストリーミングで書き出す")
+    parser.add_argument("dest", help="出力先（.zip またはディレクトリ）")
+    parser.add_argument("--date", choices=["today", "yesterday"], default="today")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--flush-rows", type=int, default=0,
+                        help="指定時はテーブルごとに1つのParquetファイルへ、この行数ごとの行グループで書き出す")
+    args = parser.parse_args()
+
+    scraper = KdreamsScraper()
+    venues = scraper.get_races(args.date)
+    if args.flush_rows:
+        sink = ParquetSink(args.dest, flush_rows=args.flush_rows)
+    else:
+        sink = StreamingExporter(args.dest, fmt=args.format)
+    with sink:
+        scraper.crawl(venues, sink, max_workers=args.workers)
@@ -0,0 +1,166 @@
+"""
+ライン特徴量パイプライン
+一括取得した出走表・ライン情報（get_venue_all_data / get_all_venues_data の race_cards, lines_list）から、
+ライン単位・選手単位の特徴量を pandas/NumPy のグループ演算でまとめて計算する。
+レースごとのPythonループは使わないため、数千レース分でも一度に処理できる。
+"""
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+
+# レースを識別する列（存在するものを使う）
+RACE_KEY_CANDIDATES = ['開催場', 'レース']
+
+# 戦法回数の列
+TACTIC_COLS = ['逃', '捲', '差', 'マ']
+
+# 脚質の種類
+STYLES = ['逃', '両', '追']
+
+
+def race_keys(df: pd.DataFrame) -> List[str]:
+    """DataFrameに含まれるレース識別列"""
+    keys = [c for c in RACE_KEY_CANDIDATES if c in df.columns]
+    if not keys:
+        raise ValueError("レースを識別する列（開催場 / レース）がありません")
+    return keys
+
+
+def explode_lines(lines: pd.DataFrame) -> pd.DataFrame:
+    """
+    ライン情報（'7-1-3' 形式）を選手単位に展開する
+
+    Returns:
+        レース識別列 + 車番, ライン番号, ライン内位置, ライン人数
+    """
+    keys = race_keys(lines)
+    if lines.empty:
+        return pd.DataFrame(columns=keys + ['車番', 'ライン番号', 'ライン内位置', 'ライン人数'])
+
+    exploded = lines[keys + ['ライン番号']].copy()
+    exploded['車番'] = lines['車番'].astype(str).str.split('-')
+    exploded = exploded.explode('車番', ignore_index=True)
+    exploded['車番'] = pd.to_numeric(exploded['車番'], errors='coerce')
+    exploded = exploded.dropna(subset=['車番'])
+    exploded['車番'] = exploded['車番'].astype('int64')
+
+    group = exploded.groupby(keys + ['ライン番号'], sort=False)
+    exploded['ライン内位置'] = group.cumcount() + 1
+    exploded['ライン人数'] = group['車番'].transform('size')
+    return exploded
+
+
+def rider_frame(cards: pd.DataFrame, lines: pd.DataFrame) -> pd.DataFrame:
+    """
+    出走表にライン上の位置を結合した選手単位のフレーム
+
+    ライン情報がない選手は単騎（その選手だけのライン）として扱い、「ライン情報なし」を1にする。
+    """
+    keys = race_keys(cards)
+    riders = cards.copy()
+    riders['車番'] = pd.to_numeric(riders['車番'], errors='coerce')
+    riders = riders.dropna(subset=['車番'])
+    riders['車番'] = riders['車番'].astype('int64')
+
+    positions = explode_lines(lines) if not lines.empty else explode_lines(pd.DataFrame(columns=keys + ['ライン番号', '車番']))
+    riders = riders.merge(positions, on=keys + ['車番'], how='left')
+
+    missing = riders['ライン番号'].isna()
+    riders['ライン情報なし'] = missing.astype('int8')
+    # 単騎扱い: 既存のライン番号と重ならないよう 100 + 車番 を振る
+    riders.loc[missing, 'ライン番号'] = 100 + riders.loc[missing, '車番']
+    riders.loc[missing, 'ライン内位置'] = 1
+    riders.loc[missing, 'ライン人数'] = 1
+    riders[['ライン番号', 'ライン内位置', 'ライン人数']] = riders[['ライン番号', 'ライン内位置', 'ライン人数']].astype('int64')
+
+    riders['_race'] = riders.groupby(keys, sort=False).ngroup()
+    riders['_line'] = riders.groupby(['_race', 'ライン番号'], sort=False).ngroup()
+    return riders
+
+
+def line_features(riders: pd.DataFrame) -> pd.DataFrame:
+    """
+    ライン単位の特徴量（rider_frame() の結果を入力にする）
+
+    Returns:
+        _line をインデックスとする 得点合計・得点最大・得点平均・逃シェア・脚質構成 など
+    """
+    score = pd.to_numeric(riders['競走得点'], errors='coerce')
+    tactics = riders[[c for c in TACTIC_COLS if c in riders.columns]].apply(pd.to_numeric, errors='coerce').fillna(0)
+    style_dummies = pd.get_dummies(riders['脚質'] if '脚質' in riders.columns else pd.Series('', index=riders.index))
+    style_dummies = style_dummies.reindex(columns=STYLES, fill_value=0).astype('int64')
+    style_dummies.columns = [f"脚質_{s}数" for s in STYLES]
+
+    frame = pd.concat([riders[['_race', '_line']], score.rename('得点'), tactics, style_dummies], axis=1)
+    group = frame.groupby('_line', sort=True)
+
+    features = pd.DataFrame({
+        '_race': group['_race'].first(),
+        'ライン得点合計': group['得点'].sum(min_count=1),
+        'ライン得点最大': group['得点'].max(),
+        'ライン得点平均': group['得点'].mean(),
+        'ライン人数': group.size(),
+    })
+    features = features.join(group[list(style_dummies.columns)].sum())
+
+    tactic_sum = group[list(tactics.columns)].sum()
+    total = tactic_sum.sum(axis=1).replace(0, np.nan)
+    if '逃' in tactic_sum.columns:
+        features['ライン逃シェア'] = (tactic_sum['逃'] / total).fillna(0.0)
+    features['ライン戦法回数'] = tactic_sum.sum(axis=1)
+
+    # レース内でのライン強さ順位・シェア
+    race_group = features.groupby('_race')
+    features['ライン得点順位'] = race_group['ライン得点合計'].rank(ascending=False, method='min')
+    features['ライン得点シェア'] = features['ライン得点合計'] / race_group['ライン得点合計'].transform('sum')
+    features['レースライン数'] = race_group['ライン人数'].transform('size')
+    return features
+
+
+def build_feature_matrix(cards: pd.DataFrame, lines: pd.DataFrame) -> pd.DataFrame:
+    """
+    選手単位の特徴量行列を作る
+
+    Args:
+        cards: 一括取得の race_cards（レース識別列 + 出走表カラム）
+        lines: 一括取得の lines_list（レース識別列 + ライン番号 + '7-1-3' 形式の車番）
+
+    Returns:
+        (レース識別列, 車番) をインデックスとする数値のみのDataFrame
+    """
+    keys = race_keys(cards)
+    riders = rider_frame(cards, lines)
+    if riders.empty:
+        return pd.DataFrame()
+
+    per_line = line_features(riders)
+    matrix = riders[keys + ['車番', '_race', '_line', 'ライン番号', 'ライン内位置', 'ライン人数', 'ライン情報なし']].copy()
+    matrix = matrix.join(per_line.drop(columns=['_race', 'ライン人数']), on='_line')
+
+    # 選手自身の数値特徴
+    numeric_cols = ['競走得点', 'ギヤ倍数', 'S', 'B', *TACTIC_COLS, '1着', '2着', '3着', '着外', '年齢', '期別']
+    for col in numeric_cols:
+        if col in riders.columns:
+            matrix[col] = pd.to_numeric(riders[col], errors='coerce')
+
+    # ライン内の位置関係
+    matrix['先頭'] = (matrix['ライン内位置'] == 1).astype('int8')
+    matrix['番手'] = (matrix['ライン内位置'] == 2).astype('int8')
+    matrix['単騎'] = (matrix['ライン人数'] == 1).astype('int8')
+    ordered = matrix.sort_values(['_line', 'ライン内位置'])
+    line_group = ordered.groupby('_line', sort=False)['競走得点']
+    matrix['前位置得点'] = line_group.shift(1).reindex(matrix.index)
+    matrix['ライン先頭得点'] = line_group.transform('first').reindex(matrix.index)
+    matrix['ライン内得点差'] = matrix['競走得点'] - matrix['ライン得点平均']
+
+    # レース内の相対値
+    race_group = matrix.groupby('_race')['競走得点']
+    matrix['得点順位'] = race_group.rank(ascending=False, method='min')
+    matrix['得点最大差'] = matrix['競走得点'] - race_group.transform('max')
+    matrix['得点偏差'] = (matrix['競走得点'] - race_group.transform('mean')) / race_group.transform('std').replace(0, np.nan)
+    matrix['出走数'] = matrix.groupby('_race')['車番'].transform('size')
+
+    matrix = matrix.drop(columns=['_race', '_line']).set_index(keys + ['車番']).sort_index()
+    return matrix.astype('float64')
@@ -0,0 +1,161 @@
+"""
+ライン構成のコンパクト表現
+1レースのライン構成を int8 の固定長配列（車番1〜9の9要素）で表す。
+各要素は ライン番号×10 + ライン内位置（例: 23 = ライン2の3番目）、欠車・不明は 0。
+複数レースは (レース数, 9) の2次元配列にまとめ、100万レースでも約9MBに収まる。
+出走表とは (レース行, 車番-1) の配列インデックスで結合できる。
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+MAX_BIBS = 9
+EMPTY = 0
+
+
+def encode(lines: List[Dict]) -> np.ndarray:
+    """
+    get_race_lines() の結果を (9,) の int8 配列にする
+
+    例: [{"line": 1, "bibs": [7, 1]}, {"line": 2, "bibs": [3]}]
+        → 車番7=11, 車番1=12, 車番3=21, その他=0
+    """
+    row = np.zeros(MAX_BIBS, dtype=np.int8)
+    for ln in lines:
+        for pos, bib in enumerate(ln['bibs'], 1):
+            if 1 <= bib <= MAX_BIBS:
+                row[bib - 1] = ln['line'] * 10 + pos
+    return row
+
+
+def encode_batch(races: Sequence[List[Dict]]) -> np.ndarray:
+    """複数レースの get_race_lines() の結果を (N, 9) の int8 配列にする"""
+    out = np.zeros((len(races), MAX_BIBS), dtype=np.int8)
+    for i, lines in enumerate(races):
+        out[i] = encode(lines)
+    return out
+
+
+def from_lines_frame(lines: pd.DataFrame, keys: Sequence[str] = ('開催場', 'レース')) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    一括取得の lines_list（'7-1-3' 形式）から配列を作る（レース単位のループなし）
+
+    Args:
+        lines: レース識別列 + ライン番号 + 車番（'7-1-3'）
+        keys: レース識別列（存在するものだけ使う）
+
+    Returns:
+        (レース識別列のDataFrame（行番号 = 配列の行）, (N, 9) の int8 配列)
+    """
+    keys = [k for k in keys if k in lines.columns]
+    if lines.empty:
+        return pd.DataFrame(columns=keys), np.zeros((0, MAX_BIBS), dtype=np.int8)
+
+    exploded = lines[keys + ['ライン番号']].copy()
+    exploded['車番'] = lines['車番'].astype(str).str.split('-')
+    exploded = exploded.explode('車番', ignore_index=True)
+    exploded['車番'] = pd.to_numeric(exploded['車番'], errors='coerce')
+    exploded = exploded[exploded['車番'].between(1, MAX_BIBS)]
+
+    race_index = exploded.groupby(keys, sort=False).ngroup().to_numpy()
+    positions = exploded.groupby(keys + ['ライン番号'], sort=False).cumcount().to_numpy() + 1
+
+    races = exploded[keys].drop_duplicates().reset_index(drop=True)
+    out = np.zeros((len(races), MAX_BIBS), dtype=np.int8)
+    out[race_index, exploded['車番'].to_numpy(dtype=np.int64) - 1] = (
+        exploded['ライン番号'].to_numpy(dtype=np.int64) * 10 + positions
+    )
+    return races, out
+
+
+def line_ids(formations: np.ndarray) -> np.ndarray:
+    """各車番のライン番号（0 = 不明）"""
+    return formations // 10
+
+
+def positions(formations: np.ndarray) -> np.ndarray:
+    """各車番のライン内位置（0 = 不明）"""
+    return formations % 10
+
+
+def line_sizes(formations: np.ndarray) -> np.ndarray:
+    """各車番が属するラインの人数（0 = 不明）"""
+    ids = line_ids(formations).astype(np.int64)
+    # (N, 9, 9): 車番i と 車番j が同じラインか
+    same = (ids[..., :, None] == ids[..., None, :]) & (ids[..., None, :] > 0)
+    return np.where(ids > 0, same.sum(axis=-1), 0)
+
+
+def decode(row: np.ndarray) -> List[Dict]:
+    """(9,) の配列を get_race_lines() と同じ形式に戻す"""
+    ids, pos = line_ids(row), positions(row)
+    result = []
+    for line_no in sorted(set(ids[ids > 0].tolist())):
+        bibs = np.flatnonzero(ids == line_no)
+        order = np.argsort(pos[bibs])
+        result.append({"line": int(line_no), "bibs": (bibs[order] + 1).tolist()})
+    return result
+
+
+def to_text(row: np.ndarray) -> str:
+    """(9,) の配列を '7-1-3 / 2-6' 形式の文字列にする"""
+    return " / ".join("-".join(map(str, ln['bibs'])) for ln in decode(row))
+
+
+def same_formation(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """ライン構成が同一かどうか（(N, 9) 同士なら (N,) の bool 配列）"""
+    return np.all(a == b, axis=-1)
+
+
+def line_mates(formations: np.ndarray, bib: int) -> np.ndarray:
+    """指定車番と同じラインの車番のマスク（(N, 9) の bool、本人を含む）"""
+    ids = line_ids(formations)
+    own = ids[..., bib - 1:bib]
+    return (ids == own) & (own > 0)
+
+
+def lookup(formations: np.ndarray, race_rows: np.ndarray, bibs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (レース行, 車番) の組をまとめて引く
+
+    Returns:
+        (ライン番号の配列, ライン内位置の配列)
+    """
+    codes = formations[np.asarray(race_rows, dtype=np.int64), np.asarray(bibs, dtype=np.int64) - 1]
+    return line_ids(codes), positions(codes)
+
+
+def join_to_cards(cards: pd.DataFrame, races: pd.DataFrame, formations: np.ndarray) -> pd.DataFrame:
+    """
+    出走表に ライン番号・ライン内位置 列を追加する（配列インデックスで結合）
+
+    Args:
+        cards: レース識別列 + 車番 を持つ出走表
+        races: from_lines_frame() が返したレース識別列（行番号 = 配列の行）
+        formations: from_lines_frame() が返した配列
+
+    Raises:
+        ValueError: races にレース識別列がない（lines に keys の列が1つもなかった）、または cards にその列がない
+    """
+    keys = list(races.columns)
+    if not keys:
+        raise ValueError("レース識別列がありません（from_lines_frame() に渡した lines に keys の列が1つもありません）")
+    missing = [k for k in keys + ['車番'] if k not in cards.columns]
+    if missing:
+        raise ValueError(f"出走表に列がありません: {missing}")
+    row_of = pd.Series(np.arange(len(races)), index=pd.MultiIndex.from_frame(races) if len(keys) > 1 else races[keys[0]])
+    card_keys = pd.MultiIndex.from_frame(cards[keys]) if len(keys) > 1 else cards[keys[0]]
+    race_rows = row_of.reindex(card_keys).to_numpy()
+    bibs = pd.to_numeric(cards['車番'], errors='coerce').to_numpy()
+
+    valid = ~np.isnan(race_rows.astype(float)) & (bibs >= 1) & (bibs <= MAX_BIBS)
+    line_no = np.zeros(len(cards), dtype=np.int8)
+    pos = np.zeros(len(cards), dtype=np.int8)
+    line_no[valid], pos[valid] = lookup(formations, race_rows[valid].astype(np.int64), bibs[valid].astype(np.int64))
+
+    out = cards.copy()
+    out['ライン番号'] = line_no
+    out['ライン内位置'] = pos
+    return out
@@ -0,0 +1,221 @@
+"""
+リクエスト総量の制御（ガバナー）
+全スクレイパー・全ユーザーのリクエストを1つの予算（min_interval 秒に1リクエスト）で制御する。
+lock_path を指定すると、同じファイルを使う別プロセス（ワーカー・別のStreamlitプロセス）とも予算を共有する。
+
+送信枠の割り当て順:
+  1. 優先度の高い順（interactive: 1レースの表示 > bulk: 一括取得 > background: 先読み・一覧更新）
+  2. 同じ優先度の中ではクライアント（ユーザー）ごとのラウンドロビン
+
+RateLimiter と同じく acquire() を呼ぶだけで使える。クライアントと優先度は request_context() で
+スレッドごとに指定する（スクレイパーの並列取得ではワーカースレッドに引き継がれる）。
+
+使い方:
+    governor = Governor(min_interval=1.0, lock_path="/tmp/kdreams.lock")
+    scraper = KdreamsScraper(rate_limiter=governor)
+    with request_context(client="user-1"):
+        scraper.get_race_card(url)            # interactive
+    with request_context(client="user-2", priority="bulk"):
+        scraper.get_venue_all_data(name, url)
+"""
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間の共有なし（プロセス内のみ）
+    fcntl = None
+
+
+PRIORITIES = ('interactive', 'bulk', 'background')
+DEFAULT_CLIENT = 'default'
+
+_context = threading.local()
+
+
+def current_context() -> Tuple[str, str]:
+    """現在のスレッドの (クライアント, 優先度)"""
+    return (getattr(_context, 'client', DEFAULT_CLIENT), getattr(_context, 'priority', 'interactive'))
+
+
+@contextmanager
+def request_context(client: Optional[str] = None, priority: Optional[str] = None) -> Iterator[None]:
+    """
+    このブロック内のリクエストのクライアント・優先度を指定する（省略した項目は外側の指定を引き継ぐ）
+
+    例: 一括取得は priority="bulk"、Streamlitのセッションごとに client=セッションID
+    """
+    if priority is not None and priority not in PRIORITIES:
+        raise ValueError(f"不明な優先度: {priority}（{PRIORITIES}）")
+    previous = current_context()
+    _context.client = client if client is not None else previous[0]
+    _context.priority = priority if priority is not None else previous[1]
+    try:
+        yield
+    finally:
+        _context.client, _context.priority = previous
+
+
+def with_context(fn: Callable) -> Callable:
+    """呼び出し元スレッドの (クライアント, 優先度) を引き継いで fn を実行する関数を返す（スレッドプール投入用）"""
+    client, priority = current_context()
+
+    def _run(*args, **kwargs):
+        with request_context(client, priority):
+            return fn(*args, **kwargs)
+    return _run
+
+
+class _SharedClock:
+    """ファイルロックで複数プロセスが共有する「次の送信可能時刻」"""
+
+    _FORMAT = struct.Struct('<d')
+
+    def __init__(self, path: str):
+        self.path = path
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        os.close(fd)
+
+    def reserve(self, earliest: float, interval: float) -> float:
+        """earliest 以降で最初の空き時刻を予約して返す（時刻は time.time()）"""
+        with open(self.path, 'r+b') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                raw = f.read(self._FORMAT.size)
+                stored = self._FORMAT.unpack(raw)[0] if len(raw) == self._FORMAT.size else 0.0
+                slot = max(earliest, stored)
+                f.seek(0)
+                f.write(self._FORMAT.pack(slot + interval))
+                f.flush()
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+        return slot
+
+
+class Governor:
+    """
+    ホスト全体のリクエスト予算（スレッドセーフ、lock_path 指定時はプロセス間でも共有）
+
+    待っているリクエストは優先度・クライアントごとのキューに並び、送信枠が空くたびに
+    「最も優先度が高く、直近に割り当てられていないクライアント」の先頭に割り当てる。
+    """
+
+    def __init__(self, min_interval: float = 1.0, lock_path: Optional[str] = None, max_clients: int = 256):
+        """
+        Args:
+            min_interval: 全体でのリクエスト間隔（秒）
+            lock_path: 別プロセスと予算を共有するためのロックファイル（省略時はプロセス内のみ）
+            max_clients: 統計を残すクライアント/優先度の数（超えたら最も長く割り当てのないものから捨てる。
+                         優先度ごとの合計は捨てずに数え続ける）
+        """
+        self.min_interval = min_interval
+        self._cond = threading.Condition()
+        self._queues: Dict[str, 'OrderedDict[str, deque]'] = {p: OrderedDict() for p in PRIORITIES}
+        self._next_time = 0.0
+        self._clock = _SharedClock(lock_path) if lock_path and fcntl is not None else None
+        self.max_clients = max_clients
+        # クライアント/優先度 → [割り当て数, 合計待ち時間]（直近に割り当てたものが末尾）
+        self._client_stats: 'OrderedDict[str, list]' = OrderedDict()
+        self._priority_stats: Dict[str, list] = {p: [0, 0.0] for p in PRIORITIES}
+
+    def acquire(self) -> None:
+        """現在のスレッドのクライアント・優先度で送信枠を待つ"""
+        client, priority = current_context()
+        self.acquire_for(client, priority)
+
+    def acquire_for(self, client: str, priority: str = 'interactive') -> None:
+        """指定したクライアント・優先度で送信枠を待つ"""
+        if priority not in PRIORITIES:
+            raise ValueError(f"不明な優先度: {priority}（{PRIORITIES}）")
+        ticket = object()
+        start = time.time()
+        with self._cond:
+            self._queues[priority].setdefault(client, deque()).append(ticket)
+            try:
+                while True:
+                    head_priority, head_client = self._head()
+                    if self._queues[head_priority][head_client][0] is ticket:
+                        now = time.time()
+                        if now >= self._next_time:
+                            slot = self._reserve(now)
+                            self._pop(head_priority, head_client)
+                            self._cond.notify_all()
+                            break
+                        self._cond.wait(self._next_time - now)
+                    else:
+                        self._cond.wait()
+            except BaseException:
+                # 待機中に例外（KeyboardInterrupt・共有ロックファイルのエラーなど）で抜けたら順番待ちから外す
+                self._discard(priority, client, ticket)
+                raise
+        # 別プロセスの予約で送信時刻が先になった場合はここで待つ
+        delay = slot - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        self._record(f"{client}/{priority}", priority, time.time() - start)
+
+    def _record(self, key: str, priority: str, waited: float) -> None:
+        with self._cond:
+            entry = self._client_stats.pop(key, None) or [0, 0.0]
+            entry[0] += 1
+            entry[1] += waited
+            self._client_stats[key] = entry
+            while len(self._client_stats) > self.max_clients:
+                self._client_stats.popitem(last=False)
+            totals = self._priority_stats[priority]
+            totals[0] += 1
+            totals[1] += waited
+
+    def _head(self) -> Tuple[str, str]:
+        # 優先度の高いキューから、先頭（= 最も長く割り当てられていない）クライアントを選ぶ
+        for priority in PRIORITIES:
+            if self._queues[priority]:
+                return priority, next(iter(self._queues[priority]))
+        raise RuntimeError("待機中のリクエストがありません")
+
+    def _discard(self, priority: str, client: str, ticket: object) -> None:
+        queue = self._queues[priority].get(client)
+        if queue is None or ticket not in queue:
+            return
+        queue.remove(ticket)
+        if not queue:
+            del self._queues[priority][client]
+        # 先頭が入れ替わった可能性があるので待機中のスレッドを起こす
+        self._cond.notify_all()
+
+    def _pop(self, priority: str, client: str) -> None:
+        queues = self._queues[priority]
+        queue = queues.pop(client)
+        queue.popleft()
+        if queue:
+            # 残りがあれば末尾に回す（ラウンドロビン）
+            queues[client] = queue
+
+    def _reserve(self, now: float) -> float:
+        slot = now
+        if self._clock is not None:
+            slot = self._clock.reserve(now, self.min_interval)
+        self._next_time = slot + self.min_interval
+        return slot
+
+    def stats(self) -> Dict:
+        """
+        優先度ごと・クライアント/優先度ごとの割り当て数・平均待ち時間と待機数
+
+        clients は直近に割り当てた max_clients 件だけ（セッションごとのクライアントIDで増え続けないようにする）。
+        """
+        with self._cond:
+            waiting = {p: sum(len(q) for q in queues.values()) for p, queues in self._queues.items()}
+            return {
+                'min_interval': self.min_interval,
+                'shared': self._clock is not None,
+                'waiting': waiting,
+                'priorities': {p: {'granted': n, 'avg_wait_s': w / n if n else 0.0}
+                               for p, (n, w) in self._priority_stats.items()},
+                'clients': {key: {'granted': n, 'avg_wait_s': w / n} for key, (n, w) in self._client_stats.items()},
+            }
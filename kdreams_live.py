@@ -0,0 +1,237 @@
+"""
+開催場一覧のライブインデックス
+バックグラウンドスレッドが一定間隔でトップページを取得し、本日・前日の開催場一覧をメモリ上で最新に保つ。
+サイドバーやCLIは通信せずにインデックスを読み、状態の変化（締切・発売レースの進行・結果掲載など）は
+subscribe() で登録したコールバックに通知される。
+
+使い方:
+    index = VenueIndex(scraper, interval=60).start()
+    index.subscribe(lambda event: print(event))
+    venues = index.get("today")
+"""
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional, Tuple
+
+from kdreams_governor import request_context
+from kdreams_scraper import KdreamsScraper
+
+
+DATE_TYPES = ("today", "yesterday")
+
+# 変化を検出する項目
+WATCHED_FIELDS = ('status', 'time', 'day', 'url', 'grade')
+
+
+def diff_venues(date_type: str, old: List[Dict], new: List[Dict]) -> List[Dict]:
+    """
+    2つの開催場一覧を比べて変化イベントのリストを返す
+
+    Returns:
+        [{"date_type", "velodrome", "kind": "added"|"removed"|<項目名>, "old", "new", "venue"}]
+    """
+    old_map = {v['velodrome']: v for v in old}
+    new_map = {v['velodrome']: v for v in new}
+    events = []
+    for name, venue in new_map.items():
+        before = old_map.get(name)
+        if before is None:
+            events.append({'date_type': date_type, 'velodrome': name, 'kind': 'added',
+                           'old': None, 'new': venue.get('status', ''), 'venue': venue})
+            continue
+        for field in WATCHED_FIELDS:
+            if before.get(field) != venue.get(field):
+                events.append({'date_type': date_type, 'velodrome': name, 'kind': field,
+                               'old': before.get(field), 'new': venue.get(field), 'venue': venue})
+    for name, venue in old_map.items():
+        if name not in new_map:
+            events.append({'date_type': date_type, 'velodrome': name, 'kind': 'removed',
+                           'old': venue.get('status', ''), 'new': None, 'venue': venue})
+    return events
+
+
+class VenueIndex:
+    """
+    バックグラウンド更新される開催場一覧（スレッドセーフ）
+
+    get() はメモリ上のスナップショットを返すだけなので待ち時間はない。
+    更新のたびに前回との差分を取り、変化があれば購読者に1件ずつ通知する。
+    """
+
+    def __init__(self, scraper: Optional[KdreamsScraper] = None, interval: float = 60.0,
+                 date_types: Tuple[str, ...] = DATE_TYPES, history: int = 100):
+        """
+        Args:
+            scraper: 取得に使うスクレイパー（省略時は新規作成）
+            interval: 更新間隔（秒）
+            date_types: 保持する日付タイプ
+            history: recent_events に残すイベント数
+        """
+        self.scraper = scraper or KdreamsScraper()
+        self.interval = interval
+        self.date_types = tuple(date_types)
+        self._lock = threading.Lock()
+        self._venues: Dict[str, List[Dict]] = {}
+        self._subscribers: Dict[int, Callable[[Dict], None]] = {}
+        self._next_token = 0
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.recent_events: deque = deque(maxlen=history)
+        self.updated_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.refresh_count = 0
+
+    # ── 更新 ──────────────────────────────────────────
+
+    def refresh(self) -> List[Dict]:
+        """
+        トップページを取得してインデックスを更新する（呼び出し元のスレッドで実行）
+
+        Returns:
+            今回の更新で発生した変化イベント（取得失敗時は空リスト）
+        """
+        try:
+            with request_context(priority='background'):
+                fresh = self.scraper.get_venue_index(self.date_types)
+        except Exception as e:
+            self.last_error = str(e)
+            print(f"⚠️ 開催場一覧の更新エラー: {e}")
+            return []
+
+        events = []
+        with self._lock:
+            first = not self._venues
+            for date_type, venues in fresh.items():
+                if not first:
+                    events.extend(diff_venues(date_type, self._venues.get(date_type, []), venues))
+                self._venues[date_type] = venues
+            self.updated_at = time.time()
+            self.last_error = None
+            self.refresh_count += 1
+            self.recent_events.extend(events)
+            subscribers = list(self._subscribers.values())
+
+        for event in events:
+            for callback in subscribers:
+                try:
+                    callback(event)
+                except Exception as e:
+                    print(f"⚠️ 購読コールバックエラー: {e}")
+        return events
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self.refresh()
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+
+    def start(self) -> 'VenueIndex':
+        """バックグラウンド更新を開始する（起動済みなら何もしない）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='kdreams-venue-index', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """バックグラウンド更新を止める"""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def refresh_soon(self) -> None:
+        """次の更新を待たずにバックグラウンドスレッドを起こす"""
+        self._wakeup.set()
+
+    def wait_ready(self, timeout: Optional[float] = None) -> bool:
+        """最初の更新が終わるまで待つ（完了していれば True）"""
+        deadline = None if timeout is None else time.time() + timeout
+        while self.updated_at is None:
+            if deadline is not None and time.time() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    # ── 参照 ──────────────────────────────────────────
+
+    def get(self, date_type: str = "today") -> List[Dict]:
+        """開催場一覧（get_races() と同じ形式）のコピー"""
+        with self._lock:
+            return [dict(v) for v in self._venues.get(date_type, [])]
+
+    def by_velodrome(self, date_type: str = "today") -> Dict[str, List[Dict]]:
+        """開催場名 → レース情報のリスト"""
+        grouped: Dict[str, List[Dict]] = {}
+        for venue in self.get(date_type):
+            grouped.setdefault(venue['velodrome'], []).append(venue)
+        return grouped
+
+    @property
+    def ready(self) -> bool:
+        return self.updated_at is not None
+
+    @property
+    def age(self) -> Optional[float]:
+        """最終更新からの経過秒数"""
+        return None if self.updated_at is None else time.time() - self.updated_at
+
+    # ── 購読 ──────────────────────────────────────────
+
+    def subscribe(self, callback: Callable[[Dict], None]) -> int:
+        """
+        変化イベントの購読を登録する
+
+        Args:
+            callback: イベント辞書を1件ずつ受け取る関数（更新スレッドから呼ばれる）
+
+        Returns:
+            unsubscribe() に渡すトークン
+        """
+        with self._lock:
+            self._next_token += 1
+            self._subscribers[self._next_token] = callback
+            return self._next_token
+
+    def unsubscribe(self, token: int) -> None:
+        with self._lock:
+            self._subscribers.pop(token, None)
+
+
+def format_event(event: Dict) -> str:
+    """イベントを1行の文字列にする"""
+    label = '本日' if event['date_type'] == 'today' else '前日'
+    kind = event['kind']
+    if kind == 'added':
+        return f"➕ [{label}] {event['velodrome']} が追加されました"
+    if kind == 'removed':
+        return f"➖ [{label}] {event['velodrome']} がなくなりました"
+    names = {'status': '状態', 'time': '締切時刻', 'day': '日程', 'url': 'URL', 'grade': 'グレード'}
+    return f"🔔 [{label}] {event['velodrome']} {names.get(kind, kind)}: {event['old']} → {event['new']}"
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="開催場一覧をバックグラウンドで更新し、変化を表示する")
+    parser.add_argument("--interval", type=float, default=60.0, help="更新間隔（秒）")
+    parser.add_argument("--date", choices=list(DATE_TYPES), default="today")
+    parser.add_argument("--watch", action="store_true", help="一覧の表示後も変化を表示し続ける")
+    args = parser.parse_args()
+
+    index = VenueIndex(interval=args.interval)
+    index.subscribe(lambda event: print(format_event(event)))
+    index.start()
+    index.wait_ready()
+    for venue in index.get(args.date):
+        print(f"  - {venue['velodrome']} ({venue['grade']}) {venue['day']} {venue['status']} {venue['time']}")
+
+    if args.watch:
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+    index.stop(timeout=5)
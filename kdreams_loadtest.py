@@ -0,0 +1,165 @@
+"""
+スクレイパー負荷試験ドライバー
+モックサーバー（または任意の接続先）に対して 1レース / 1開催場 / 全開催場 の取得を実行し、
+races/s・リクエスト遅延（p50/p99）・メモリ使用量を計測する
+"""
+import contextlib
+import os
+import resource
+import statistics
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, Optional
+
+from kdreams_memo import ParseMemo
+from kdreams_mock_server import MockKdreamsServer
+from kdreams_scraper import KdreamsScraper, RateLimiter, SingleFlight
+
+
+def percentile(values: List[float], p: float) -> float:
+    """p パーセンタイル（最近傍法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+class LatencyRecorder:
+    """session のレスポンスフックで1リクエストごとの応答時間を記録する"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies: List[float] = []
+        self.errors = 0
+
+    def hook(self, response, *args, **kwargs):
+        with self._lock:
+            self.latencies.append(response.elapsed.total_seconds())
+            if response.status_code >= 400:
+                self.errors += 1
+        return response
+
+
+def run_scenario(scenario: str, base_url: str, workers: int = 4, interval: float = 0.0,
+                 date_type: str = 'today', verbose: bool = False) -> Dict:
+    """
+    1シナリオを実行して計測結果を返す
+
+    Args:
+        scenario: "single" (1レース), "venue" (1開催場), "day" (全開催場)
+        base_url: 接続先
+        workers: 全開催場取得時の並列数
+        interval: 全体のリクエスト間隔（秒）
+
+    Returns:
+        計測結果（開催場・レースが取得できなかった場合は 'error' に理由が入り、races は 0）
+    """
+    # 解析メモ・同時取得の集約はプロセス共有のものを使うと前のシナリオの結果が効いてしまうので、シナリオごとに作る
+    scraper = KdreamsScraper(rate_limiter=RateLimiter(interval), base_url=base_url,
+                             parse_memo=ParseMemo(), single_flight=SingleFlight())
+    recorder = LatencyRecorder()
+    scraper.session.hooks['response'].append(recorder.hook)
+
+    # スクレイパーの進捗出力は計測の邪魔になるので既定では捨てる
+    sink = open(os.devnull, 'w') if not verbose else None
+    redirect = contextlib.redirect_stdout(sink) if sink else contextlib.nullcontext()
+
+    if scenario not in ('single', 'venue', 'day'):
+        raise ValueError(f"不明なシナリオ: {scenario}")
+    tracemalloc.start()
+    started = time.perf_counter()
+    races, error = 0, None
+    with redirect:
+        venues = scraper.get_races(date_type)
+        race_list = scraper.get_all_races_from_venue(venues[0]['url']) if venues and scenario == 'single' else []
+        if not venues:
+            error = "開催場一覧が空です"
+        elif scenario == 'single' and not race_list:
+            error = f"{venues[0]['velodrome']} のレース一覧が空です"
+        elif scenario == 'single':
+            race = race_list[0]
+            scraper.get_race_card(race['url'])
+            scraper.get_race_lines(race['url'])
+            scraper.get_race_results(race['url'])
+            races = 1
+        elif scenario == 'venue':
+            data = scraper.get_venue_all_data(venues[0]['velodrome'], venues[0]['url'])
+            races = data['race_cards']['レース'].nunique() if not data['race_cards'].empty else 0
+        elif scenario == 'day':
+            data = scraper.get_all_venues_data(date_type, max_workers=workers, venues=venues)
+            races = len(data['race_cards'][['開催場', 'レース']].drop_duplicates()) if not data['race_cards'].empty else 0
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if sink:
+        sink.close()
+
+    latencies = recorder.latencies
+    return {
+        'scenario': scenario,
+        'error': error,
+        'races': races,
+        'requests': len(latencies),
+        'errors': recorder.errors,
+        'elapsed_s': elapsed,
+        'races_per_s': races / elapsed if elapsed > 0 else 0.0,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'peak_alloc_mb': peak / 1024 / 1024,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+
+
+def print_report(results: List[Dict]) -> None:
+    print(f"{'シナリオ':<8} {'レース':>6} {'req':>6} {'err':>4} {'秒':>8} {'races/s':>8} "
+          f"{'p50ms':>8} {'p99ms':>8} {'alloc MB':>9} {'RSS MB':>8}")
+    for r in results:
+        print(f"{r['scenario']:<10} {r['races']:>6} {r['requests']:>6} {r['errors']:>4} {r['elapsed_s']:>8.2f} "
+              f"{r['races_per_s']:>8.2f} {r['p50_ms']:>8.1f} {r['p99_ms']:>8.1f} "
+              f"{r['peak_alloc_mb']:>9.1f} {r['max_rss_mb']:>8.1f}")
+    for r in results:
+        if r['error']:
+            print(f"❌ {r['scenario']}: 失敗（{r['error']}）")
+
+
+def main(argv: Optional[List[str]] = None) -> List[Dict]:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="スクレイパー負荷試験")
+    parser.add_argument("--scenario", choices=['single', 'venue', 'day', 'all'], default='all')
+    parser.add_argument("--url", help="接続先（省略時はモックサーバーを起動）")
+    parser.add_argument("--workers", type=int, default=4, help="全開催場取得の並列数")
+    parser.add_argument("--interval", type=float, default=0.0, help="全体のリクエスト間隔（秒）")
+    parser.add_argument("--venues", type=int, default=6, help="モックの開催場数")
+    parser.add_argument("--latency", type=float, default=0.02, help="モックの応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="モックの応答遅延のランダム幅（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="モックのエラー応答率")
+    parser.add_argument("--verbose", action="store_true", help="スクレイパーの進捗出力を表示する")
+    args = parser.parse_args(argv)
+
+    scenarios = ['single', 'venue', 'day'] if args.scenario == 'all' else [args.scenario]
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = MockKdreamsServer(latency=args.latency, jitter=args.jitter,
+                                   error_rate=args.error_rate, venues=args.venues).start()
+        base_url = server.url
+        print(f"モックサーバー: {base_url} (遅延={args.latency}s, エラー率={args.error_rate})")
+
+    try:
+        results = [run_scenario(s, base_url, workers=args.workers, interval=args.interval,
+                                verbose=args.verbose) for s in scenarios]
+    finally:
+        if server:
+            server.stop()
+
+    print_report(results)
+    return results
+
+
+if __name__ == "__main__":
+    main()
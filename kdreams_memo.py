@@ -0,0 +1,192 @@
+"""
+本文ハッシュによる解析メモと変更検出
+取得したページ本文をURLごとにハッシュし、同じ本文の解析結果を再利用する（変わっていなければ解析しない）。
+本文が変わったときは解析結果の指紋を前回と比べ、どのレースのどの区分（出走表・ライン・結果・オッズ）が
+変わったかを変更イベントとして記録する。
+
+使い方:
+    memo = ParseMemo()
+    df = memo.parse(url, 'card', response.content, parse_race_card)
+    events, cursor = memo.poll_changes(cursor)
+"""
+import copy
+import hashlib
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from kdreams_archive import classify_url
+
+
+# 区分名（変更イベントの section）
+SECTIONS = ('card', 'lines', 'result', 'odds', 'odds_3rentan', 'prediction')
+
+
+def content_hash(body: bytes) -> bytes:
+    """ページ本文のハッシュ（16バイト）"""
+    return hashlib.blake2b(body, digest_size=16).digest()
+
+
+def fingerprint(value: Any) -> bytes:
+    """解析結果の指紋（同じ内容なら同じ値）"""
+    if isinstance(value, pd.DataFrame):
+        h = hashlib.blake2b(digest_size=16)
+        h.update(repr(list(value.columns)).encode('utf-8'))
+        if not value.empty:
+            h.update(pd.util.hash_pandas_object(value, index=False).to_numpy().tobytes())
+        return h.digest()
+    return hashlib.blake2b(repr(value).encode('utf-8'), digest_size=16).digest()
+
+
+def _copy(value: Any) -> Any:
+    # 呼び出し側が列を追加するなどして書き換えてもメモの中身は変わらないよう、毎回コピーを返す
+    if isinstance(value, pd.DataFrame):
+        return value.copy()
+    if isinstance(value, (list, dict)):
+        return copy.deepcopy(value)
+    return value
+
+
+class ParseMemo:
+    """
+    本文ハッシュ → 解析結果 のメモ（スレッドセーフ）
+
+    解析結果は (区分, 本文ハッシュ) をキーに最大 max_entries 件まで保持し、古いものから削除する。
+    (URL, 区分) ごとに直近の本文ハッシュと結果の指紋を覚えておき、変化があれば変更イベントを記録する
+    （最大 max_urls 件まで。最も長く見ていないものから忘れ、次に見たときは 'new' として記録する）。
+    """
+
+    def __init__(self, max_entries: int = 4096, history: int = 10000, max_urls: int = 50000):
+        """
+        Args:
+            max_entries: 保持する解析結果の最大件数
+            history: 保持する変更イベントの最大件数
+            max_urls: 直近の状態を覚えておく (URL, 区分) の最大件数
+        """
+        self.max_entries = max_entries
+        self.max_urls = max_urls
+        self._lock = threading.Lock()
+        self._results: 'OrderedDict[Tuple[str, bytes], Any]' = OrderedDict()
+        self._latest: 'OrderedDict[Tuple[str, str], Tuple[bytes, bytes]]' = OrderedDict()
+        self._events: deque = deque(maxlen=history)
+        self._parsing: Dict[Tuple[str, bytes], threading.Event] = {}
+        self._seq = 0
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def parse(self, url: str, section: str, body: bytes, parser: Callable[[bytes], Any]) -> Any:
+        """
+        本文が前回と同じなら保存済みの結果を、違えば parser(body) の結果を返す
+
+        Args:
+            url: 取得したURL
+            section: 区分（'card', 'lines', 'result', 'odds' など）
+            body: ページ本文
+            parser: 本文を受け取る解析関数（kdreams_parser の parse_*）
+
+        Returns:
+            解析結果のコピー
+
+        同じ本文を複数スレッドが同時に解析しようとした場合は、1スレッドだけが解析し、
+        残りはその結果を待って共有する。
+        """
+        digest = content_hash(body)
+        key = (section, digest)
+        while True:
+            with self._lock:
+                if key in self._results:
+                    self._results.move_to_end(key)
+                    self.hits += 1
+                    result = self._results[key]
+                    self._observe(url, section, digest, None)
+                    return _copy(result)
+                in_flight = self._parsing.get(key)
+                if in_flight is None:
+                    self._parsing[key] = threading.Event()
+                    break
+                self.shared += 1
+            # 解析中のスレッドを待ってからメモを引き直す（失敗していれば自分で解析する）
+            in_flight.wait()
+
+        try:
+            result = parser(body)
+            with self._lock:
+                self.misses += 1
+                self._results[key] = result
+                while len(self._results) > self.max_entries:
+                    self._results.popitem(last=False)
+                self._observe(url, section, digest, fingerprint(result))
+        finally:
+            with self._lock:
+                self._parsing.pop(key).set()
+        return _copy(result)
+
+    def _observe(self, url: str, section: str, digest: bytes, print_: Optional[bytes]) -> None:
+        """(URL, 区分) の最新状態を更新し、結果が変わっていればイベントを記録する"""
+        previous = self._latest.get((url, section))
+        if previous is not None:
+            self._latest.move_to_end((url, section))
+            if previous[0] == digest:
+                return
+        if print_ is None:
+            # 同じ本文の解析結果は別URLで見たことがある → 指紋を計算し直す
+            print_ = fingerprint(self._results[(section, digest)])
+        self._latest[(url, section)] = (digest, print_)
+        while len(self._latest) > self.max_urls:
+            self._latest.popitem(last=False)
+        if previous is not None and previous[1] == print_:
+            # 本文は変わったが（広告・時刻表示など）、解析結果は同じ
+            return
+        race_id, _ = classify_url(url)
+        self._seq += 1
+        self._events.append({
+            'seq': self._seq,
+            'race_id': race_id,
+            'section': section,
+            'url': url,
+            'kind': 'new' if previous is None else 'changed',
+            'time': time.time(),
+        })
+
+    def poll_changes(self, cursor: int = 0, sections: Optional[Tuple[str, ...]] = None) -> Tuple[List[Dict], int]:
+        """
+        前回の問い合わせ以降の変更イベントを返す
+
+        Args:
+            cursor: 前回返されたカーソル（初回は 0）
+            sections: 絞り込む区分（省略時は全区分）
+
+        Returns:
+            ([{"seq", "race_id", "section", "url", "kind": "new"|"changed", "time"}], 次回のカーソル)
+        """
+        with self._lock:
+            events = [dict(e) for e in self._events if e['seq'] > cursor
+                      and (sections is None or e['section'] in sections)]
+            return events, self._seq
+
+    def stats(self) -> Dict:
+        """ヒット数・ミス数・保持件数"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'shared': self.shared,
+                'entries': len(self._results),
+                'urls': len(self._latest),
+                'events': self._seq,
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._results.clear()
+            self._latest.clear()
+
+
+# プロセス内の全スクレイパーが既定で共有するメモ（同じページの解析はプロセス全体で1回）
+SHARED_MEMO = ParseMemo()
@@ -0,0 +1,329 @@
+"""
+Kドリームス モックサーバー
+kdreams_scraper.py が解析するページ構造（race_list, racecard_table, line_position,
+result_table, oddspop_table_wrapper）を合成して返すローカルHTTPサーバー。
+並列数・レート制限・キャッシュの調整や負荷試験を本番サイトにアクセスせずに行うために使う。
+"""
+import random
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import permutations
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+
+# 合成する開催場（スラッグ, 場名, 場コード, グレード）
+MOCK_VENUES: List[Tuple[str, str, str, str]] = [
+    ('hiratsuka', '平塚', '35', 'GⅠ'),
+    ('kokura', '小倉', '81', 'GⅢ'),
+    ('nara', '奈良', '85', 'FⅠ'),
+    ('maebashi', '前橋', '22', 'FⅠ'),
+    ('kishiwada', '岸和田', '56', 'FⅡ'),
+    ('kumamoto', '熊本', '87', 'FⅡ'),
+    ('tachikawa', '立川', '28', 'FⅡ'),
+    ('matsuyama', '松山', '75', 'FⅡ'),
+    ('yahiko', '弥彦', '21', 'FⅡ'),
+    ('ogaki', '大垣', '44', 'FⅡ'),
+]
+
+PREFECTURES = ['北海道', '青森', '福島', '新潟', '群馬', '茨城', '栃木', '埼玉', '東京', '千葉',
+               '神奈川', '静岡', '愛知', '岐阜', '富山', '三重', '福井', '奈良', '京都', '和歌山',
+               '大阪', '岡山', '広島', '山口', '香川', '徳島', '高知', '愛媛', '福岡', '佐賀', '長崎', '大分', '熊本']
+FAMILY_NAMES = ['佐藤', '鈴木', '高橋', '田中', '伊藤', '渡辺', '山本', '中村', '小林', '加藤',
+                '吉田', '山田', '佐々木', '山口', '松本', '井上', '木村', '林', '清水', '山崎']
+GIVEN_NAMES = ['翔', '大輔', '拓也', '健太', '直樹', '亮', '隆', '誠', '和也', '慎太郎',
+               '雄一', '剛', '達也', '勇気', '光', '颯', '蓮', '陽斗', '悠真', '湊']
+KIMARITE = ['逃げ', '捲り', '差し', 'マーク']
+
+PATH_RE = re.compile(r'^/(?P<slug>[a-z]+)/(?P<kind>racecard|raceresult|racedetail)/(?P<id>\d+)/?$')
+
+
+def kaisai_id(code: str, day: date, nth_day: int) -> str:
+    """開催ID（14桁）= 場コード2桁 + 日付8桁 + 開催日目2桁 + 00"""
+    return f"{code}{day:%Y%m%d}{nth_day:02d}00"
+
+
+class MockSite:
+    """
+    合成ページの生成器
+
+    同じ race_id に対しては常に同じ内容（選手・ライン・着順・オッズ）を返す。
+    """
+
+    def __init__(self, venues: int = 6, races_per_venue: int = 12, riders: int = 9,
+                 seed: int = 0, today: Optional[date] = None):
+        self.venues = MOCK_VENUES[:max(1, min(venues, len(MOCK_VENUES)))]
+        self.races_per_venue = races_per_venue
+        self.riders = max(5, min(riders, 9))
+        self.seed = seed
+        self.today = today or date.today()
+
+    # ── 開催 ─────────────────────────────────────────────
+    def kaisai_ids(self, date_type: str = 'today') -> List[Tuple[str, str, str]]:
+        """[(スラッグ, 場名, 開催ID)]"""
+        day = self.today if date_type == 'today' else self.today - timedelta(days=1)
+        nth = 2 if date_type == 'today' else 1
+        return [(slug, name, kaisai_id(code, day, nth)) for slug, name, code, _ in self.venues]
+
+    def race_ids(self, date_type: str = 'today') -> List[Tuple[str, str]]:
+        """[(スラッグ, racedetail ID)] 全開催場・全レース"""
+        return [(slug, f"{kid}{no:02d}")
+                for slug, _, kid in self.kaisai_ids(date_type)
+                for no in range(1, self.races_per_venue + 1)]
+
+    def _rng(self, race_id: str) -> random.Random:
+        return random.Random(f"{self.seed}:{race_id}")
+
+    def _race(self, race_id: str) -> Dict:
+        """レース内容（選手・ライン・着順）を合成する"""
+        rng = self._rng(race_id)
+        riders = []
+        for bib in range(1, self.riders + 1):
+            racer_no = rng.randint(10000, 16999)
+            riders.append({
+                'bib': bib,
+                'racer_no': racer_no,
+                'name': rng.choice(FAMILY_NAMES) + '　' + rng.choice(GIVEN_NAMES),
+                'pref': rng.choice(PREFECTURES),
+                'age': rng.randint(19, 55),
+                'term': rng.randint(70, 127),
+                'class': rng.choice(['S1', 'S2', 'A1', 'A2']),
+                'style': rng.choice(['逃', '両', '追']),
+                'gear': rng.choice(['3.92', '3.93', '4.00', '4.07']),
+                'score': round(rng.uniform(80.0, 118.0), 2),
+                'stats': [rng.randint(0, 20) for _ in range(10)],
+            })
+
+        bibs = list(range(1, self.riders + 1))
+        rng.shuffle(bibs)
+        lines, i = [], 0
+        while i < len(bibs):
+            size = min(len(bibs) - i, rng.choice([1, 2, 3, 3, 4]))
+            lines.append(bibs[i:i + size])
+            i += size
+
+        order = list(range(1, self.riders + 1))
+        rng.shuffle(order)
+        return {'riders': riders, 'lines': lines, 'order': order, 'rng': rng}
+
+    # ── ページ ───────────────────────────────────────────
+    def top_page(self) -> str:
+        blocks = []
+        today_ids = {slug: kid for slug, _, kid in self.kaisai_ids('today')}
+        prev_ids = {slug: kid for slug, _, kid in self.kaisai_ids('yesterday')}
+        for slug, name, _, grade in self.venues:
+            blocks.append(f"""
+<dl class="race_list">
+  <dt><p class="velodrome">{name}</p>
+    <ul><li class="icon_grade {grade}">{grade}</li></ul></dt>
+  <dd>
+    <div class="previous">
+      <p class="day">初日</p>
+      <ul><li class="result"><a href="/{slug}/raceresult/{prev_ids[slug]}/">結果</a></li></ul>
+    </div>
+    <div class="current">
+      <p class="day">2日目</p>
+      <a href="/{slug}/racecard/{today_ids[slug]}/">出走表</a>
+      <span class="race">{(sum(map(ord, slug)) % self.races_per_venue) + 1}R</span>
+      <span class="num">{10 + len(slug) % 8}:{(len(slug) * 7) % 60:02d}</span>
+    </div>
+  </dd>
+</dl>""")
+        return f"<html><head><title>Kドリームス</title></head><body><div id='kaisai'>{''.join(blocks)}</div></body></html>"
+
+    def racecard_page(self, slug: str, kid: str) -> str:
+        links = ''.join(f'<li><a href="/{slug}/racedetail/{kid}{no:02d}/">{no}R</a></li>'
+                        for no in range(1, self.races_per_venue + 1))
+        return f"<html><body><ul class='race_num'>{links}</ul></body></html>"
+
+    def racedetail_page(self, race_id: str) -> str:
+        race = self._race(race_id)
+        rows = []
+        for r in race['riders']:
+            stat_cells = ''.join(f'<td>{v}</td>' for v in r['stats'])
+            rows.append(f"""
+<tr class="n{r['bib']}">
+  <td class="tip"></td><td class="kiai"></td><td class="bracket">{(r['bib'] + 1) // 2}</td>
+  <td class="num"><span>{r['bib']}</span></td>
+  <td class="rider"><a href="/racer/profile/{r['racer_no']}/">{r['name']}</a><br>{r['pref']}/{r['age']}/{r['term']}</td>
+  <td><span>{r['class']}</span></td><td>{r['style']}</td><td>{r['gear']}</td>
+  <td class="bdr_r">{r['score']}</td>{stat_cells}
+  <td class="evaluation">B</td>
+</tr>""")
+        spans = []
+        for n, line in enumerate(race['lines']):
+            if n:
+                spans.append('<span class="icon_p space"></span>')
+            for bib in line:
+                spans.append(f'<span class="icon_p"><span class="p{bib:03d}">{bib}</span><span class="name">x</span></span>')
+        return f"""<html><body>
+<div class="racecard_wrapper"><table class="racecard_table">
+<tr><th>予想</th><th>好気合</th><th>枠</th><th>車番</th><th>選手名</th></tr>{''.join(rows)}
+</table></div>
+<div class="line_position">{''.join(spans)}</div>
+</body></html>"""
+
+    def result_page(self, race_id: str) -> str:
+        race = self._race(race_id)
+        rng = race['rng']
+        by_bib = {r['bib']: r for r in race['riders']}
+        rows = []
+        for rank, bib in enumerate(race['order'], 1):
+            r = by_bib[bib]
+            margin = '' if rank == 1 else rng.choice(['1/2車身', '1車身', 'タイヤ差', '3/4車身'])
+            kimarite = rng.choice(KIMARITE) if rank <= 2 else ''
+            sb = rng.choice(['', 'S', 'B', ''])
+            rows.append(f"""
+<tr><td class="tip"></td><td>{rank}</td><td class="num"><span>{bib}</span></td>
+<td class="rider"><a href="/racer/profile/{r['racer_no']}/">{r['name']}</a></td>
+<td>{margin}</td><td>{rng.uniform(10.8, 12.5):.1f}</td><td>{kimarite}</td><td>{sb}</td><td class="comment">-</td></tr>""")
+        return f"""<html><body><table class="result_table">
+<thead><tr><th>予想</th><th>着</th><th>車番</th><th>選手名</th><th>着差</th><th>上り</th><th>決まり手</th><th>S/B</th><th>勝敗因</th></tr></thead>
+<tbody>{''.join(rows)}</tbody></table></body></html>"""
+
+    def odds_page(self, race_id: str, limit: int = 50) -> str:
+        rng = self._rng(race_id + ':odds')
+        combos = list(permutations(range(1, self.riders + 1), 3))
+        rng.shuffle(combos)
+        combos = combos[:limit]
+        odds = sorted(round(rng.uniform(3.0, 900.0), 1) for _ in combos)
+        rows = ''.join(f'<tr><th>{i}</th><td><span class="num">{a}-{b}-{c}</span><span class="odds">{o}</span></td></tr>'
+                       for i, ((a, b, c), o) in enumerate(zip(combos, odds), 1))
+        return f"""<html><body><div class="oddspop_table_wrapper"><table>{rows}</table>
+<table><tr><th>-</th><td>-</td></tr></table></div></body></html>"""
+
+    def render(self, path: str, query: Dict[str, List[str]]) -> Optional[str]:
+        """パスに対応するページを返す（該当なしは None）"""
+        if path in ('', '/'):
+            return self.top_page()
+        m = PATH_RE.match(path)
+        if not m:
+            return None
+        slug, kind, page_id = m.group('slug'), m.group('kind'), m.group('id')
+        if kind in ('racecard', 'raceresult'):
+            return self.racecard_page(slug, page_id)
+        page_type = query.get('pageType', [''])[0]
+        if page_type == 'result':
+            return self.result_page(page_id)
+        if page_type == 'odds':
+            return self.odds_page(page_id)
+        return self.racedetail_page(page_id)
+
+
+class MockKdreamsServer:
+    """
+    MockSite をHTTPで配信するサーバー（別スレッドで起動）
+
+    使い方:
+        with MockKdreamsServer(latency=0.05, error_rate=0.01) as server:
+            scraper = KdreamsScraper(base_url=server.url)
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 0, latency: float = 0.0,
+                 jitter: float = 0.0, error_rate: float = 0.0, error_status: int = 503,
+                 site: Optional[MockSite] = None, **site_kwargs):
+        """
+        Args:
+            host, port: 待ち受けアドレス（port=0 で空きポートを自動選択）
+            latency: 1レスポンスごとの固定遅延（秒）
+            jitter: 遅延に加えるランダム幅（0〜jitter秒）
+            error_rate: エラー応答を返す確率（0.0〜1.0）
+            error_status: エラー時のHTTPステータス
+            site: ページ生成器（省略時は site_kwargs から MockSite を作成）
+        """
+        self.site = site or MockSite(**site_kwargs)
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.request_count = 0
+        self.error_count = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                parts = urlsplit(self.path)
+                with server._lock:
+                    server.request_count += 1
+                    failed = server.error_rate > 0 and random.random() < server.error_rate
+                    if failed:
+                        server.error_count += 1
+
+                delay = server.latency + (random.uniform(0, server.jitter) if server.jitter else 0.0)
+                if delay > 0:
+                    time.sleep(delay)
+
+                if failed:
+                    self._send(server.error_status, 'Service Unavailable')
+                    return
+                body = server.site.render(parts.path, parse_qs(parts.query))
+                if body is None:
+                    self._send(404, 'Not Found')
+                    return
+                self._send(200, body)
+
+            def _send(self, status: int, body: str):
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> 'MockKdreamsServer':
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'MockKdreamsServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kドリームス モックサーバー")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--venues", type=int, default=6)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockKdreamsServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                               error_rate=args.error_rate, venues=args.venues)
+    print(f"モックサーバー起動: {server.url}  (Ctrl+Cで終了)")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
@@ -0,0 +1,698 @@
+"""
+Kドリームス HTML解析モジュール
+取得済みのHTML（bytes または str）から各ページのデータを取り出す純粋関数群。
+HTTP通信・待機は行わないため、保存済みページの一括解析や並列処理にそのまま使える。
+"""
+import html as html_lib
+import re
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Union
+
+import pandas as pd
+from bs4 import BeautifulSoup, Comment, NavigableString, SoupStrainer, UnicodeDammit
+
+
+BASE_URL = "https://keirin.kdreams.jp"
+
+# 出走表の固定ヘッダー（19カラム - 予想、好気合、総評、枠番を除外）
+RACE_CARD_HEADERS = [
+    '車番', '選手名', '府県', '年齢', '期別',
+    '級班', '脚質', 'ギヤ倍数', '競走得点', 'S', 'B',
+    '逃', '捲', '差', 'マ', '1着', '2着', '3着', '着外'
+]
+
+RESULT_COLUMNS = ['着順', '車番', '選手名', '着差', '上がり', '決まり手', 'S/B', '選手コード']
+
+# 選手プロフィールへのリンクから選手コード（登録番号）を取り出す
+RIDER_CODE_RE = re.compile(r'(\d{4,})/?(?:\?|$)')
+
+# Gradeの並び順
+GRADE_ORDER = {
+    'ＧⅠ': 1, 'GⅠ': 1, 'GI': 1,
+    'ＧⅡ': 2, 'GⅡ': 2, 'GII': 2,
+    'ＧⅢ': 3, 'GⅢ': 3, 'GIII': 3,
+    'ＦⅠ': 4, 'FⅠ': 4, 'FI': 4,
+    'ＦⅡ': 5, 'FⅡ': 5, 'FII': 5,
+    'F級': 9
+}
+
+Html = Union[bytes, str]
+
+
+def rider_code(td) -> str:
+    """選手セル内のプロフィールリンクから選手コードを取り出す（リンクがなければ空文字）"""
+    link = td.find('a', href=True)
+    if not link:
+        return ''
+    m = RIDER_CODE_RE.search(link['href'])
+    return m.group(1) if m else ''
+
+
+# ── ページ種別ごとの解析対象 ─────────────────────────────
+# 各ページで必要な領域だけをDOMとして組み立てる（それ以外の要素はツリーに入れない）
+STRAINERS = {
+    'top': SoupStrainer('dl', class_='race_list'),
+    'card': SoupStrainer('table', class_='racecard_table'),
+    'lines': SoupStrainer('div', class_='line_position'),
+    'result': SoupStrainer('table', class_='result_table'),
+    'odds': SoupStrainer('div', class_='oddspop_table_wrapper'),
+    'tables': SoupStrainer('table'),
+}
+
+# 要素ごとのラムダ・インライン re.match の代わりに使う、事前コンパイル済みの照合
+RACECARD_HREF_RE = re.compile(r'/racecard/|/AllRaceList\.do')
+ROW_CLASS_RE = re.compile(r'^n\d$')             # 出走表の選手行（n1〜n9）
+BIB_CLASS_RE = re.compile(r'^p0+([1-9])$')      # ラインの車番（p001〜p009）
+PREDICTION_LABEL_RE = re.compile(r'並び|ライン')
+PREDICTION_RE = re.compile(r'(\d+[-‐]\d+[-‐]\d+)')
+DIGIT_RE = re.compile(r'\d')
+NUMBER_RE = re.compile(r'\d+')
+# get_text() の代わりにタグ・コメント・script/style を取り除く
+_NON_TEXT_RE = re.compile(r'<script\b.*?</script\s*>|<style\b.*?</style\s*>|<!--.*?-->|<[^>]*>', re.S | re.I)
+# 並び予想の見出しの前後で解析する範囲（文字数）と、見出しを囲む要素を探すための開きタグ
+PREDICTION_WINDOW = 4000
+_OPEN_TAG_RE = re.compile(r'<([a-zA-Z][\w:-]*)\b[^>]*?(/?)>')
+_VOID_TAGS = frozenset(('area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param',
+                        'source', 'track', 'wbr'))
+
+# 出走表・結果で個別に扱うセルのクラス
+CARD_SKIP_CLASSES = frozenset(('tip', 'kiai', 'evaluation', 'bracket'))
+RESULT_SPECIAL_CLASSES = frozenset(('tip', 'num', 'rider', 'comment'))
+
+
+def _decode(html: Html) -> str:
+    """bytes の場合はUTF-8を優先して文字コードを判定する"""
+    if isinstance(html, bytes):
+        return UnicodeDammit(html, ['utf-8']).unicode_markup
+    return html
+
+
+def _soup(html: Html, target: Optional[str] = None) -> BeautifulSoup:
+    """
+    HTMLを解析する
+
+    Args:
+        target: STRAINERS のキー（指定時はその領域だけをツリーにする）
+    """
+    strainer = STRAINERS[target] if target else None
+    return BeautifulSoup(_decode(html), 'html.parser', parse_only=strainer)
+
+
+def _cell_lines(td) -> List[str]:
+    """セルのテキストを <br> で区切った行のリスト（空行は除く）"""
+    parts = []
+    for node in td.descendants:
+        if isinstance(node, NavigableString):
+            if not isinstance(node, Comment):
+                parts.append(str(node))
+        elif node.name == 'br':
+            parts.append('\n')
+    return [line.strip() for line in ''.join(parts).split('\n') if line.strip()]
+
+
+def parse_races(html: Html, date_type: str = "today", base_url: str = BASE_URL) -> List[Dict]:
+    """
+    トップページから開催場一覧を取り出す
+
+    Args:
+        html: トップページのHTML
+        date_type: "today" (本日) または "yesterday" (前日)
+        base_url: 相対リンクを絶対URLにするためのベースURL
+
+    Returns:
+        レース情報のリスト（Gradeでソート済み）
+    """
+    soup = _soup(html, 'top')
+
+    races = []
+
+    # 開催レース一覧のセクションを探す (race_list クラス)
+    race_lists = soup.find_all('dl', class_='race_list')
+
+    for race_list in race_lists:
+        # 競輪場名を取得
+        velodrome_elem = race_list.find('p', class_='velodrome')
+        if not velodrome_elem:
+            continue
+
+        velodrome_name = velodrome_elem.get_text(strip=True)
+
+        # Gradeアイコンを取得
+        grade_icon = race_list.find('li', class_='icon_grade')
+        grade = "F級"
+        if grade_icon:
+            grade_text = grade_icon.get_text(strip=True)
+            if grade_text:
+                grade = grade_text
+
+        # 日付タイプに応じてセクションを選択
+        if date_type == "yesterday":
+            # 前日: div.previous 内の結果リンクを探す
+            target_section = race_list.find('div', class_='previous')
+            if not target_section:
+                continue
+
+            # 結果リンクを探す（li.result > a）
+            result_li = target_section.find('li', class_='result')
+            if not result_li:
+                continue
+            result_link = result_li.find('a')
+            if not result_link:
+                continue
+
+            race_url = result_link.get('href', '')
+            if race_url and not race_url.startswith('http'):
+                race_url = base_url.rstrip('/') + race_url
+
+            # 日程情報
+            day_elem = target_section.find('p', class_='day')
+            day_info = day_elem.get_text(strip=True) if day_elem else ""
+
+            race_status = "結果"
+            race_time = ""
+
+        else:  # today
+            # 本日: 元のロジックを使用（currentクラス）
+            current_div = race_list.find('div', class_='current')
+            if not current_div:
+                continue
+
+            # 出走表リンクを取得
+            racecard_link = current_div.find('a', href=RACECARD_HREF_RE)
+            if not racecard_link:
+                continue
+
+            race_url = racecard_link.get('href', '')
+            if race_url and not race_url.startswith('http'):
+                race_url = base_url.rstrip('/') + race_url
+
+            # レース状態を取得
+            status_elem = current_div.find('span', class_='race')
+            race_status = status_elem.get_text(strip=True) if status_elem else ""
+
+            # 締切時刻を取得
+            time_elem = current_div.find('span', class_='num')
+            race_time = time_elem.get_text(strip=True) if time_elem else ""
+
+            # 日程情報を取得
+            day_elem = current_div.find('p', class_='day')
+            day_info = day_elem.get_text(strip=True) if day_elem else ""
+
+        # レース情報を追加
+        races.append({
+            'name': f"{velodrome_name} ({grade}) {day_info}",
+            'url': race_url,
+            'grade': grade,
+            'velodrome': velodrome_name,
+            'status': race_status,
+            'time': race_time,
+            'day': day_info,
+            'date_type': date_type
+        })
+
+    # Gradeでソート
+    races.sort(key=lambda x: GRADE_ORDER.get(x['grade'], 10))
+    return races
+
+
+def parse_race_card(html: Html) -> pd.DataFrame:
+    """
+    racedetailページから出走表（19カラム・バリデーション付き）を取り出す
+
+    選手名セルにプロフィールへのリンクがあれば、その登録番号を「選手コード」列に入れる。
+
+    Returns:
+        出走表のDataFrame（テーブルがなければ空のDataFrame）
+    """
+    soup = _soup(html, 'card')
+
+    # 出走表テーブルを探す（class="racecard_table"）
+    table = soup.find('table', class_='racecard_table')
+
+    if not table:
+        print("出走表テーブルが見つかりませんでした")
+        return pd.DataFrame()
+
+    # 19カラム + 選手コード
+    headers = RACE_CARD_HEADERS + ['選手コード']
+
+    # データ行を抽出（class="n1", "n2", ... "n9"）
+    rows_data = []
+    for tr in table.find_all('tr'):
+        tr_class = tr.get('class', [])
+        # n1～n9のクラスを持つ行のみ処理
+        if not any(ROW_CLASS_RE.match(c) for c in tr_class):
+            continue
+
+        cells = tr.find_all('td')
+        row = {}  # 辞書形式で一時保存
+
+        for td in cells:
+            td_classes = td.get('class', [])
+
+            # クラス名でセルを識別
+            # 予想、好気合、総評、枠番のセルはスキップ
+            if CARD_SKIP_CLASSES.intersection(td_classes):
+                continue
+
+            elif 'num' in td_classes:
+                # 車番セル
+                span = td.find('span')
+                row['車番'] = span.get_text(strip=True) if span else td.get_text(strip=True)
+
+            elif 'rider' in td_classes:
+                # 選手名セル（特別処理: 選手名 + 府県/年齢/期別、<br> 区切り）
+                lines = _cell_lines(td)
+
+                # 選手名（1行目）
+                row['選手名'] = lines[0] if len(lines) > 0 else ''
+                row['選手コード'] = rider_code(td)
+
+                # 府県/年齢/期別（2行目）
+                if len(lines) > 1:
+                    info_parts = lines[1].split('/')
+                    row['府県'] = info_parts[0].strip() if len(info_parts) > 0 else ''
+                    row['年齢'] = info_parts[1].strip() if len(info_parts) > 1 else ''
+                    row['期別'] = info_parts[2].strip() if len(info_parts) > 2 else ''
+                else:
+                    row['府県'] = ''
+                    row['年齢'] = ''
+                    row['期別'] = ''
+
+        # クラスなしセルを順番に処理（級班、脚質、ギヤ倍数、統計データ）
+        # クラスなしセルのインデックスを取得
+        classless_cells = []
+        for td in cells:
+            td_classes = td.get('class', [])
+            # 特定のクラスを持たないセル、またはbdr_rだけのセル
+            if not td_classes or (len(td_classes) == 1 and 'bdr_r' in td_classes):
+                span = td.find('span')
+                text = span.get_text(strip=True) if span else td.get_text(strip=True)
+                classless_cells.append(text)
+
+        # クラスなしセルを順番にマッピング
+        # 期待順序: 級班、脚質、ギヤ倍数、競走得点、S、B、逃、捲、差、マ、1着、2着、3着、着外
+        cell_map = ['級班', '脚質', 'ギヤ倍数', '競走得点', 'S', 'B', '逃', '捲', '差', 'マ',
+                    '1着', '2着', '3着', '着外']
+
+        for i, col_name in enumerate(cell_map):
+            if i < len(classless_cells):
+                row[col_name] = classless_cells[i]
+            else:
+                row[col_name] = ''
+
+        # 19カラムすべてを含む行を作成（順序保証）
+        ordered_row = []
+        for header in headers:
+            ordered_row.append(row.get(header, ''))
+
+        if ordered_row:
+            rows_data.append(ordered_row)
+
+    if not rows_data:
+        print("データ行が見つかりませんでした")
+        return pd.DataFrame()
+
+    # DataFrameを作成
+    df = pd.DataFrame(rows_data, columns=headers)
+
+    # 数値変換（バリデーション付き）
+    # 車番: 1-9の整数
+    if '車番' in df.columns:
+        df['車番'] = pd.to_numeric(df['車番'], errors='coerce')
+        df.loc[(df['車番'] < 1) | (df['車番'] > 9), '車番'] = None
+
+    # 年齢: 18-70の整数
+    if '年齢' in df.columns:
+        df['年齢'] = pd.to_numeric(df['年齢'], errors='coerce')
+        df.loc[(df['年齢'] < 18) | (df['年齢'] > 70), '年齢'] = None
+
+    # 期別: 1-150の整数
+    if '期別' in df.columns:
+        df['期別'] = pd.to_numeric(df['期別'], errors='coerce')
+        df.loc[(df['期別'] < 1) | (df['期別'] > 150), '期別'] = None
+
+    # その他の数値カラム（総評を除外）
+    numeric_cols = ['ギヤ倍数', '競走得点', 'S', 'B', '逃', '捲', '差', 'マ',
+                    '1着', '2着', '3着', '着外']
+    for col in numeric_cols:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    return df
+
+
+def _enclosing_tag(text: str, pos: int) -> Optional[re.Match]:
+    """
+    pos の直前 PREDICTION_WINDOW 文字にある開きタグのうち、pos までに閉じていない最も内側のもの（なければ None）
+
+    同じ名前の開きタグ・閉じタグの数だけを比べる簡易な判定で、範囲外から始まる要素は探さない。
+    """
+    tags = [m for m in _OPEN_TAG_RE.finditer(text, max(0, pos - PREDICTION_WINDOW), pos)
+            if not m.group(2) and m.group(1).lower() not in _VOID_TAGS]
+    lowered = text[tags[0].start():pos].lower() if tags else ''
+    for tag in reversed(tags):
+        name = tag.group(1).lower()
+        offset = tag.end() - tags[0].start()
+        if lowered.count(f'</{name}', offset) <= len(re.findall(rf'<{name}\b', lowered[offset:])):
+            return tag
+    return None
+
+
+def parse_line_prediction(html: Html) -> str:
+    """
+    ライン予想（並び予想）を文字列で取り出す
+
+    Returns:
+        ライン予想文字列（例: "123-45-6"、見つからなければ空文字）
+    """
+    text = _decode(html)
+
+    # 「並び予想」の見出しを文字列で探し、見出しを囲む要素の開きタグから PREDICTION_WINDOW 文字だけをDOMにする
+    label = PREDICTION_LABEL_RE.search(text)
+    tag = _enclosing_tag(text, label.start()) if label else None
+    if tag is not None:
+        region = text[tag.start():label.end() + PREDICTION_WINDOW]
+        strainer = SoupStrainer(tag.group(1).lower())
+        line_section = BeautifulSoup(region, 'html.parser', parse_only=strainer).find(string=PREDICTION_LABEL_RE)
+        if line_section:
+            # 親要素から数字を抽出
+            parent = line_section.parent
+            if parent:
+                numbers = DIGIT_RE.findall(parent.get_text())
+                if numbers:
+                    # 連続する数字をグループ化（ヒューリスティック）
+                    return ''.join(numbers)
+
+    # フォールバック: ページ全体のテキストから数字パターンを探す（DOMは組み立てない）
+    text_content = html_lib.unescape(_NON_TEXT_RE.sub('', text))
+    line_match = PREDICTION_RE.search(text_content)
+    if line_match:
+        return line_match.group(1).replace('‐', '-')
+
+    return ""
+
+
+def parse_3rentan_odds(html: Html) -> pd.DataFrame:
+    """
+    3連単オッズページから (1着,2着,3着,オッズ) を取り出す
+    """
+    soup = _soup(html, 'tables')
+
+    # オッズテーブルを探す
+    odds_data = []
+
+    # パターン1: テーブル形式
+    tables = soup.find_all('table')
+    for table in tables:
+        rows = table.find_all('tr')
+        for row in rows:
+            cells = row.find_all(['td', 'th'])
+            cell_texts = [c.get_text(strip=True) for c in cells]
+
+            # 3連単パターンを探す（1-2-3形式または別々のセル）
+            if len(cell_texts) >= 4:
+                # 数字を抽出
+                numbers = []
+                for text in cell_texts:
+                    numbers.extend(NUMBER_RE.findall(text))
+
+                if len(numbers) >= 4:
+                    # 最後が小数点を含む可能性があるオッズ値
+                    try:
+                        odds_value = float(numbers[3]) if '.' in cell_texts[-1] else float(numbers[3])
+                        odds_data.append({
+                            '1着': int(numbers[0]),
+                            '2着': int(numbers[1]),
+                            '3着': int(numbers[2]),
+                            'オッズ': odds_value
+                        })
+                    except (ValueError, IndexError):
+                        continue
+
+    if odds_data:
+        return pd.DataFrame(odds_data)
+
+    return pd.DataFrame(columns=['1着', '2着', '3着', 'オッズ'])
+
+
+def parse_odds(html: Html) -> pd.DataFrame:
+    """
+    オッズページから3連単の人気順オッズを取り出す
+
+    Returns:
+        人気順オッズのDataFrame (順位, 組み合わせ, オッズ)
+    """
+    soup = _soup(html, 'odds')
+
+    # オッズセクションを探す
+    odds_sections = soup.find_all('div', class_='oddspop_table_wrapper')
+
+    if not odds_sections:
+        print("⚠️ オッズセクションが見つかりません（JavaScriptレンダリングが必要な可能性）")
+        return pd.DataFrame()
+
+    # 3連単セクション（最初のセクション）
+    sanrentan_section = odds_sections[0]
+
+    # テーブルを取得（1つ目が人気順）
+    tables = sanrentan_section.find_all('table')
+
+    if not tables:
+        print("⚠️ オッズテーブルが見つかりません")
+        return pd.DataFrame()
+
+    # 人気順テーブル（1つ目）
+    popular_table = tables[0]
+    rows = popular_table.find_all('tr')
+
+    odds_data = []
+    for row in rows:
+        th = row.find('th')
+        td = row.find('td')
+
+        if th and td:
+            rank = th.get_text(strip=True)
+            num_span = td.find('span', class_='num')
+            odds_span = td.find('span', class_='odds')
+
+            if num_span and odds_span:
+                combination = num_span.get_text(strip=True)
+                odds = odds_span.get_text(strip=True)
+                odds_data.append({
+                    '順位': rank,
+                    '組み合わせ': combination,
+                    'オッズ': odds
+                })
+
+    return pd.DataFrame(odds_data)
+
+
+def parse_race_results(html: Html) -> pd.DataFrame:
+    """
+    結果ページ（?pageType=result）からレース結果を取り出す
+
+    Returns:
+        レース結果のDataFrame (着順,車番,選手名,着差,上がり,決まり手,S/B,選手コード)
+    """
+    soup = _soup(html, 'result')
+
+    # result_tableクラスのテーブルを探す
+    result_table = soup.find('table', class_='result_table')
+
+    if not result_table:
+        print("結果テーブルが見つかりません")
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+
+    # データ行を取得
+    tbody = result_table.find('tbody')
+    if tbody:
+        data_rows = tbody.find_all('tr')
+    else:
+        # tbody がない場合は直接 tr を取得（ヘッダーをスキップ）
+        data_rows = result_table.find_all('tr')[1:]
+
+    results = []
+
+    for row in data_rows:
+        cells = row.find_all('td')
+
+        if len(cells) > 0:
+            # インデックスベースでセルを取得
+            # HTML構造: tip(予想), 着順, num(車番), rider(選手名), 着差, 上がり, 決まり手, S/B, comment(勝敗因)
+
+            chakujun_num = ''
+            shaban = ''
+            senshu = ''
+            senshu_code = ''
+            chakusa = ''
+            agari = ''
+            kimarite = ''
+            sb = ''
+
+            # 各セルを順番に処理
+            for i, td in enumerate(cells):
+                td_classes = td.get('class', [])
+                text = td.get_text(strip=True)
+
+                # クラスベースで特定できるセル
+                if 'tip' in td_classes:
+                    # 予想マーク - スキップ（位置: 0）
+                    continue
+                elif 'num' in td_classes:
+                    # 車番（位置: 2）
+                    shaban = text
+                elif 'rider' in td_classes:
+                    # 選手名（位置: 3）
+                    senshu = text
+                    senshu_code = rider_code(td)
+                elif 'comment' in td_classes:
+                    # コメント（位置: 8） - スキップ
+                    continue
+
+            # 位置ベースで通常セルを取得（クラスなしのtd）
+            # インデックスを数えて正確に割り当て
+            normal_cell_index = 0
+            for i, td in enumerate(cells):
+                td_classes = td.get('class', [])
+
+                # 特殊クラスを持つセルはスキップ
+                if RESULT_SPECIAL_CLASSES.intersection(td_classes):
+                    continue
+
+                text = td.get_text(strip=True)
+
+                # 通常セルの順序: 着順(0), 着差(1), 上がり(2), 決まり手(3), S/B(4)
+                if normal_cell_index == 0:
+                    chakujun_num = text
+                elif normal_cell_index == 1:
+                    chakusa = text
+                elif normal_cell_index == 2:
+                    agari = text
+                elif normal_cell_index == 3:
+                    kimarite = text
+                elif normal_cell_index == 4:
+                    sb = text
+
+                normal_cell_index += 1
+
+            # 結果データを構築
+            results.append({
+                '着順': chakujun_num,
+                '車番': shaban,
+                '選手名': senshu,
+                '着差': chakusa,
+                '上がり': agari,
+                '決まり手': kimarite,
+                'S/B': sb,
+                '選手コード': senshu_code,
+            })
+
+    if results:
+        return pd.DataFrame(results)
+
+    return pd.DataFrame(columns=RESULT_COLUMNS)
+
+
+def parse_race_lines(html: Html) -> List[Dict]:
+    """
+    racedetailページからライン構成を取り出す
+
+    HTML構造:
+      <div class="line_position">
+        <span class="icon_p"><span class="p007">7</span>...</span>  # 車番7
+        <span class="icon_p"><span class="p001">1</span>...</span>  # 車番1
+        <span class="icon_p space"></span>                          # ライン区切り
+        <span class="icon_p"><span class="p002">2</span>...</span>  # 車番2
+        ...
+      </div>
+
+    Returns:
+        [{"line": 1, "bibs": [7, 1]}, {"line": 2, "bibs": [2, ...]}, ...]
+    """
+    soup = _soup(html, 'lines')
+
+    # line_position div 内の span.icon_p を値得る
+    line_pos_div = soup.find('div', class_='line_position')
+    if not line_pos_div:
+        return []
+
+    result   = []
+    line_no  = 1
+    cur_bibs: List[int] = []
+    seen:     set       = set()
+
+    for span in line_pos_div.find_all('span', class_='icon_p'):
+        classes = span.get('class', [])
+
+        # space クラス = ライン区切り
+        if 'space' in classes:
+            if cur_bibs:
+                result.append({"line": line_no, "bibs": cur_bibs})
+                line_no += 1
+                cur_bibs = []
+                seen     = set()
+            continue
+
+        # p00X クラスを持つ子要素から車番を取得
+        # 例: p007 → 7号車, p001 → 1号車
+        for child in span.find_all('span'):
+            child_classes = child.get('class', [])
+            for c in child_classes:
+                m = BIB_CLASS_RE.match(c)   # p001/p007 など
+                if m:
+                    b = int(m.group(1))
+                    if b not in seen:
+                        seen.add(b)
+                        cur_bibs.append(b)
+
+    # 末尾のライン
+    if cur_bibs:
+        result.append({"line": line_no, "bibs": cur_bibs})
+
+    return result
+
+
+def format_lines_text(lines: List[Dict]) -> str:
+    """
+    parse_race_lines() の結果を人間可読な文字列にする
+
+    例: "ライン1: 3-5-1 / ライン2: 4-7 / ライン3: 2-6-8-9"
+    """
+    if not lines:
+        return "ライン情報なし"
+    parts = []
+    for ln in lines:
+        bib_str = "-".join(str(b) for b in ln["bibs"])
+        parts.append(f"ライン{ln['line']}: {bib_str}")
+    return " / ".join(parts)
+
+
+# ページ種別 → 解析関数
+PARSERS = {
+    'top': parse_races,
+    'racedetail': parse_race_card,
+    'lines': parse_race_lines,
+    'result': parse_race_results,
+    'odds': parse_odds,
+}
+
+
+def parse_many(pages: Iterable[Html], page_type: str, max_workers: Optional[int] = None,
+               chunksize: int = 64) -> List:
+    """
+    同じ種別のページを一括解析する（max_workers > 1 ならプロセス並列）
+
+    Args:
+        pages: HTMLのイテラブル
+        page_type: PARSERS のキー（"racedetail", "lines", "result", "odds", "top"）
+        max_workers: 並列プロセス数（None または 1 なら逐次処理）
+
+    Returns:
+        解析結果のリスト（入力と同じ順序）
+    """
+    parser = PARSERS[page_type]
+    if not max_workers or max_workers <= 1:
+        return [parser(html) for html in pages]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(parser, pages, chunksize=chunksize))
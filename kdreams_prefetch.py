@@ -0,0 +1,111 @@
+"""
+選択中の開催場の先読み
+サイドバーで開催場が選ばれた時点で、1R〜12Rの racedetail・結果ページをレース順にバックグラウンドで取得し、
+スクレイパーのレスポンスキャッシュに入れておく。取得はスクレイパーのレート制限に従う。
+別の開催場が選ばれたら、未取得の分は破棄して新しい開催場の先読みに切り替える。
+
+使い方:
+    scraper = KdreamsScraper(response_cache=ResponseCache(ttl=300))
+    prefetcher = Prefetcher(scraper).start()
+    prefetcher.prefetch_venue(racecard_url)
+"""
+import threading
+from collections import deque
+from typing import Dict, List, Optional
+
+from kdreams_governor import request_context
+from kdreams_scraper import KdreamsScraper
+
+
+class Prefetcher:
+    """
+    1本のワーカースレッドで先読みするキュー（スレッドセーフ）
+
+    キューには常に「最後に選ばれた開催場」のURLだけが並ぶ。
+    """
+
+    def __init__(self, scraper: KdreamsScraper):
+        """
+        Args:
+            scraper: 取得に使うスクレイパー（response_cache を指定したもの）
+        """
+        if scraper.response_cache is None:
+            raise ValueError("先読みにはレスポンスキャッシュ（response_cache）が必要です")
+        self.scraper = scraper
+        self._cond = threading.Condition()
+        self._queue: deque = deque()
+        self._venue_url: Optional[str] = None
+        self._total = 0
+        self._done = 0
+        self._failed = 0
+        self._stop = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> 'Prefetcher':
+        """ワーカースレッドを開始する（起動済みなら何もしない）"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop = False
+            self._thread = threading.Thread(target=self._run, name='kdreams-prefetch', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        with self._cond:
+            self._stop = True
+            self._queue.clear()
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def prefetch_venue(self, racecard_url: str) -> None:
+        """
+        開催場の全レースの先読みを予約する
+
+        同じ開催場を続けて指定しても予約し直さない（Streamlitの再実行ごとに呼んでよい）。
+        """
+        with self._cond:
+            if racecard_url == self._venue_url:
+                return
+        races = self.scraper.get_all_races_from_venue(racecard_url)
+        urls: List[str] = []
+        for race in races:
+            urls.extend(self.scraper.race_page_urls(race['url']))
+        with self._cond:
+            self._venue_url = racecard_url
+            self._queue = deque(urls)
+            self._total = len(urls)
+            self._done = 0
+            self._failed = 0
+            self._cond.notify_all()
+
+    def _run(self) -> None:
+        with request_context(client='prefetch', priority='background'):
+            self._loop()
+
+    def _loop(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._stop:
+                    self._cond.wait()
+                if self._stop:
+                    return
+                url = self._queue.popleft()
+                venue_url = self._venue_url
+            ok = self.scraper.prefetch(url)
+            with self._cond:
+                # 取得中に別の開催場へ切り替わった場合は数えない
+                if venue_url == self._venue_url:
+                    self._done += 1
+                    if not ok:
+                        self._failed += 1
+
+    def status(self) -> Dict:
+        """先読みの進み具合 {"venue_url", "done", "total", "failed", "pending"}"""
+        with self._cond:
+            return {
+                'venue_url': self._venue_url,
+                'done': self._done,
+                'total': self._total,
+                'failed': self._failed,
+                'pending': len(self._queue),
+            }
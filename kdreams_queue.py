@@ -0,0 +1,438 @@
+"""
+分散クロール用のジョブキュー（SQLite）
+長期間のバックフィルをレース単位のジョブに分け、同じマシンの複数プロセスや、共有ディレクトリを
+使う複数マシンのワーカーに貸し出す（リース）。ワーカーが落ちてもリース期限が切れたジョブは
+別のワーカーが取り直すため、取りこぼしはない。
+
+  - キュー: <共有ディレクトリ>/queue.sqlite（WALモード、ジョブの貸し出しは BEGIN IMMEDIATE で排他）
+  - 出力: ワーカーごとの ParquetSink（<out>/<ワーカーID>/出走表.parquet など）。書き出し後に完了を記録する
+  - リクエスト予算: 全ワーカーが同じロックファイルの Governor を使い、合計で min_interval 秒に1リクエスト
+
+共有ディレクトリを複数マシンで使う場合は、SQLite とファイルロック（flock）が正しく動くファイルシステムが必要。
+
+使い方:
+    python kdreams_queue.py enqueue shared/ --date yesterday            # 開催場一覧の全レースを登録
+    python kdreams_queue.py enqueue shared/ 35202610180200 ...           # 開催ID（14桁）・レースID（16桁）・URLで登録
+    python kdreams_queue.py work shared/ --processes 4 --interval 1.0  # ワーカー4プロセス
+    python kdreams_queue.py stats shared/                                # 件数・スループット・遅れ
+"""
+import os
+import re
+import socket
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from kdreams_governor import Governor, request_context
+from kdreams_scraper import KdreamsScraper
+
+
+QUEUE_FILE = 'queue.sqlite'
+LOCK_FILE = 'governor.lock'
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    race_id     TEXT PRIMARY KEY,
+    url         TEXT NOT NULL DEFAULT '',
+    venue_name  TEXT NOT NULL DEFAULT '',
+    status      TEXT NOT NULL DEFAULT 'pending',
+    attempts    INTEGER NOT NULL DEFAULT 0,
+    available_at REAL NOT NULL DEFAULT 0,
+    owner       TEXT,
+    lease_until REAL,
+    enqueued_at REAL NOT NULL,
+    finished_at REAL,
+    error       TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, race_id);
+CREATE INDEX IF NOT EXISTS jobs_finished ON jobs (finished_at);
+"""
+
+
+def worker_id() -> str:
+    """マシン名-プロセスID-乱数（ワーカーの識別子・出力ディレクトリ名）"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+
+class JobQueue:
+    """
+    レースID単位のジョブキュー（スレッド・プロセス・マシン間で共有できる）
+
+    ジョブの状態: pending（未着手）→ leased（貸し出し中）→ done（完了）/ failed（max_attempts 回失敗）
+    リース期限が切れた leased は pending と同じに扱う。失敗して pending に戻したジョブは
+    retry_delay × 試行回数 秒たつまで貸し出さない。
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, timeout: float = 30.0, retry_delay: float = 30.0):
+        """
+        Args:
+            path: SQLiteファイル
+            max_attempts: 1ジョブの最大試行回数
+            timeout: ロック待ちの上限（秒）
+            retry_delay: 失敗したジョブを再び貸し出すまでの待ち時間（秒、試行回数に比例して延ばす）
+        """
+        self.path = path
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.retry_delay = retry_delay
+        conn = sqlite3.connect(path, timeout=timeout)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.executescript(_SCHEMA)
+            # available_at 列がない古いキューに列を追加する
+            columns = [row[1] for row in conn.execute('PRAGMA table_info(jobs)')]
+            if 'available_at' not in columns:
+                conn.execute('ALTER TABLE jobs ADD COLUMN available_at REAL NOT NULL DEFAULT 0')
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _connect(self, immediate: bool = False) -> Iterator[sqlite3.Connection]:
+        # 接続はスレッドごと・呼び出しごとに開く（sqlite3 の接続はスレッド間で共有しない）
+        conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+        try:
+            # BEGIN がロック待ちで失敗したときはトランザクションがないので ROLLBACK しない
+            conn.execute('BEGIN IMMEDIATE' if immediate else 'BEGIN')
+            try:
+                yield conn
+                conn.execute('COMMIT')
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+        finally:
+            conn.close()
+
+    # ── 登録 ──────────────────────────────────────────
+
+    def enqueue(self, jobs: Iterable[Dict]) -> int:
+        """
+        ジョブを登録する（登録済みのレースIDは無視）
+
+        Args:
+            jobs: {"race_id", "url"（省略可）, "venue_name"（省略可）} の並び
+
+        Returns:
+            新たに登録した件数
+        """
+        now = time.time()
+        rows = [(str(job['race_id']), job.get('url', ''), job.get('venue_name', ''), now) for job in jobs]
+        with self._connect(immediate=True) as conn:
+            before = conn.total_changes
+            conn.executemany('INSERT OR IGNORE INTO jobs (race_id, url, venue_name, enqueued_at) VALUES (?, ?, ?, ?)', rows)
+            return conn.total_changes - before
+
+    def enqueue_venues(self, scraper: KdreamsScraper, venues: List[Dict]) -> int:
+        """get_races() の結果の全レースを登録する（開催場名・URL付き）"""
+        jobs = []
+        for venue in venues:
+            for race in scraper.get_all_races_from_venue(venue['url']):
+                jobs.append({'race_id': race['race_id'], 'url': race['url'], 'venue_name': venue['velodrome']})
+        return self.enqueue(jobs)
+
+    def enqueue_ids(self, scraper: KdreamsScraper, values: Iterable[str]) -> Tuple[int, List[str]]:
+        """
+        開催ID（14桁、1R〜12R）・レースID（16桁）・racedetail のURLを、URLと開催場名を解決して登録する
+
+        URLを組み立てられない（競輪場レジストリに場コードがない・形式が不正な）ものは登録しない。
+        ワーカー側では解決しないので、登録できたジョブは別マシンのワーカーでもそのまま取得できる。
+
+        Returns:
+            (新たに登録した件数, 登録しなかった値とその理由の一覧)
+        """
+        jobs, rejected = [], []
+        for value in values:
+            value = str(value).strip()
+            race_ids = [f"{value}{race_no:02d}" for race_no in range(1, 13)] if re.fullmatch(r'\d{14}', value) else [value]
+            for race in race_ids:
+                try:
+                    url = scraper.race_url_for(race)
+                except ValueError as e:
+                    rejected.append(f"{race}: {e}")
+                    continue
+                match = re.search(r'/racedetail/(\d{16})/', url)
+                if not match:
+                    rejected.append(f"{race}: racedetail のURLではありません")
+                    continue
+                venue = scraper.venue_registry.by_kdreams_code(match.group(1))
+                jobs.append({'race_id': match.group(1), 'url': url, 'venue_name': venue['venue_name'] if venue else ''})
+        return self.enqueue(jobs), rejected
+
+    # ── 貸し出し ──────────────────────────────────────
+
+    def lease(self, owner: str, limit: int = 12, lease_seconds: float = 300.0) -> List[Dict]:
+        """
+        未着手（またはリース切れ）のジョブをレースID順に最大 limit 件貸し出す
+
+        Returns:
+            [{"race_id", "url", "venue_name", "attempts"}]
+        """
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            # 試行回数を使い切ったリース切れのジョブは失敗にする
+            conn.execute("UPDATE jobs SET status = 'failed', owner = NULL, finished_at = ? "
+                         "WHERE status = 'leased' AND lease_until < ? AND attempts >= ?",
+                         (now, now, self.max_attempts))
+            rows = conn.execute(
+                "SELECT race_id, url, venue_name, attempts FROM jobs "
+                "WHERE (status = 'pending' AND available_at <= ?) OR (status = 'leased' AND lease_until < ?) "
+                "ORDER BY race_id LIMIT ?", (now, now, limit)).fetchall()
+            conn.executemany("UPDATE jobs SET status = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1 "
+                             "WHERE race_id = ?", [(owner, now + lease_seconds, row[0]) for row in rows])
+        return [{'race_id': r[0], 'url': r[1], 'venue_name': r[2], 'attempts': r[3] + 1} for r in rows]
+
+    def extend(self, race_ids: List[str], owner: str, lease_seconds: float = 300.0) -> None:
+        """貸し出し中のジョブのリース期限を延ばす"""
+        with self._connect(immediate=True) as conn:
+            conn.executemany("UPDATE jobs SET lease_until = ? WHERE race_id = ? AND owner = ? AND status = 'leased'",
+                             [(time.time() + lease_seconds, race_id, owner) for race_id in race_ids])
+
+    def complete(self, race_ids: List[str], owner: str) -> int:
+        """
+        ジョブを完了にする（リース切れで別のワーカーに移ったジョブも、先に完了した方を採用する）
+
+        Returns:
+            完了にした件数
+        """
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            before = conn.total_changes
+            conn.executemany("UPDATE jobs SET status = 'done', owner = ?, finished_at = ?, error = NULL "
+                             "WHERE race_id = ? AND status != 'done'", [(owner, now, race_id) for race_id in race_ids])
+            return conn.total_changes - before
+
+    def fail(self, race_id: str, owner: str, error: str) -> bool:
+        """
+        ジョブを失敗にする（試行回数が残っていれば retry_delay × 試行回数 秒後に貸し出す未着手に戻す）
+
+        Returns:
+            試行回数を使い切って failed になったら True
+        """
+        now = time.time()
+        with self._connect(immediate=True) as conn:
+            row = conn.execute("SELECT attempts FROM jobs WHERE race_id = ? AND owner = ? AND status = 'leased'",
+                               (race_id, owner)).fetchone()
+            if row is None:
+                return False
+            final = row[0] >= self.max_attempts
+            conn.execute("UPDATE jobs SET status = ?, owner = NULL, lease_until = NULL, error = ?, "
+                         "available_at = ?, finished_at = ? WHERE race_id = ?",
+                         ('failed' if final else 'pending', error[:500], now + self.retry_delay * row[0],
+                          now if final else None, race_id))
+        return final
+
+    def retry_failed(self) -> int:
+        """失敗したジョブを試行回数0の未着手に戻す"""
+        with self._connect(immediate=True) as conn:
+            before = conn.total_changes
+            conn.execute("UPDATE jobs SET status = 'pending', attempts = 0, available_at = 0, error = NULL, "
+                         "finished_at = NULL WHERE status = 'failed'")
+            return conn.total_changes - before
+
+    def next_available(self) -> Optional[float]:
+        """
+        次に貸し出せるジョブができるまでの秒数（今すぐなら 0、未着手・貸し出し中のジョブがなければ None）
+
+        貸し出し中のジョブはリース期限を、再試行待ちのジョブは待ち時間の終わりを見る。
+        """
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT MIN(CASE WHEN status = 'pending' THEN available_at ELSE lease_until END) "
+                               "FROM jobs WHERE status IN ('pending', 'leased')").fetchone()
+        return None if row[0] is None else max(0.0, row[0] - now)
+
+    # ── 統計 ──────────────────────────────────────────
+
+    def stats(self, window: float = 60.0) -> Dict:
+        """
+        件数・スループット・遅れ
+
+        Returns:
+            {"pending", "leased", "done", "failed", "total",
+             "throughput_per_min"（直近 window 秒の完了ペース）, "lag_s"（最も古い未完了ジョブの待ち時間）,
+             "eta_s"（残りを現在のペースで処理する見込み秒数）, "workers": {ワーカーID: 直近の完了数}}
+        """
+        now = time.time()
+        with self._connect() as conn:
+            counts = dict(conn.execute('SELECT status, COUNT(*) FROM jobs GROUP BY status').fetchall())
+            recent = conn.execute('SELECT owner, COUNT(*) FROM jobs WHERE finished_at >= ? AND status = ? GROUP BY owner',
+                                  (now - window, 'done')).fetchall()
+            oldest = conn.execute("SELECT MIN(enqueued_at) FROM jobs WHERE status IN ('pending', 'leased')").fetchone()[0]
+        summary = {status: counts.get(status, 0) for status in ('pending', 'leased', 'done', 'failed')}
+        summary['total'] = sum(summary.values())
+        done_recent = sum(n for _, n in recent)
+        rate = done_recent / window
+        remaining = summary['pending'] + summary['leased']
+        summary['throughput_per_min'] = rate * 60
+        summary['lag_s'] = now - oldest if oldest is not None else 0.0
+        summary['eta_s'] = remaining / rate if rate > 0 else None
+        summary['workers'] = dict(recent)
+        return summary
+
+
+class Worker:
+    """
+    キューからジョブを借りて取得し、シンクに書き出すワーカー
+
+    借りた分をすべて書き出して flush() した後で完了を記録するため、途中で落ちても書き出していないジョブは
+    リース切れで別のワーカーが取り直す。
+    """
+
+    def __init__(self, queue: JobQueue, scraper: KdreamsScraper, sink, owner: Optional[str] = None,
+                 batch: int = 12, lease_seconds: float = 300.0):
+        """
+        Args:
+            queue: ジョブキュー
+            scraper: 取得に使うスクレイパー（共有ロックファイルの Governor を指定する）
+            sink: write_race(item) と flush() を持つ書き出し先（ParquetSink）
+            owner: ワーカーID（省略時は worker_id()）
+            batch: 1回に借りるジョブ数
+            lease_seconds: リース期限（秒、1件ごとに延ばすので1件の取得にかかる時間より長くする）
+        """
+        self.queue = queue
+        self.scraper = scraper
+        self.sink = sink
+        self.owner = owner or worker_id()
+        self.batch = batch
+        self.lease_seconds = lease_seconds
+        self.completed = 0
+        # 試行回数を使い切って failed にしたジョブ数（再試行に回したものは数えない）
+        self.failed = 0
+
+    def run_once(self) -> int:
+        """1回分（最大 batch 件）を処理して、処理した件数を返す（ジョブがなければ 0）"""
+        jobs = self.queue.lease(self.owner, self.batch, self.lease_seconds)
+        if not jobs:
+            return 0
+        done = []
+        with request_context(client=self.owner, priority='bulk'):
+            for i, job in enumerate(jobs):
+                try:
+                    item = self.scraper.get_race_item(job['url'] or job['race_id'], job['venue_name'])
+                    if item['race_card'] is None and not item['lines'] and item['results'] is None:
+                        raise ValueError("出走表・ライン・結果がすべて空です")
+                    self.sink.write_race(item)
+                    done.append(job['race_id'])
+                except Exception as e:
+                    print(f"  ❌ {job['race_id']} の取得エラー（{job['attempts']}回目）: {e}")
+                    self.failed += self.queue.fail(job['race_id'], self.owner, str(e))
+                # 送信枠を他のワーカーと分け合うと1件ごとの待ち時間が読めないので、1件終えるたびに
+                # 書き出し待ち・未処理のジョブのリースを延ばす
+                held = done + [j['race_id'] for j in jobs[i + 1:]]
+                if held:
+                    self.queue.extend(held, self.owner, self.lease_seconds)
+        self.sink.flush()
+        self.completed += self.queue.complete(done, self.owner)
+        return len(jobs)
+
+    def run(self, max_jobs: Optional[int] = None, idle_exit: bool = True, poll_interval: float = 5.0) -> int:
+        """
+        ジョブがなくなるまで（idle_exit=False なら停止されるまで）処理する
+
+        再試行待ちのジョブや、他のワーカーに貸し出し中のジョブが残っている間は、貸し出せるようになるまで待つ
+        （他のワーカーが落ちた場合はリース切れで引き継ぐ）。
+
+        Returns:
+            完了にしたジョブ数
+        """
+        processed = 0
+        while max_jobs is None or processed < max_jobs:
+            n = self.run_once()
+            processed += n
+            if n == 0:
+                wait = self.queue.next_available()
+                if wait is None and idle_exit:
+                    break
+                time.sleep(min(poll_interval, wait) if wait is not None else poll_interval)
+        return self.completed
+
+
+def run_worker(directory: str, out: str, interval: float = 1.0, batch: int = 12,
+               lease_seconds: float = 300.0, base_url: Optional[str] = None, retry_delay: float = 30.0) -> int:
+    """
+    1プロセス分のワーカーを動かす（ジョブがなくなったら終了）
+
+    リクエスト予算は <directory>/governor.lock を使う全ワーカーで共有する。
+    """
+    from kdreams_export import ParquetSink
+
+    owner = worker_id()
+    queue = JobQueue(os.path.join(directory, QUEUE_FILE), retry_delay=retry_delay)
+    governor = Governor(min_interval=interval, lock_path=os.path.join(directory, LOCK_FILE))
+    scraper = KdreamsScraper(rate_limiter=governor, base_url=base_url)
+    with ParquetSink(os.path.join(out, owner)) as sink:
+        worker = Worker(queue, scraper, sink, owner=owner, batch=batch, lease_seconds=lease_seconds)
+        completed = worker.run()
+    print(f"✅ ワーカー {owner}: 完了 {completed}件 / 失敗 {worker.failed}件")
+    return completed
+
+
+if __name__ == "__main__":
+    import argparse
+    import multiprocessing
+
+    parser = argparse.ArgumentParser(description="SQLiteジョブキューによる分散クロール")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_enqueue = sub.add_parser("enqueue", help="ジョブを登録する")
+    p_enqueue.add_argument("directory", help="共有ディレクトリ（キューとロックファイルの置き場所）")
+    p_enqueue.add_argument("ids", nargs="*", help="開催ID（14桁）・レースID（16桁）・racedetail のURL")
+    p_enqueue.add_argument("--date", choices=["today", "yesterday"], help="開催場一覧の全レースを登録")
+    p_enqueue.add_argument("--base-url", default=None)
+
+    p_work = sub.add_parser("work", help="ワーカーを動かす（ジョブがなくなったら終了）")
+    p_work.add_argument("directory")
+    p_work.add_argument("--out", default=None, help="出力先（省略時は <directory>/out）")
+    p_work.add_argument("--processes", type=int, default=1)
+    p_work.add_argument("--interval", type=float, default=1.0, help="全ワーカー合計のリクエスト間隔（秒）")
+    p_work.add_argument("--batch", type=int, default=12)
+    p_work.add_argument("--lease", type=float, default=300.0, help="リース期限（秒）")
+    p_work.add_argument("--retry-delay", type=float, default=30.0, help="失敗したジョブの再試行までの待ち時間（秒 × 試行回数）")
+    p_work.add_argument("--base-url", default=None)
+
+    p_stats = sub.add_parser("stats", help="件数・スループット・遅れを表示する")
+    p_stats.add_argument("directory")
+    p_stats.add_argument("--retry-failed", action="store_true", help="失敗したジョブを未着手に戻す")
+
+    args = parser.parse_args()
+    os.makedirs(args.directory, exist_ok=True)
+    queue_path = os.path.join(args.directory, QUEUE_FILE)
+
+    if args.command == "enqueue":
+        queue = JobQueue(queue_path)
+        scraper = KdreamsScraper(base_url=args.base_url)
+        added = 0
+        if args.date:
+            added += queue.enqueue_venues(scraper, scraper.get_races(args.date))
+        if args.ids:
+            count, rejected = queue.enqueue_ids(scraper, args.ids)
+            added += count
+            for reason in rejected:
+                print(f"⚠️ 登録しませんでした: {reason}")
+        print(f"✅ {added}件を登録しました")
+
+    elif args.command == "work":
+        out = args.out or os.path.join(args.directory, 'out')
+        worker_args = (args.directory, out, args.interval, args.batch, args.lease, args.base_url, args.retry_delay)
+        if args.processes <= 1:
+            run_worker(*worker_args)
+        else:
+            processes = [multiprocessing.Process(target=run_worker, args=worker_args) for _ in range(args.processes)]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join()
+        print(JobQueue(queue_path).stats())
+
+    else:
+        queue = JobQueue(queue_path)
+        if args.retry_failed:
+            print(f"🔁 {queue.retry_failed()}件を未着手に戻しました")
+        stats = queue.stats()
+        eta = f"{stats['eta_s'] / 60:.1f}分" if stats['eta_s'] is not None else "-"
+        print(f"未着手 {stats['pending']} / 貸出中 {stats['leased']} / 完了 {stats['done']} / 失敗 {stats['failed']}"
+              f"（計 {stats['total']}）")
+        print(f"スループット {stats['throughput_per_min']:.1f}件/分 / 遅れ {stats['lag_s']:.0f}秒 / 残り見込み {eta}")
+        for owner, n in sorted(stats['workers'].items()):
+            print(f"  {owner}: 直近 {n}件")
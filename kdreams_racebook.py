@@ -0,0 +1,274 @@
+"""
+RaceBook: 多数のレースの出走表・ライン・結果・オッズを Arrow テーブルで保持するコンテナ
+各テーブルは (開催場の並び順, race_id) の順に並べてあり、1レース・1開催場の行は常に連続している。
+開催場の並び順は追加した順（一括取得データ・クロールの開催場の順）で、名前の文字コード順ではない。
+そのため race() / venue() は Arrow の slice（コピーなし）で返せ、そのまま st.dataframe・エクスポート・
+分析（to_pandas）に渡せる。
+
+使い方:
+    builder = RaceBookBuilder()
+    scraper.crawl(venues, builder)           # iter_races_data の各レースを追加
+    book = builder.build()
+    book.table('card', venue='奈良')          # 開催場の出走表（ゼロコピー）
+    book.race('3520261019020001')['results'] # 1レースの結果（ゼロコピー）
+
+    book = RaceBook.from_bulk(bulk_data)      # get_venue_all_data / get_all_venues_data の結果から
+"""
+import re
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+
+TABLE_NAMES = ('card', 'lines', 'results', 'odds')
+
+# 一括取得データのキー → RaceBook のテーブル名
+BULK_TABLES = {'race_cards': 'card', 'lines_list': 'lines', 'results_list': 'results', 'odds_list': 'odds'}
+
+KEY_COLUMNS = ['race_id', '開催場', 'レース']
+
+# 開催場の並び順（0始まり）を持つ列。並べ替えにだけ使い、RaceBook のテーブルには残さない
+ORDER_COLUMN = 'venue_order'
+
+_RACE_NO_RE = re.compile(r'(\d+)')
+
+
+def _race_label(race_no) -> str:
+    return f"{int(race_no)}R"
+
+
+def _synthetic_race_id(venue: str, race_label: str) -> str:
+    """race_id が分からないデータ（一括取得の結果）用のキー: 開催場名 + 2桁のレース番号"""
+    m = _RACE_NO_RE.search(str(race_label))
+    return f"{venue}-{int(m.group(1)):02d}" if m else f"{venue}-{race_label}"
+
+
+def _ranges(keys: np.ndarray) -> Dict[str, Tuple[int, int]]:
+    """並び替え済みのキー列 → {キー: (開始行, 行数)}"""
+    if len(keys) == 0:
+        return {}
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return {keys[s]: (int(s), int(e - s)) for s, e in zip(starts, ends)}
+
+
+def _with_venue_order(table: pa.Table, order: Dict[str, int]) -> pa.Table:
+    """venue_order 列を追加する（order にない開催場は、テーブルに最初に現れた順に order の末尾へ追加）"""
+    venues = table.column('開催場').to_pylist()
+    for venue in venues:
+        order.setdefault(venue, len(order))
+    return table.append_column(ORDER_COLUMN, pa.array([order[v] for v in venues], pa.int32()))
+
+
+class RaceBook:
+    """
+    Arrow テーブルで保持するレースデータ（読み取り専用）
+
+    各テーブルの先頭に race_id・開催場・レース 列がある。
+    """
+
+    def __init__(self, tables: Dict[str, pa.Table]):
+        """
+        Args:
+            tables: テーブル名 → race_id・開催場・レース 列を持つ Arrow テーブル（行の並び順は問わない）。
+                    venue_order 列があれば開催場をその順に並べる（なければ最初に現れた順）
+        """
+        self._tables: Dict[str, pa.Table] = {}
+        self._race_index: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        self._venue_index: Dict[str, Dict[str, Tuple[int, int]]] = {}
+        races: Dict[str, Tuple[str, str]] = {}
+        order: Dict[str, int] = {}
+        for name, table in tables.items():
+            if table is None or table.num_rows == 0:
+                continue
+            if ORDER_COLUMN not in table.column_names:
+                table = _with_venue_order(table, order)
+            table = table.sort_by([(ORDER_COLUMN, 'ascending'), ('race_id', 'ascending')])
+            positions = table.column(ORDER_COLUMN).to_numpy(zero_copy_only=False)
+            table = table.drop([ORDER_COLUMN]).combine_chunks()
+            self._tables[name] = table
+            race_keys = table.column('race_id').to_numpy(zero_copy_only=False)
+            venue_keys = table.column('開催場').to_numpy(zero_copy_only=False)
+            self._race_index[name] = _ranges(race_keys)
+            self._venue_index[name] = _ranges(venue_keys)
+            for venue, (start, _) in self._venue_index[name].items():
+                order.setdefault(venue, int(positions[start]))
+            labels = table.column('レース').to_numpy(zero_copy_only=False)
+            for key, (start, _) in self._race_index[name].items():
+                races.setdefault(key, (venue_keys[start], labels[start]))
+        # 開催場の並び順 → race_id の順
+        self._races = dict(sorted(races.items(), key=lambda kv: (order.get(kv[1][0], len(order)), kv[0])))
+
+    # ── 参照 ──────────────────────────────────────────
+
+    @property
+    def race_ids(self) -> List[str]:
+        return list(self._races)
+
+    @property
+    def venues(self) -> List[str]:
+        seen: Dict[str, None] = {}
+        for venue, _ in self._races.values():
+            seen.setdefault(venue, None)
+        return list(seen)
+
+    def races_of(self, venue: str) -> List[Tuple[str, str]]:
+        """開催場のレース [(race_id, レース), ...]"""
+        return [(race_id, label) for race_id, (v, label) in self._races.items() if v == venue]
+
+    def race_info(self, race_id: str) -> Tuple[str, str]:
+        """race_id → (開催場, レース)（なければ KeyError）"""
+        return self._races[str(race_id)]
+
+    def table(self, name: str, venue: Optional[str] = None, race_id: Optional[str] = None) -> pa.Table:
+        """
+        テーブル全体・1開催場分・1レース分のいずれかを返す（いずれもコピーなしの slice）
+
+        データがなければ列のない空テーブル。
+        """
+        if name not in TABLE_NAMES:
+            raise ValueError(f"不明なテーブル: {name}（{TABLE_NAMES}）")
+        table = self._tables.get(name)
+        if table is None:
+            return pa.table({})
+        if race_id is not None:
+            span = self._race_index[name].get(str(race_id))
+        elif venue is not None:
+            span = self._venue_index[name].get(venue)
+        else:
+            return table
+        if span is None:
+            return table.slice(0, 0)
+        return table.slice(*span)
+
+    def race(self, race_id: str) -> Dict[str, pa.Table]:
+        """1レース分の全テーブル（コピーなし）"""
+        return {name: self.table(name, race_id=race_id) for name in self._tables}
+
+    def venue(self, venue: str) -> Dict[str, pa.Table]:
+        """1開催場分の全テーブル（コピーなし）"""
+        return {name: self.table(name, venue=venue) for name in self._tables}
+
+    def to_pandas(self, name: str, venue: Optional[str] = None, race_id: Optional[str] = None,
+                  drop_keys: bool = False) -> pd.DataFrame:
+        """
+        table() の結果を pandas にする（分析用。ここで初めてコピーが発生する）
+
+        Args:
+            drop_keys: True なら race_id 列を除く（一括取得データと同じ列構成になる）
+        """
+        table = self.table(name, venue=venue, race_id=race_id)
+        if drop_keys and 'race_id' in table.column_names:
+            table = table.drop(['race_id'])
+        return table.to_pandas()
+
+    def to_bulk(self) -> Dict:
+        """一括取得データと同じ形式の辞書（race_cards / lines_list / results_list / odds_list）"""
+        return {bulk: self.to_pandas(name, drop_keys=True) for bulk, name in BULK_TABLES.items()
+                if name in self._tables}
+
+    def iter_venues(self) -> Iterator[Tuple[str, Dict[str, pa.Table]]]:
+        """(開催場, テーブル名 → slice) を開催場順に返す"""
+        for venue in self.venues:
+            yield venue, self.venue(venue)
+
+    @property
+    def num_races(self) -> int:
+        return len(self._races)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(t.nbytes for t in self._tables.values())
+
+    def __len__(self) -> int:
+        return self.num_races
+
+    def __contains__(self, race_id: str) -> bool:
+        return str(race_id) in self._races
+
+    # ── 作成 ──────────────────────────────────────────
+
+    @classmethod
+    def from_bulk(cls, bulk_data: Dict) -> 'RaceBook':
+        """
+        一括取得データ（get_venue_all_data / get_all_venues_data の結果）から作る
+
+        race_id 列がない場合は「開催場名-レース番号2桁」をキーにする。
+        """
+        default_venue = bulk_data.get('venue_name', '')
+        tables = {}
+        order: Dict[str, int] = {}
+        for bulk_key, name in BULK_TABLES.items():
+            df = bulk_data.get(bulk_key)
+            if df is None or df.empty:
+                continue
+            df = df.copy()
+            if '開催場' not in df.columns:
+                df.insert(0, '開催場', default_venue)
+            if 'race_id' not in df.columns:
+                df.insert(0, 'race_id', [_synthetic_race_id(v, r) for v, r in zip(df['開催場'], df['レース'])])
+            # 開催場は一括取得データに現れた順（取得した開催場一覧の順）に並べる
+            tables[name] = _with_venue_order(_to_arrow(df), order)
+        return cls(tables)
+
+
+def _to_arrow(df: pd.DataFrame) -> pa.Table:
+    """キー列を先頭にそろえて Arrow テーブルにする（キー列は文字列）"""
+    df = df[KEY_COLUMNS + [c for c in df.columns if c not in KEY_COLUMNS]]
+    df = df.astype({c: str for c in KEY_COLUMNS})
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+class RaceBookBuilder:
+    """
+    レースを1つずつ追加して RaceBook を作る
+
+    write_race() を持つため、KdreamsScraper.crawl() のシンクとしても使える。
+    """
+
+    def __init__(self):
+        self._frames: Dict[str, List[pd.DataFrame]] = {name: [] for name in TABLE_NAMES}
+        # 開催場 → 追加した順
+        self._venue_order: Dict[str, int] = {}
+
+    def add_race(self, race_id: str, venue: str, race_no, card: Optional[pd.DataFrame] = None,
+                 lines: Optional[List[Dict]] = None, results: Optional[pd.DataFrame] = None,
+                 odds: Optional[pd.DataFrame] = None, venue_order: Optional[int] = None) -> None:
+        """
+        1レース分を追加する
+
+        Args:
+            race_id: レースID（16桁）
+            venue: 開催場名
+            race_no: レース番号（1〜12）
+            lines: get_race_lines() の結果、または「ライン番号・車番」列を持つ行のリスト
+            venue_order: 開催場の並び順（省略時は最初に追加した順）
+        """
+        label = _race_label(race_no)
+        keys = {'race_id': str(race_id), '開催場': venue, 'レース': label}
+        self._venue_order.setdefault(venue, len(self._venue_order) if venue_order is None else venue_order)
+        for name, df in (('card', card), ('results', results), ('odds', odds)):
+            if df is not None and not df.empty:
+                self._frames[name].append(df.drop(columns=[c for c in KEY_COLUMNS if c in df.columns]).assign(**keys))
+        if lines:
+            rows = [{'ライン番号': ln['line'], '車番': '-'.join(str(b) for b in ln['bibs'])} if 'bibs' in ln
+                    else {'ライン番号': ln['ライン番号'], '車番': ln['車番']} for ln in lines]
+            self._frames['lines'].append(pd.DataFrame(rows).assign(**keys))
+
+    def write_race(self, item: Dict) -> None:
+        """
+        KdreamsScraper.iter_races_data() の1レース分を追加する
+
+        レースは完了順に届くので、開催場の並び順は item の venue_order（開催場一覧の順）を使う。
+        """
+        match = re.search(r'/racedetail/(\d+)/', item['race_url'])
+        race_id = match.group(1) if match else _synthetic_race_id(item['venue_name'], item['race_number'])
+        self.add_race(race_id, item['venue_name'], item['race_number'], card=item.get('race_card'),
+                      lines=item.get('lines'), results=item.get('results'), venue_order=item.get('venue_order'))
+
+    def build(self) -> RaceBook:
+        tables = {name: _with_venue_order(_to_arrow(pd.concat(frames, ignore_index=True)), self._venue_order)
+                  for name, frames in self._frames.items() if frames}
+        return RaceBook(tables)
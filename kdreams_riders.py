@@ -0,0 +1,200 @@
+"""
+選手マスター索引
+出走表・結果の選手を一意な整数IDに対応づける。
+選手コード（プロフィールリンクの登録番号）があればそれを、なければ 選手名+期別+府県 をキーにする。
+メモリ上の辞書で O(1) に引け、指定したファイルに追記専用のJSON Linesで永続化する。
+同じファイルを複数プロセス（キューのワーカーなど）で使う場合は、採番のたびにファイルをロックして
+他のプロセスが追記した分を読み込んでから採番するので、IDは重複しない。
+"""
+import json
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:  # Windows ではプロセス間のロックなし（1プロセスで使う）
+    fcntl = None
+
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_name(name: str) -> str:
+    """選手名の空白（全角含む）を除去する"""
+    return _SPACE_RE.sub('', str(name or ''))
+
+
+def _clean(value) -> str:
+    """期別などの数値列（NaN・float）をキー用の文字列にする"""
+    if value is None or (isinstance(value, float) and value != value):
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value).strip()
+
+
+class RiderIndex:
+    """
+    選手キー → 整数ID の辞書
+
+    キー:
+        "c:<選手コード>"           リンクから取得できた場合
+        "n:<選手名>|<期別>|<府県>"  リンクがない場合（結果ページは期別・府県が空）
+    同じ選手が両方のキーで現れた場合は同じIDに寄せる。
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: 永続化先（JSON Lines、省略時はメモリ上のみ）
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._ids: Dict[str, int] = {}
+        self._riders: List[Dict] = []
+        self._by_name: Dict[str, List[int]] = {}
+        # ファイルのどこまで読み込んだか（バイト数）
+        self._offset = 0
+        if path and os.path.exists(path):
+            with open(path, 'rb') as f:
+                self._catch_up(f)
+
+    def _catch_up(self, f) -> None:
+        """ファイルの前回読んだ位置より後ろ（他のプロセスが追記した分）を取り込む"""
+        f.seek(self._offset)
+        data = f.read()
+        # 書きかけの行は次回に読む
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].decode('utf-8').splitlines():
+            line = line.strip()
+            if not line:
+                continue
+            entry = json.loads(line)
+            rider_id = entry['id']
+            if rider_id == len(self._riders):
+                self._register(entry)
+            self._ids[entry['key']] = rider_id
+            self._learn_code(rider_id, entry['key'])
+        self._offset += end
+
+    def _register(self, record: Dict) -> None:
+        self._riders.append(record)
+        self._by_name.setdefault(normalize_name(record.get('選手名')), []).append(record['id'])
+
+    def _learn_code(self, rider_id: int, key: str) -> None:
+        # 名前だけで登録した選手に後からコードが付いたら、選手情報にも反映する
+        record = self._riders[rider_id] if 0 <= rider_id < len(self._riders) else None
+        if record is not None and key.startswith('c:') and not record.get('選手コード'):
+            record['選手コード'] = key[2:]
+
+    def _accepts(self, rider_id: Optional[int], code: str) -> bool:
+        """名前で見つけた選手を、コード code の選手として扱ってよいか（別のコードを持つ選手は別人）"""
+        if rider_id is None or not code:
+            return rider_id is not None
+        return self._riders[rider_id].get('選手コード', '') in ('', code)
+
+
+    def __len__(self) -> int:
+        return len(self._riders)
+
+    def lookup(self, rider_id: int) -> Optional[Dict]:
+        """IDから選手情報（選手名・府県・期別・選手コード）を返す"""
+        if 0 <= rider_id < len(self._riders):
+            return self._riders[rider_id]
+        return None
+
+    def find(self, code: str = '', name: str = '', term='', pref: str = '') -> Optional[int]:
+        """既知の選手のIDを返す（登録はしない）"""
+        code, name, term = _clean(code), normalize_name(name), _clean(term)
+        if code and f"c:{code}" in self._ids:
+            return self._ids[f"c:{code}"]
+        # コードが未知の場合、名前で見つかるのはコードのない選手だけ（同名の別人を同じIDにしない）
+        key = f"n:{name}|{term}|{pref or ''}"
+        if self._accepts(self._ids.get(key), code):
+            return self._ids[key]
+        # 期別・府県がない（結果ページ）場合は同名が1人だけなら確定
+        if not term and not pref:
+            candidates = self._by_name.get(name, [])
+            if len(candidates) == 1 and self._accepts(candidates[0], code):
+                return candidates[0]
+        # 先に結果ページだけで登録された選手
+        rider_id = self._ids.get(f"n:{name}||")
+        return rider_id if self._accepts(rider_id, code) else None
+
+    def get_id(self, code: str = '', name: str = '', term='', pref: str = '') -> int:
+        """選手のIDを返す（未登録なら新しいIDを採番する）"""
+        code, term, pref = _clean(code), _clean(term), _clean(pref)
+        with self._lock:
+            rider_id = self.find(code, name, term, pref)
+            if rider_id is not None and all(key in self._ids for key in self._alias_keys(code, name, term, pref)):
+                return rider_id
+            if not self.path:
+                return self._assign(code, name, term, pref)[0]
+            # 別のプロセスが同じファイルで採番しているかもしれないので、ロックして読み直してから採番する
+            with open(self.path, 'a+b') as f:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    self._catch_up(f)
+                    rider_id, new_entries = self._assign(code, name, term, pref)
+                    if new_entries:
+                        f.write(''.join(json.dumps(entry, ensure_ascii=False) + '\n'
+                                        for entry in new_entries).encode('utf-8'))
+                        f.flush()
+                    self._offset = f.tell()
+                finally:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_UN)
+        return rider_id
+
+    @staticmethod
+    def _alias_keys(code: str, name: str, term: str, pref: str) -> List[str]:
+        # 別名キー（コード ⇔ 名前）も同じIDに登録しておく
+        keys = [f"n:{normalize_name(name)}|{term}|{pref}"] if term or pref else []
+        if code:
+            keys.append(f"c:{code}")
+        return keys
+
+    def _assign(self, code: str, name: str, term: str, pref: str) -> Tuple[int, List[Dict]]:
+        """メモリ上で選手を引き、なければ採番する（呼び出し側で _lock を持つ）。(ID, ファイルに追記するエントリ) を返す"""
+        rider_id = self.find(code, name, term, pref)
+        new_entries = []
+        if rider_id is None:
+            rider_id = len(self._riders)
+            record = {'id': rider_id, '選手名': str(name or '').strip(), '府県': pref,
+                      '期別': term, '選手コード': code}
+            record['key'] = f"c:{code}" if code else f"n:{normalize_name(name)}|{term}|{pref}"
+            self._register(record)
+            self._ids[record['key']] = rider_id
+            new_entries.append(record)
+        for key in self._alias_keys(code, name, term, pref):
+            if key not in self._ids:
+                self._ids[key] = rider_id
+                self._learn_code(rider_id, key)
+                new_entries.append({'id': rider_id, 'key': key})
+        return rider_id, new_entries
+
+    def assign(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        出走表・結果のDataFrameに「選手ID」列（int）を追加する
+
+        選手コード / 選手名 / 期別 / 府県 のうち存在する列をキーに使う。
+        """
+        if df.empty or '選手名' not in df.columns:
+            df['選手ID'] = pd.Series(dtype='int64')
+            return df
+        codes = df['選手コード'] if '選手コード' in df.columns else [''] * len(df)
+        terms = df['期別'] if '期別' in df.columns else [''] * len(df)
+        prefs = df['府県'] if '府県' in df.columns else [''] * len(df)
+        df['選手ID'] = [self.get_id(code, name, term, pref)
+                       for code, name, term, pref in zip(codes, df['選手名'], terms, prefs)]
+        df['選手ID'] = df['選手ID'].astype('int64')
+        return df
+
+    def to_frame(self) -> pd.DataFrame:
+        """選手マスターをDataFrameで返す（ID順）"""
+        return pd.DataFrame(self._riders, columns=['id', '選手名', '府県', '期別', '選手コード', 'key']).set_index('id')
@@ -3,24 +3,316 @@ Kドリームス競輪スクレイピングモジュール
 requests + BeautifulSoup4を使用したHTTPベースのスクレイピング
 """
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 import pandas as pd
 import time
 import re
-from typing import Dict, List, Tuple, Optional
+import threading
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterator, List, Tuple, Optional
 from datetime import datetime
 
+from kdreams_aggregates import RiderStats
+from kdreams_archive import PageArchive
+from kdreams_cassette import Cassette, CassetteSession
+from kdreams_governor import request_context, with_context
+from kdreams_memo import SHARED_MEMO, ParseMemo
+from kdreams_riders import RiderIndex
+from kdreams_venues import DateLike, VenueRegistry, get_registry
+from kdreams_parser import (
+    RESULT_COLUMNS, format_lines_text, parse_3rentan_odds, parse_line_prediction,
+    parse_odds, parse_race_card, parse_race_lines, parse_race_results, parse_races,
+)
+
+
+class RateLimiter:
+    """
+    リクエスト間隔の制御（スレッドセーフ）
+
+    複数スレッドから共有された場合も、全体で min_interval 秒に1リクエストを超えないよう
+    各リクエストの送信時刻を予約する。
+    """
+
+    def __init__(self, min_interval: float = 1.0):
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def acquire(self) -> None:
+        """次の送信枠まで待機する"""
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_time)
+            self._next_time = slot + self.min_interval
+        wait = slot - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+class SingleFlight:
+    """
+    同じキーの処理を同時に1回だけ実行する（スレッドセーフ）
+
+    実行中のキーを別スレッドが要求した場合は、新たに実行せずに実行中の結果（または例外）を共有する。
+    """
+
+    class _Call:
+        __slots__ = ('event', 'result', 'error')
+
+        def __init__(self):
+            self.event = threading.Event()
+            self.result = None
+            self.error: Optional[BaseException] = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, 'SingleFlight._Call'] = {}
+        self.executed = 0
+        self.shared = 0
+
+    def do(self, key: str, fn: Callable):
+        """fn() を実行して結果を返す（同じキーが実行中ならその結果を待って返す）"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = SingleFlight._Call()
+                self.executed += 1
+            else:
+                self.shared += 1
+
+        if leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.event.set()
+        else:
+            call.event.wait()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+
+# プロセス内の全スクレイパーが既定で共有する、URLごとの取得の集約
+SHARED_FLIGHTS = SingleFlight()
+
+
+# fetch_race() で指定できる区分
+RACE_PARTS = ('card', 'lines', 'results', 'odds')
+
+
+class ResponseCache:
+    """
+    取得済みレスポンスの短期キャッシュ（スレッドセーフ）
+
+    同じURLを ttl 秒以内に再取得する場合は通信せずに保存済みのレスポンスを返す。
+    先読み（kdreams_prefetch）で取得したページをボタン押下時に再利用するために使う。
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, Tuple[float, requests.Response]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, url: str) -> Optional[requests.Response]:
+        """有効期限内のレスポンス（なければ None）"""
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[url]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(url)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, url: str, response: requests.Response) -> None:
+        with self._lock:
+            self._entries[url] = (time.monotonic() + self.ttl, response)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            entry = self._entries.get(url)
+            return entry is not None and entry[0] >= time.monotonic()
+
 
 class KdreamsScraper:
     """Kドリームスのスクレイピングクラス"""
     
     BASE_URL = "https://keirin.kdreams.jp"
     
-    def __init__(self):
-        self.session = requests.Session()
+    def __init__(self, rate_limiter: Optional[RateLimiter] = None, pool_size: int = 16,
+                 cassette: Optional[Cassette] = None, base_url: Optional[str] = None,
+                 archive: Optional[PageArchive] = None, rider_index: Optional[RiderIndex] = None,
+                 parse_memo: Optional[ParseMemo] = None, response_cache: Optional[ResponseCache] = None,
+                 venue_registry: Optional[VenueRegistry] = None, single_flight: Optional[SingleFlight] = None,
+                 rider_stats: Optional[RiderStats] = None):
+        """
+        Args:
+            rate_limiter: リクエスト間隔の制御（acquire() を持つもの。RateLimiter または
+                          全スクレイパーで共有する kdreams_governor.Governor。省略時は1秒間隔、カセット再生時は間隔なし）
+            pool_size: 同一ホストへのHTTP接続プールサイズ（並列取得時の上限）
+            cassette: HTTPカセット（記録モードなら全レスポンスを保存、再生モードならネットワーク接続なし）
+            base_url: 接続先のベースURL（省略時は BASE_URL。ローカルのモックサーバー等に向ける場合に指定）
+            archive: 生HTMLアーカイブ（指定時は取得した全ページを圧縮保存する）
+            rider_index: 選手マスター索引（省略時はメモリ上のみの索引を作成）
+            parse_memo: 本文ハッシュによる解析メモ（省略時はプロセス共有のメモ。本文が前回と同じページは解析しない）
+            response_cache: レスポンスの短期キャッシュ（省略時はキャッシュせず毎回取得する）
+            venue_registry: 競輪場レジストリ（省略時は stadium_code_mapping.json を読み込んだ共有レジストリ）
+            single_flight: 同じURLの同時取得を1回にまとめる集約（省略時はプロセス共有。カセット使用時は専用）
+            rider_stats: 選手成績の集計（指定時は取得した結果を1レースずつ取り込む。rider_index 省略時は集計側の索引を使う）
+        """
+        self.response_cache = response_cache
+        self.venue_registry = venue_registry if venue_registry is not None else get_registry()
+        self.archive = archive
+        self.parse_memo = parse_memo if parse_memo is not None else SHARED_MEMO
+        if rider_index is None:
+            rider_index = rider_stats.rider_index if rider_stats is not None else RiderIndex()
+        self.rider_index = rider_index
+        self.rider_stats = rider_stats
+        if base_url:
+            self.BASE_URL = base_url.rstrip('/')
+        self.cassette = cassette
+        if single_flight is None:
+            # カセットの記録・再生は他のスクレイパーの通信と混ぜない
+            single_flight = SingleFlight() if cassette is not None else SHARED_FLIGHTS
+        self.single_flight = single_flight
+        self.session = CassetteSession(cassette) if cassette is not None else requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        if rate_limiter is None:
+            replaying = cassette is not None and cassette.mode == "replay"
+            rate_limiter = RateLimiter(0.0 if replaying else 1.0)
+        self.rate_limiter = rate_limiter
+    
+    def _get(self, url: str, timeout: int = 10, cache: bool = True) -> requests.Response:
+        """
+        レート制限付きでGETリクエストを送信する
+
+        全メソッドの取得処理はここを経由する（アーカイブ指定時は本文を保存する）。
+        レスポンスキャッシュ指定時は、有効期限内に取得済みのURLは通信しない
+        （cache=False なら常に取得する。開催場一覧など状態を追うページ用）。
+        """
+        use_cache = cache and self.response_cache is not None
+        if use_cache:
+            cached = self.response_cache.get(url)
+            if cached is not None:
+                return cached
+        # 同じURLを別スレッド・別スクレイパーが取得中なら、その取得結果を共有する
+        fetched = False
+
+        def fetch():
+            # このスレッドが実際に取得したかを記録する（共有された結果なら呼ばれない）
+            nonlocal fetched
+            fetched = True
+            return self._fetch(url, timeout, use_cache)
+
+        response, archive, response_cache = self.single_flight.do(url, fetch)
+        # アーカイブ・キャッシュへの保存はスクレイパーごとに行う（取得した側と同じ保存先なら二重に保存しない）
+        if self.archive is not None and (fetched or self.archive is not archive):
+            self.archive.append(url, response.content)
+        if use_cache and (fetched or self.response_cache is not response_cache):
+            self.response_cache.put(url, response)
+        return response
+    
+    def _fetch(self, url: str, timeout: int, use_cache: bool) -> Tuple[requests.Response, Optional[PageArchive],
+                                                                       Optional[ResponseCache]]:
+        """
+        実際に送信する（_get() から1URLにつき同時に1回だけ呼ばれる）
+
+        Returns:
+            (レスポンス, 取得したスクレイパーのアーカイブ, 取得したスクレイパーのキャッシュ（使わない場合は None）)
+        """
+        self.rate_limiter.acquire()
+        response = self.session.get(url, timeout=timeout)
+        response.raise_for_status()
+        return response, self.archive, self.response_cache if use_cache else None
+    
+    def _parse(self, response: requests.Response, section: str, parser: Callable):
+        """取得したページを解析する（本文が前回と同じなら解析せずにメモの結果を返す）"""
+        return self.parse_memo.parse(response.url, section, response.content, parser)
+    
+    def _record_results(self, race_url: str, results: pd.DataFrame) -> None:
+        """確定した結果を選手成績の集計に取り込む（集計を指定していなければ何もしない）"""
+        if self.rider_stats is None:
+            return
+        match = re.search(r'/racedetail/(\d+)/', race_url)
+        if match:
+            self.rider_stats.update(match.group(1), results)
+    
+    def poll_changes(self, cursor: int = 0) -> Tuple[List[Dict], int]:
+        """
+        前回の問い合わせ以降に内容が変わったレース・区分を返す
+        
+        Args:
+            cursor: 前回返されたカーソル（初回は 0）
+        
+        Returns:
+            ([{"race_id", "section": "card"|"lines"|"result"|..., "kind": "new"|"changed", "url", ...}], 次回のカーソル)
+        """
+        return self.parse_memo.poll_changes(cursor)
+    
+    @staticmethod
+    def _racedetail_url(race_url: str) -> str:
+        """racecardのURLをracedetail（1R）のURLに変換する（それ以外はそのまま）"""
+        if '/racecard/' in race_url:
+            parts = race_url.split('/racecard/')
+            if len(parts) == 2:
+                base_url = parts[0]
+                race_id = parts[1].rstrip('/')
+                print(f"URL変換: racecard → racedetail")
+                return f"{base_url}/racedetail/{race_id}01/"
+        return race_url
+    
+    @staticmethod
+    def _result_url(race_url: str) -> str:
+        """結果ページのURL（?pageType=result パラメータを追加）"""
+        if '?' in race_url:
+            return race_url + '&pageType=result'
+        return race_url.rstrip('/') + '/?pageType=result'
+    
+    @staticmethod
+    def _odds_url(race_url: str) -> str:
+        """3連単オッズページのURL"""
+        if '?' in race_url:
+            return f"{race_url}&pageType=odds&kakeshikiType=3rentan"
+        return f"{race_url}?pageType=odds&kakeshikiType=3rentan"
+    
+    def prefetch(self, url: str) -> bool:
+        """
+        ページを取得してレスポンスキャッシュに入れておく（キャッシュ済みなら通信しない）
+        
+        Returns:
+            取得できたら True
+        """
+        try:
+            with request_context(priority='background'):
+                self._get(url)
+            return True
+        except Exception as e:
+            print(f"先読みエラー: {url} ({e})")
+            return False
+    
+    def race_page_urls(self, race_url: str) -> List[str]:
+        """1レース分のデータ（出走表・ライン・結果）の取得に使うページのURL"""
+        return [self._racedetail_url(race_url), self._result_url(race_url)]
     
     def get_races(self, date_type: str = "today") -> List[Dict]:
         """
@@ -33,109 +325,10 @@ class KdreamsScraper:
             レース情報のリスト [{"name": "熊本 1R", "url": "...", "grade": "GI"}]
         """
         try:
-            response = self.session.get(self.BASE_URL, timeout=10)
-            response.raise_for_status()
-            time.sleep(1)
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            races = []
-            
-            # 開催レース一覧のセクションを探す (race_list クラス)
-            race_lists = soup.find_all('dl', class_='race_list')
-            
-            for race_list in race_lists:
-                # 競輪場名を取得
-                velodrome_elem = race_list.find('p', class_='velodrome')
-                if not velodrome_elem:
-                    continue
-                    
-                velodrome_name = velodrome_elem.get_text(strip=True)
-                
-                # Gradeアイコンを取得
-                grade_icon = race_list.find('li', class_=lambda c: c and 'icon_grade' in ' '.join(c) if isinstance(c, list) else False)
-                grade = "F級"
-                if grade_icon:
-                    grade_text = grade_icon.get_text(strip=True)
-                    if grade_text:
-                        grade = grade_text
-                
-                # 日付タイプに応じてセクションを選択
-                if date_type == "yesterday":
-                    # 前日: div.previous 内の結果リンクを探す
-                    target_section = race_list.find('div', class_='previous')
-                    if not target_section:
-                        continue
-                    
-                    # 結果リンクを探す（li.result > a）
-                    result_li = target_section.find('li', class_='result')
-                    if not result_li:
-                        continue
-                    result_link = result_li.find('a')
-                    if not result_link:
-                        continue
-                    
-                    race_url = result_link.get('href', '')
-                    if race_url and not race_url.startswith('http'):
-                        race_url = self.BASE_URL.rstrip('/') + race_url
-                    
-                    # 日程情報
-                    day_elem = target_section.find('p', class_='day')
-                    day_info = day_elem.get_text(strip=True) if day_elem else ""
-                    
-                    race_status = "結果"
-                    race_time = ""
-                    
-                else:  # today
-                    # 本日: 元のロジックを使用（currentクラス）
-                    current_div = race_list.find('div', class_='current')
-                    if not current_div:
-                        continue
-                    
-                    # 出走表リンクを取得
-                    racecard_link = current_div.find('a', href=lambda h: h and ('/racecard/' in h or '/AllRaceList.do' in h))
-                    if not racecard_link:
-                        continue
-                    
-                    race_url = racecard_link.get('href', '')
-                    if race_url and not race_url.startswith('http'):
-                        race_url = self.BASE_URL.rstrip('/') + race_url
-                    
-                    # レース状態を取得
-                    status_elem = current_div.find('span', class_='race')
-                    race_status = status_elem.get_text(strip=True) if status_elem else ""
-                    
-                    # 締切時刻を取得
-                    time_elem = current_div.find('span', class_='num')
-                    race_time = time_elem.get_text(strip=True) if time_elem else ""
-                    
-                    # 日程情報を取得
-                    day_elem = current_div.find('p', class_='day')
-                    day_info = day_elem.get_text(strip=True) if day_elem else ""
-                
-                # レース情報を追加
-                races.append({
-                    'name': f"{velodrome_name} ({grade}) {day_info}",
-                    'url': race_url,
-                    'grade': grade,
-                    'velodrome': velodrome_name,
-                    'status': race_status,
-                    'time': race_time,
-                    'day': day_info,
-                    'date_type': date_type
-                })
-            
-            # Gradeでソート
-            grade_order = {
-                'ＧⅠ': 1, 'GⅠ': 1, 'GI': 1,
-                'ＧⅡ': 2, 'GⅡ': 2, 'GII': 2,
-                'ＧⅢ': 3, 'GⅢ': 3, 'GIII': 3,
-                'ＦⅠ': 4, 'FⅠ': 4, 'FI': 4,
-                'ＦⅡ': 5, 'FⅡ': 5, 'FII': 5,
-                'F級': 9
-            }
-            races.sort(key=lambda x: grade_order.get(x['grade'], 10))
-            
+            response = self._get(self.BASE_URL, cache=False)
+            races = parse_races(response.content, date_type, self.BASE_URL)
+            for race in races:
+                self.venue_registry.learn_from_url(race['url'])
             print(f"取得したレース数 ({date_type}): {len(races)}")
             return races
             
@@ -145,7 +338,23 @@ class KdreamsScraper:
             traceback.print_exc()
             return []
     
-    
+    def get_venue_index(self, date_types: Tuple[str, ...] = ("today", "yesterday")) -> Dict[str, List[Dict]]:
+        """
+        トップページを1回だけ取得して、複数の日付の開催場一覧をまとめて返す
+
+        Args:
+            date_types: 取り出す日付タイプ
+
+        Returns:
+            {日付タイプ: get_races() と同じ形式のリスト}（取得失敗時は例外を送出）
+        """
+        response = self._get(self.BASE_URL, cache=False)
+        index = {date_type: parse_races(response.content, date_type, self.BASE_URL) for date_type in date_types}
+        for races in index.values():
+            for race in races:
+                self.venue_registry.learn_from_url(race['url'])
+        return index
+
     def get_todays_races(self) -> List[Dict]:
         """
         当日開催のレース一覧を取得（後方互換性のため）
@@ -155,6 +364,41 @@ class KdreamsScraper:
         """
         return self.get_races("today")
     
+    def learn_venues(self) -> int:
+        """
+        トップページ（本日・前日の開催場一覧）を1回取得して、競輪場レジストリに場コードを覚えさせる
+
+        場コードが未登録の競輪場のURLを組み立てるときに、レジストリから呼ばれる。
+
+        Returns:
+            一覧に出ていた開催場の数
+        """
+        index = self.get_venue_index(('today', 'yesterday'))
+        return sum(len(venues) for venues in index.values())
+    
+    def venue_url(self, venue: str, day: DateLike, nth_day: int, result: bool = False) -> str:
+        """
+        トップページを取得せずに開催場のURLを組み立てる
+        
+        Args:
+            venue: 競輪場（場名・スラッグ・Kドリームス場コードのいずれか）
+            day: 開催日（date または 'YYYYMMDD'）
+            nth_day: 開催日目（初日 = 1）
+            result: True なら raceresult、False なら racecard のURL
+        """
+        if result:
+            return self.venue_registry.raceresult_url(venue, day, nth_day, self.BASE_URL, learn=self.learn_venues)
+        return self.venue_registry.racecard_url(venue, day, nth_day, self.BASE_URL, learn=self.learn_venues)
+    
+    def get_races_for(self, venue: str, day: DateLike, nth_day: int) -> List[Dict]:
+        """
+        (競輪場, 日付, 開催日目) から全レース（1R-12R）のURLを生成する（通信なし）
+        
+        Returns:
+            get_all_races_from_venue() と同じ形式のリスト
+        """
+        return self.get_all_races_from_venue(self.venue_url(venue, day, nth_day))
+    
     def get_all_races_from_venue(self, racecard_url: str) -> List[Dict]:
         """
         開催場のURL（racecard / raceresult いずれも可）から
@@ -186,6 +430,8 @@ class KdreamsScraper:
             
             # ベースURL（競輪場パス部分まで）を取得
             base_url = re.split(r'/(racecard|raceresult|racedetail)/', racecard_url)[0]
+            # 見たURLからスラッグと場コードの対応を覚える（race_id だけで fetch_race() できるようにする）
+            self.venue_registry.learn_from_url(racecard_url)
             
             # 各レース（1R-12R）のracedetail URLを生成
             # racedetail ID = kaisai_id + レース番号2桁
@@ -213,155 +459,20 @@ class KdreamsScraper:
 
     def get_race_card(self, race_url: str) -> pd.DataFrame:
         """
-        出走表データを取得（racedetailページから23カラム・バリデーション付き）
+        出走表データを取得（racedetailページから19カラム・バリデーション付き）
         
         Args:
             race_url: 出走表ページのURL (racecardでもracedetailでも可)
             
         Returns:
-            出走表のDataFrame (23カラム)
+            出走表のDataFrame (19カラム + 選手コード, 選手ID)
         """
         try:
-            # racecardのURLをracedetailに変換
-            if '/racecard/' in race_url:
-                parts = race_url.split('/racecard/')
-                if len(parts) == 2:
-                    base_url = parts[0]
-                    race_id = parts[1].rstrip('/')
-                    race_detail_url = f"{base_url}/racedetail/{race_id}01/"
-                    print(f"URL変換: racecard → racedetail")
-                else:
-                    race_detail_url = race_url
-            else:
-                race_detail_url = race_url
-            
-            response = self.session.get(race_detail_url, timeout=10)
-            response.raise_for_status()
-            time.sleep(1)
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 出走表テーブルを探す（class="racecard_table"）
-            table = soup.find('table', class_='racecard_table')
-            
-            if not table:
-                print("出走表テーブルが見つかりませんでした")
-                return pd.DataFrame()
-            
-            # 固定ヘッダー（19カラム - 予想、好気合、総評、枠番を除外）
-            headers = [
-                '車番', '選手名', '府県', '年齢', '期別',
-                '級班', '脚質', 'ギヤ倍数', '競走得点', 'S', 'B', 
-                '逃', '捲', '差', 'マ', '1着', '2着', '3着', '着外'
-            ]
-            
-            # データ行を抽出（class="n1", "n2", ... "n9"）
-            rows_data = []
-            for tr in table.find_all('tr'):
-                tr_class = tr.get('class', [])
-                # n1～n9のクラスを持つ行のみ処理
-                if not any(c.startswith('n') and len(c) == 2 and c[1:].isdigit() for c in tr_class):
-                    continue
-                
-                cells = tr.find_all('td')
-                row = {}  # 辞書形式で一時保存
-                
-                for td in cells:
-                    td_classes = td.get('class', [])
-                    
-                    # クラス名でセルを識別
-                    # 予想、好気合、総評、枠番のセルはスキップ
-                    if 'tip' in td_classes or 'kiai' in td_classes or 'evaluation' in td_classes or 'bracket' in td_classes:
-                        continue
-                    
-                    elif 'num' in td_classes:
-                        # 車番セル
-                        span = td.find('span')
-                        row['車番'] = span.get_text(strip=True) if span else td.get_text(strip=True)
-                    
-                    elif 'rider' in td_classes:
-                        # 選手名セル（特別処理: 選手名 + 府県/年齢/期別）
-                        html_content = str(td)
-                        html_content = html_content.replace('<br>', '\n').replace('<br/>', '\n')
-                        temp_soup = BeautifulSoup(html_content, 'html.parser')
-                        text = temp_soup.get_text()
-                        lines = [line.strip() for line in text.split('\n') if line.strip()]
-                        
-                        # 選手名（1行目）
-                        row['選手名'] = lines[0] if len(lines) > 0 else ''
-                        
-                        # 府県/年齢/期別（2行目）
-                        if len(lines) > 1:
-                            info_parts = lines[1].split('/')
-                            row['府県'] = info_parts[0].strip() if len(info_parts) > 0 else ''
-                            row['年齢'] = info_parts[1].strip() if len(info_parts) > 1 else ''
-                            row['期別'] = info_parts[2].strip() if len(info_parts) > 2 else ''
-                        else:
-                            row['府県'] = ''
-                            row['年齢'] = ''
-                            row['期別'] = ''
-                
-                # クラスなしセルを順番に処理（級班、脚質、ギヤ倍数、統計データ）
-                # クラスなしセルのインデックスを取得
-                classless_cells = []
-                for td in cells:
-                    td_classes = td.get('class', [])
-                    # 特定のクラスを持たないセル、またはbdr_rだけのセル
-                    if not td_classes or (len(td_classes) == 1 and 'bdr_r' in td_classes):
-                        span = td.find('span')
-                        text = span.get_text(strip=True) if span else td.get_text(strip=True)
-                        classless_cells.append(text)
-                
-                # クラスなしセルを順番にマッピング
-                # 期待順序: 級班、脚質、ギヤ倍数、競走得点、S、B、逃、捲、差、マ、1着、2着、3着、着外
-                cell_map = ['級班', '脚質', 'ギヤ倍数', '競走得点', 'S', 'B', '逃', '捲', '差', 'マ',
-                           '1着', '2着', '3着', '着外']
-                
-                for i, col_name in enumerate(cell_map):
-                    if i < len(classless_cells):
-                        row[col_name] = classless_cells[i]
-                    else:
-                        row[col_name] = ''
-                
-                # 19カラムすべてを含む行を作成（順序保証）
-                ordered_row = []
-                for header in headers:
-                    ordered_row.append(row.get(header, ''))
-                
-                if ordered_row:
-                    rows_data.append(ordered_row)
-            
-            if not rows_data:
-                print("データ行が見つかりませんでした")
-                return pd.DataFrame()
-            
-            # DataFrameを作成
-            df = pd.DataFrame(rows_data, columns=headers)
-            
-            # 数値変換（バリデーション付き）
-            # 車番: 1-9の整数
-            if '車番' in df.columns:
-                df['車番'] = pd.to_numeric(df['車番'], errors='coerce')
-                df.loc[(df['車番'] < 1) | (df['車番'] > 9), '車番'] = None
-            
-            # 年齢: 18-70の整数
-            if '年齢' in df.columns:
-                df['年齢'] = pd.to_numeric(df['年齢'], errors='coerce')
-                df.loc[(df['年齢'] < 18) | (df['年齢'] > 70), '年齢'] = None
-            
-            # 期別: 1-150の整数
-            if '期別' in df.columns:
-                df['期別'] = pd.to_numeric(df['期別'], errors='coerce')
-                df.loc[(df['期別'] < 1) | (df['期別'] > 150), '期別'] = None
-            
-            # その他の数値カラム（総評を除外）
-            numeric_cols = ['ギヤ倍数', '競走得点', 'S', 'B', '逃', '捲', '差', 'マ',
-                           '1着', '2着', '3着', '着外']
-            for col in numeric_cols:
-                if col in df.columns:
-                    df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-            print(f"出走表データ: {len(df)}行 x {len(df.columns)}列取得")
+            response = self._get(self._racedetail_url(race_url))
+            df = self._parse(response, 'card', parse_race_card)
+            if not df.empty:
+                self.rider_index.assign(df)
+                print(f"出走表データ: {len(df)}行 x {len(df.columns)}列取得")
             return df
             
         except Exception as e:
@@ -381,31 +492,8 @@ class KdreamsScraper:
             ライン予想文字列（例: "123-45-6"）
         """
         try:
-            response = self.session.get(race_url, timeout=10)
-            response.raise_for_status()
-            time.sleep(1)
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # 「並び予想」のセクションを探す
-            line_section = soup.find(text=re.compile(r'並び|ライン'))
-            
-            if line_section:
-                # 親要素から数字を抽出
-                parent = line_section.parent
-                if parent:
-                    numbers = re.findall(r'\d', parent.get_text())
-                    if numbers:
-                        # 連続する数字をグループ化（ヒューリスティック）
-                        return ''.join(numbers)
-            
-            # フォールバック: ページ全体から数字パターンを探す
-            text_content = soup.get_text()
-            line_match = re.search(r'(\d+[-‐]\d+[-‐]\d+)', text_content)
-            if line_match:
-                return line_match.group(1).replace('‐', '-')
-            
-            return ""
+            response = self._get(race_url)
+            return self._parse(response, 'prediction', parse_line_prediction)
             
         except Exception as e:
             print(f"ライン予想取得エラー: {e}")
@@ -428,49 +516,8 @@ class KdreamsScraper:
             else:
                 odds_url = race_url
             
-            response = self.session.get(odds_url, timeout=10)
-            response.raise_for_status()
-            time.sleep(1)
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # オッズテーブルを探す
-            odds_data = []
-            
-            # パターン1: テーブル形式
-            tables = soup.find_all('table')
-            for table in tables:
-                rows = table.find_all('tr')
-                for row in rows:
-                    cells = row.find_all(['td', 'th'])
-                    cell_texts = [c.get_text(strip=True) for c in cells]
-                    
-                    # 3連単パターンを探す（1-2-3形式または別々のセル）
-                    if len(cell_texts) >= 4:
-                        # 数字を抽出
-                        numbers = []
-                        for text in cell_texts:
-                            nums = re.findall(r'\d+', text)
-                            numbers.extend(nums)
-                        
-                        if len(numbers) >= 4:
-                            # 最後が小数点を含む可能性があるオッズ値
-                            try:
-                                odds_value = float(numbers[3]) if '.' in cell_texts[-1] else float(numbers[3])
-                                odds_data.append({
-                                    '1着': int(numbers[0]),
-                                    '2着': int(numbers[1]),
-                                    '3着': int(numbers[2]),
-                                    'オッズ': odds_value
-                                })
-                            except (ValueError, IndexError):
-                                continue
-            
-            if odds_data:
-                df = pd.DataFrame(odds_data)
-                return df
-            
-            return pd.DataFrame(columns=['1着', '2着', '3着', 'オッズ'])
+            response = self._get(odds_url)
+            return self._parse(response, 'odds_3rentan', parse_3rentan_odds)
             
         except Exception as e:
             print(f"3連単オッズ取得エラー: {e}")
@@ -488,60 +535,10 @@ class KdreamsScraper:
             人気順オッズのDataFrame (順位, 組み合わせ, オッズ)
         """
         try:
-            # オッズページURLを構築
-            if '?' in race_url:
-                odds_url = f"{race_url}&pageType=odds&kakeshikiType=3rentan"
-            else:
-                odds_url = f"{race_url}?pageType=odds&kakeshikiType=3rentan"
-            
-            response = self.session.get(odds_url, timeout=10)
-            response.raise_for_status()
-            time.sleep(1)
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # オッズセクションを探す
-            odds_sections = soup.find_all('div', class_='oddspop_table_wrapper')
-            
-            if not odds_sections:
-                print("⚠️ オッズセクションが見つかりません（JavaScriptレンダリングが必要な可能性）")
-                return pd.DataFrame()
-            
-            # 3連単セクション（最初のセクション）
-            sanrentan_section = odds_sections[0]
-            
-            # テーブルを取得（1つ目が人気順）
-            tables = sanrentan_section.find_all('table')
-            
-            if not tables:
-                print("⚠️ オッズテーブルが見つかりません")
-                return pd.DataFrame()
-            
-            # 人気順テーブル（1つ目）
-            popular_table = tables[0]
-            rows = popular_table.find_all('tr')
-            
-            odds_data = []
-            for row in rows:
-                th = row.find('th')
-                td = row.find('td')
-                
-                if th and td:
-                    rank = th.get_text(strip=True)
-                    num_span = td.find('span', class_='num')
-                    odds_span = td.find('span', class_='odds')
-                    
-                    if num_span and odds_span:
-                        combination = num_span.get_text(strip=True)
-                        odds = odds_span.get_text(strip=True)
-                        odds_data.append({
-                            '順位': rank,
-                            '組み合わせ': combination,
-                            'オッズ': odds
-                        })
-            
-            df = pd.DataFrame(odds_data)
-            print(f"✅ オッズデータ取得: {len(df)}通り")
+            response = self._get(self._odds_url(race_url))
+            df = self._parse(response, 'odds', parse_odds)
+            if not df.empty:
+                print(f"✅ オッズデータ取得: {len(df)}通り")
             return df
             
         except Exception as e:
@@ -556,125 +553,25 @@ class KdreamsScraper:
             race_url: レース詳細ページのURL
             
         Returns:
-            レース結果のDataFrame (着順,車番,選手名,着差,上がり,決まり手,S/B)
+            レース結果のDataFrame (着順,車番,選手名,着差,上がり,決まり手,S/B,選手コード,選手ID)
         """
         try:
-            # 結果ページのURLを構築（?pageType=result パラメータを追加）
-            if '?' in race_url:
-                results_url = race_url + '&pageType=result'
-            else:
-                results_url = race_url.rstrip('/') + '/?pageType=result'
-            
+            results_url = self._result_url(race_url)
             print(f"結果ページURL: {results_url}")
             
-            response = self.session.get(results_url, timeout=10)
-            response.raise_for_status()
-            time.sleep(1)
-            
-            soup = BeautifulSoup(response.text, 'html.parser')
-            
-            # result_tableクラスのテーブルを探す
-            result_table = soup.find('table', class_='result_table')
-            
-            if not result_table:
-                print("結果テーブルが見つかりません")
-                return pd.DataFrame(columns=['着順', '車番', '選手名', '着差', '上がり', '決まり手', 'S/B'])
-            
-            # データ行を取得
-            tbody = result_table.find('tbody')
-            if tbody:
-                data_rows = tbody.find_all('tr')
-            else:
-                # tbody がない場合は直接 tr を取得（ヘッダーをスキップ）
-                data_rows = result_table.find_all('tr')[1:]
-            
-            results = []
-            
-            for row in data_rows:
-                cells = row.find_all('td')
-                
-                if len(cells) > 0:
-                    # インデックスベースでセルを取得
-                    # HTML構造: tip(予想), 着順, num(車番), rider(選手名), 着差, 上がり, 決まり手, S/B, comment(勝敗因)
-                    
-                    chakujun_num = ''
-                    shaban = ''
-                    senshu = ''
-                    chakusa = ''
-                    agari = ''
-                    kimarite = ''
-                    sb = ''
-                    
-                    # 各セルを順番に処理
-                    for i, td in enumerate(cells):
-                        td_classes = td.get('class', [])
-                        text = td.get_text(strip=True)
-                        
-                        # クラスベースで特定できるセル
-                        if 'tip' in td_classes:
-                            # 予想マーク - スキップ（位置: 0）
-                            continue
-                        elif 'num' in td_classes:
-                            # 車番（位置: 2）
-                            shaban = text
-                        elif 'rider' in td_classes:
-                            # 選手名（位置: 3）
-                            senshu = text
-                        elif 'comment' in td_classes:
-                            # コメント（位置: 8） - スキップ
-                            continue
-                    
-                    # 位置ベースで通常セルを取得（クラスなしのtd）
-                    # インデックスを数えて正確に割り当て
-                    normal_cell_index = 0
-                    for i, td in enumerate(cells):
-                        td_classes = td.get('class', [])
-                        
-                        # 特殊クラスを持つセルはスキップ
-                        if any(cls in td_classes for cls in ['tip', 'num', 'rider', 'comment']):
-                            continue
-                        
-                        text = td.get_text(strip=True)
-                        
-                        # 通常セルの順序: 着順(0), 着差(1), 上がり(2), 決まり手(3), S/B(4)
-                        if normal_cell_index == 0:
-                            chakujun_num = text
-                        elif normal_cell_index == 1:
-                            chakusa = text
-                        elif normal_cell_index == 2:
-                            agari = text
-                        elif normal_cell_index == 3:
-                            kimarite = text
-                        elif normal_cell_index == 4:
-                            sb = text
-                        
-                        normal_cell_index += 1
-                    
-                    # 結果データを構築
-                    result_data = {
-                        '着順': chakujun_num,
-                        '車番': shaban,
-                        '選手名': senshu,
-                        '着差': chakusa,
-                        '上がり': agari,
-                        '決まり手': kimarite,
-                        'S/B': sb,
-                    }
-                    
-                    results.append(result_data)
-            
-            if results:
-                df = pd.DataFrame(results)
+            response = self._get(results_url)
+            df = self._parse(response, 'result', parse_race_results)
+            if not df.empty:
+                self.rider_index.assign(df)
+                self._record_results(race_url, df)
                 print(f"取得した結果数: {len(df)}")
-                return df
-            
-            return pd.DataFrame(columns=['着順', '車番', '選手名', '着差', '上がり', '決まり手', 'S/B'])
+            return df
             
         except Exception as e:
             print(f"レース結果取得エラー: {e}")
             import traceback
             traceback.print_exc()
-            return pd.DataFrame(columns=['着順', '車番', '選手名', '着差', '上がり', '決まり手', 'S/B'])
+            return pd.DataFrame(columns=RESULT_COLUMNS)
     
     def get_all_race_data(self, race_url: str) -> Tuple[pd.DataFrame, str, pd.DataFrame]:
         """
@@ -694,6 +591,177 @@ class KdreamsScraper:
         
         return race_card, line_prediction, odds_3rentan
     
+    def race_url_for(self, race: str) -> str:
+        """
+        レースURLまたはレースID（16桁）から racedetail のURLを返す
+
+        IDだけの場合は、競輪場レジストリの場コード → スラッグの対応から組み立てる。
+        """
+        race = str(race)
+        if '/' in race:
+            return self._racedetail_url(race)
+        if not re.fullmatch(r'\d{16}', race):
+            raise ValueError(f"レースIDの形式が不正: {race}")
+        return self.venue_registry.race_url_for_id(race, self.BASE_URL, learn=self.learn_venues)
+    
+    def plan_requests(self, race_url: str, parts=RACE_PARTS) -> Dict[str, List[str]]:
+        """
+        指定した区分の取得に必要な最小限のリクエストを返す
+        
+        出走表とラインは同じ racedetail ページから取り出すため1リクエストにまとめる。
+        
+        Returns:
+            {URL: [そのページから取り出す区分, ...]}（URLの並びは取得順）
+        """
+        unknown = set(parts) - set(RACE_PARTS)
+        if unknown:
+            raise ValueError(f"不明な区分: {sorted(unknown)}（指定できるのは {RACE_PARTS}）")
+        pages = {
+            'card': self._racedetail_url(race_url),
+            'lines': self._racedetail_url(race_url),
+            'results': self._result_url(race_url),
+            'odds': self._odds_url(race_url),
+        }
+        plan: Dict[str, List[str]] = {}
+        for part in RACE_PARTS:
+            if part in parts:
+                plan.setdefault(pages[part], []).append(part)
+        return plan
+    
+    def fetch_race(self, race: str, parts=RACE_PARTS) -> Dict:
+        """
+        1レースの指定した区分だけを、必要最小限のリクエストで取得する
+        
+        例: parts={'results'} なら結果ページの1リクエストのみ、
+            parts={'card', 'lines'} なら racedetail ページの1リクエストのみ。
+        
+        Args:
+            race: レースURL（racedetail / racecard）またはレースID（16桁）
+            parts: 'card', 'lines', 'results', 'odds' の組み合わせ
+        
+        Returns:
+            {'race_id', 'race_url', 指定した区分: 'card' (DataFrame), 'lines' (List[Dict]),
+             'results' (DataFrame), 'odds' (DataFrame)}（取得失敗した区分は空）
+        """
+        race_url = self.race_url_for(race)
+        match = re.search(r'/racedetail/(\d+)/', race_url)
+        data = {'race_id': match.group(1) if match else '', 'race_url': race_url}
+        empty = {
+            'card': pd.DataFrame,
+            'lines': list,
+            'results': lambda: pd.DataFrame(columns=RESULT_COLUMNS),
+            'odds': pd.DataFrame,
+        }
+        parsers = {
+            'card': ('card', parse_race_card),
+            'lines': ('lines', parse_race_lines),
+            'results': ('result', parse_race_results),
+            'odds': ('odds', parse_odds),
+        }
+        
+        for url, url_parts in self.plan_requests(race_url, parts).items():
+            try:
+                response = self._get(url)
+            except Exception as e:
+                print(f"❌ 取得エラー ({', '.join(url_parts)}): {url} ({e})")
+                for part in url_parts:
+                    data[part] = empty[part]()
+                continue
+            for part in url_parts:
+                section, parser = parsers[part]
+                try:
+                    value = self._parse(response, section, parser)
+                except Exception as e:
+                    print(f"❌ 解析エラー ({part}): {url} ({e})")
+                    value = empty[part]()
+                if part in ('card', 'results') and not value.empty:
+                    self.rider_index.assign(value)
+                    if part == 'results':
+                        self._record_results(race_url, value)
+                data[part] = value
+        return data
+    
+    def fetch_venue(self, venue_url: str, parts=RACE_PARTS, max_workers: int = 4) -> Dict:
+        """
+        開催場の全レースについて、指定した区分だけを取得する（fetch_race() の開催場版）
+        
+        例: 前日の結果だけ集める場合は parts={'results'} で1レース1リクエストになる。
+        
+        Args:
+            venue_url: 開催場のURL（racecard / raceresult いずれも可）
+            parts: 'card', 'lines', 'results', 'odds' の組み合わせ
+            max_workers: 同時に取得するレース数の上限
+        
+        Returns:
+            指定した区分に対応する 'race_cards', 'lines_list', 'results_list', 'odds_list'
+            （いずれもDataFrame、先頭に「レース」列）
+        """
+        all_races = self.get_all_races_from_venue(venue_url)
+        with request_context(priority='bulk'):
+            fetch = with_context(lambda race: self.fetch_race(race['url'], parts))
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            fetched = list(executor.map(fetch, all_races))
+        
+        tables = {'card': 'race_cards', 'results': 'results_list', 'odds': 'odds_list'}
+        frames: Dict[str, List[pd.DataFrame]] = {name: [] for part, name in tables.items() if part in parts}
+        line_rows = []
+        for race, data in zip(all_races, fetched):
+            label = f"{race['race_number']}R"
+            for part, name in tables.items():
+                df = data.get(part)
+                if df is not None and not df.empty:
+                    df.insert(0, 'レース', label)
+                    frames[name].append(df)
+            for ln in data.get('lines', []):
+                line_rows.append({'レース': label, 'ライン番号': ln['line'], '車番': '-'.join(str(b) for b in ln['bibs'])})
+        
+        result = {name: pd.concat(dfs, ignore_index=True) if dfs else pd.DataFrame() for name, dfs in frames.items()}
+        if 'lines' in parts:
+            result['lines_list'] = pd.DataFrame(line_rows) if line_rows else pd.DataFrame(columns=['レース', 'ライン番号', '車番'])
+        return result
+    
+    def _get_race_bundle(self, race_no: int, race_url: str) -> Tuple[Optional[pd.DataFrame], List[Dict], Optional[pd.DataFrame]]:
+        """
+        1レース分の出走表・ライン情報・結果を取得し、レース列を付与する
+        
+        出走表とラインは同じページから取り出すため、1レースあたり2リクエストで済む。
+        
+        Returns:
+            (出走表DataFrame or None, ライン行のリスト, 結果DataFrame or None)
+        """
+        data = self.fetch_race(race_url, ('card', 'lines', 'results'))
+        
+        race_card = data['card']
+        if not race_card.empty:
+            race_card.insert(0, 'レース', f"{race_no}R")
+            print(f"  ✅ 出走表: {len(race_card)}名")
+        else:
+            race_card = None
+            print(f"  ⚠️ 出走表: データなし")
+        
+        lines = data['lines']
+        line_rows = []
+        if lines:
+            for ln in lines:
+                line_rows.append({
+                    'レース': f"{race_no}R",
+                    'ライン番号': ln['line'],
+                    '車番': '-'.join(str(b) for b in ln['bibs'])
+                })
+            print(f"  ✅ ライン情報: {len(lines)}ライン")
+        else:
+            print(f"  ⚠️ ライン情報: データなし")
+        
+        results = data['results']
+        if not results.empty:
+            results.insert(0, 'レース', f"{race_no}R")
+            print(f"  ✅ 結果: {len(results)}名")
+        else:
+            results = None
+            print(f"  ℹ️ 結果: 未確定またはデータなし")
+        
+        return race_card, line_rows, results
+    
     def get_venue_all_data(self, venue_name: str, racecard_url: str) -> Dict:
         """
         開催場の全レース（1R-12R）のデータを一括取得（本日のみ対応）
@@ -738,41 +806,17 @@ class KdreamsScraper:
         # 各レースのデータを取得
         for i, race in enumerate(all_races, 1):
             race_no = race['race_number']
-            race_url = race['url']
             
             print(f"\n[{i}/{total_races}] {race_no}R のデータ取得中...")
             
             try:
-                # 出走表を取得
-                race_card = self.get_race_card(race_url)
-                if not race_card.empty:
-                    race_card.insert(0, 'レース', f"{race_no}R")
+                with request_context(priority='bulk'):
+                    race_card, lines, results = self._get_race_bundle(race_no, race['url'])
+                if race_card is not None:
                     all_race_cards.append(race_card)
-                    print(f"  ✅ 出走表: {len(race_card)}名")
-                else:
-                    print(f"  ⚠️ 出走表: データなし")
-                
-                # ライン情報を取得
-                lines = self.get_race_lines(race_url)
-                if lines:
-                    for ln in lines:
-                        all_lines.append({
-                            'レース': f"{race_no}R",
-                            'ライン番号': ln['line'],
-                            '車番': '-'.join(str(b) for b in ln['bibs'])
-                        })
-                    print(f"  ✅ ライン情報: {len(lines)}ライン")
-                else:
-                    print(f"  ⚠️ ライン情報: データなし")
-                
-                # レース結果を取得
-                results = self.get_race_results(race_url)
-                if not results.empty:
-                    results.insert(0, 'レース', f"{race_no}R")
+                all_lines.extend(lines)
+                if results is not None:
                     all_results.append(results)
-                    print(f"  ✅ 結果: {len(results)}名")
-                else:
-                    print(f"  ℹ️ 結果: 未確定またはデータなし")
                 
             except Exception as e:
                 print(f"  ❌ {race_no}R のデータ取得エラー: {e}")
@@ -798,73 +842,194 @@ class KdreamsScraper:
             'results_list': combined_results
         }
 
+    def get_race_item(self, race: str, venue_name: str = '') -> Dict:
+        """
+        1レース分の出走表・ライン情報・結果を iter_races_data() と同じ形式で取得する
+        （ジョブキューのワーカーなど、レース単位で取得してシンクに書き出す場合に使う）
+        
+        Args:
+            race: レースURLまたはレースID（16桁）
+            venue_name: 開催場名（省略時は競輪場レジストリから引く）
+        """
+        race_url = self.race_url_for(race)
+        match = re.search(r'/racedetail/(\d{14})(\d{2})/', race_url)
+        if not match:
+            raise ValueError(f"レースURLの形式が不正: {race_url}")
+        if not venue_name:
+            venue = self.venue_registry.by_kdreams_code(match.group(1))
+            venue_name = venue['venue_name'] if venue else ''
+        race_no = int(match.group(2))
+        race_card, lines, results = self._get_race_bundle(race_no, race_url)
+        return {
+            'venue_order': 0,
+            'venue_name': venue_name,
+            'race_number': race_no,
+            'race_url': race_url,
+            'race_card': race_card,
+            'lines': lines,
+            'results': results,
+        }
+    
+    def iter_races_data(self, venues: List[Dict], max_workers: int = 4,
+                        progress_callback: Optional[Callable[[int, int], None]] = None) -> Iterator[Dict]:
+        """
+        複数開催場の全レースを並列取得し、1レースずつ完了順に返すジェネレーター
+        
+        実行中・未消費のレースは max_workers の2倍までに抑えるため、
+        呼び出し側が1レースずつ書き出せば全体のデータ量に関係なくメモリ使用量は一定になる。
+        
+        Args:
+            venues: get_races() の結果
+            max_workers: 同時に取得するレース数の上限
+            progress_callback: 1レース完了ごとに (完了数, 総数) で呼ばれる関数
+        
+        Yields:
+            {'venue_order', 'venue_name', 'race_number', 'race_url',
+             'race_card' (DataFrame or None), 'lines' (ライン行のリスト), 'results' (DataFrame or None)}
+        """
+        # 全開催場のレースを列挙（開催場の並び順 → レース番号順）
+        tasks = []
+        for venue_order, venue in enumerate(venues):
+            for race in self.get_all_races_from_venue(venue['url']):
+                tasks.append((venue_order, venue['velodrome'], race))
+        
+        print(f"\n{'='*60}")
+        print(f"全開催場一括取得開始: {len(venues)}場 / {len(tasks)}レース (並列数={max_workers})")
+        print(f"{'='*60}\n")
+        
+        max_workers = max(1, max_workers)
+        # ワーカースレッドには呼び出し元のクライアントを引き継ぎ、優先度は一括取得（bulk）にする
+        with request_context(priority='bulk'):
+            get_bundle = with_context(self._get_race_bundle)
+        pending_tasks = iter(tasks)
+        done = 0
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            in_flight = {}
+            
+            def _submit_next() -> None:
+                for venue_order, velodrome, race in pending_tasks:
+                    future = executor.submit(get_bundle, race['race_number'], race['url'])
+                    in_flight[future] = (venue_order, velodrome, race)
+                    return
+            
+            for _ in range(max_workers * 2):
+                _submit_next()
+            
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    venue_order, velodrome, race = in_flight.pop(future)
+                    _submit_next()
+                    done += 1
+                    if progress_callback:
+                        progress_callback(done, len(tasks))
+                    try:
+                        race_card, lines, results = future.result()
+                    except Exception as e:
+                        print(f"  ❌ {velodrome} {race['race_number']}R のデータ取得エラー: {e}")
+                        continue
+                    yield {
+                        'venue_order': venue_order,
+                        'venue_name': velodrome,
+                        'race_number': race['race_number'],
+                        'race_url': race['url'],
+                        'race_card': race_card,
+                        'lines': lines,
+                        'results': results,
+                    }
+    
+    def crawl(self, venues: List[Dict], sink, max_workers: int = 4,
+              progress_callback: Optional[Callable[[int, int], None]] = None) -> int:
+        """
+        全レースを取得しながらシンクに1レースずつ書き出す（結果をメモリに溜めない）
+        
+        Args:
+            venues: get_races() の結果
+            sink: write_race(item) を持つ書き出し先（kdreams_export の StreamingExporter / ParquetSink）
+            max_workers: 同時に取得するレース数の上限
+            progress_callback: 1レース完了ごとに (完了数, 総数) で呼ばれる関数
+        
+        Returns:
+            書き出したレース数
+        """
+        count = 0
+        for item in self.iter_races_data(venues, max_workers=max_workers, progress_callback=progress_callback):
+            sink.write_race(item)
+            count += 1
+        return count
+    
+    def get_all_venues_data(self, date_type: str = "today", max_workers: int = 4,
+                            venues: Optional[List[Dict]] = None,
+                            progress_callback: Optional[Callable[[int, int], None]] = None) -> Dict:
+        """
+        全開催場・全レースのデータを一括取得する
+        
+        全開催場のレースを1つのスレッドプールに投入し、同時実行数は max_workers、
+        リクエスト間隔は self.rate_limiter で全体として制御する。
+        
+        Args:
+            date_type: "today" (本日) または "yesterday" (前日)
+            max_workers: 同時に取得するレース数の上限
+            venues: get_races() の結果（省略時はここで取得）
+            progress_callback: 1レース完了ごとに (完了数, 総数) で呼ばれる関数
+        
+        Returns:
+            get_venue_all_data() と同じ形式の辞書（各DataFrameの先頭に「開催場」列を追加）
+        """
+        if venues is None:
+            venues = self.get_races(date_type)
+        
+        collected = []
+        for item in self.iter_races_data(venues, max_workers=max_workers, progress_callback=progress_callback):
+            collected.append((item['venue_order'], item['race_number'], item['venue_name'],
+                              item['race_card'], item['lines'], item['results']))
+        
+        collected.sort(key=lambda x: (x[0], x[1]))
+        
+        all_race_cards = []
+        all_lines = []
+        all_results = []
+        for _, _, velodrome, race_card, lines, results in collected:
+            if race_card is not None:
+                race_card.insert(0, '開催場', velodrome)
+                all_race_cards.append(race_card)
+            for row in lines:
+                all_lines.append({'開催場': velodrome, **row})
+            if results is not None:
+                results.insert(0, '開催場', velodrome)
+                all_results.append(results)
+        
+        combined_race_cards = pd.concat(all_race_cards, ignore_index=True) if all_race_cards else pd.DataFrame()
+        combined_lines = pd.DataFrame(all_lines) if all_lines else pd.DataFrame(columns=['開催場', 'レース', 'ライン番号', '車番'])
+        combined_results = pd.concat(all_results, ignore_index=True) if all_results else pd.DataFrame()
+        
+        print(f"\n{'='*60}")
+        print(f"全開催場一括取得完了: {len(venues)}場")
+        print(f"  出走表: {len(combined_race_cards)}行")
+        print(f"  ライン情報: {len(combined_lines)}行")
+        print(f"  結果: {len(combined_results)}行")
+        print(f"{'='*60}\n")
+        
+        return {
+            'venue_name': '全開催場',
+            'grade': '',
+            'race_cards': combined_race_cards,
+            'lines_list': combined_lines,
+            'results_list': combined_results
+        }
+
 
 
     def get_race_lines(self, race_url: str) -> List[Dict]:
         """
-        ライン構成を取得する。
-
-        HTML構造:
-          <div class="line_position">
-            <span class="icon_p"><span class="p007">7</span>...</span>  # 車番7
-            <span class="icon_p"><span class="p001">1</span>...</span>  # 車番1
-            <span class="icon_p space"></span>                          # ライン区切り
-            <span class="icon_p"><span class="p002">2</span>...</span>  # 車番2
-            ...
-          </div>
+        ライン構成を取得する（HTML構造は parse_race_lines() を参照）
+        
+        Returns:
+            [{"line": 1, "bibs": [7, 1, 3]}, ...]
         """
-        import re as _re
-
         try:
-            if '/racecard/' in race_url:
-                parts = race_url.split('/racecard/')
-                if len(parts) == 2:
-                    race_url = parts[0] + '/racedetail/' + parts[1]
-
-            response = self.session.get(race_url, timeout=10)
-            response.raise_for_status()
-            time.sleep(0.5)
-            soup = BeautifulSoup(response.text, 'html.parser')
-
-            # line_position div 内の span.icon_p を値得る
-            line_pos_div = soup.find('div', class_='line_position')
-            if not line_pos_div:
-                return []
-
-            result   = []
-            line_no  = 1
-            cur_bibs: List[int] = []
-            seen:     set       = set()
-
-            for span in line_pos_div.find_all('span', class_='icon_p'):
-                classes = span.get('class', [])
-
-                # space クラス = ライン区切り
-                if 'space' in classes:
-                    if cur_bibs:
-                        result.append({"line": line_no, "bibs": cur_bibs})
-                        line_no += 1
-                        cur_bibs = []
-                        seen     = set()
-                    continue
-
-                # p00X クラスを持つ子要素から車番を取得
-                # 例: p007 → 7号車, p001 → 1号車
-                for child in span.find_all('span'):
-                    child_classes = child.get('class', [])
-                    for c in child_classes:
-                        m = _re.match(r'^p0+([1-9])$', c)   # p001/p007 など
-                        if m:
-                            b = int(m.group(1))
-                            if b not in seen:
-                                seen.add(b)
-                                cur_bibs.append(b)
-
-            # 末尾のライン
-            if cur_bibs:
-                result.append({"line": line_no, "bibs": cur_bibs})
-
-            return result
+            response = self._get(self._racedetail_url(race_url))
+            return self._parse(response, 'lines', parse_race_lines)
 
         except Exception as e:
             print(f"❌ ライン情報取得エラー: {e}")
@@ -877,20 +1042,27 @@ class KdreamsScraper:
 
         例: "ライン1: 3-5-1 / ライン2: 4-7 / ライン3: 2-6-8-9"
         """
-        lines = self.get_race_lines(race_url)
-        if not lines:
-            return "ライン情報なし"
-        parts = []
-        for ln in lines:
-            bib_str = "-".join(str(b) for b in ln["bibs"])
-            parts.append(f"ライン{ln['line']}: {bib_str}")
-        return " / ".join(parts)
+        return format_lines_text(self.get_race_lines(race_url))
+
 
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Kドリームス レース一覧取得")
+    parser.add_argument("--record", metavar="PATH", help="全リクエスト/レスポンスをカセットに記録する")
+    parser.add_argument("--replay", metavar="PATH", help="カセットから再生する（ネットワーク接続なし）")
+    parser.add_argument("--latency", type=float, default=0.0, help="再生時に加える応答待ち時間（秒）")
+    args = parser.parse_args()
+
+    cassette = None
+    if args.record:
+        cassette = Cassette(args.record, mode="record")
+    elif args.replay:
+        cassette = Cassette(args.replay, mode="replay", latency=args.latency)
 
     # テスト実行
-    scraper = KdreamsScraper()
+    scraper = KdreamsScraper(cassette=cassette)
     races = scraper.get_todays_races()
     print(f"本日のS級レース: {len(races)}件")
     for race in races[:5]:
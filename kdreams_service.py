@@ -0,0 +1,378 @@
+"""
+ローカル参照サービス（読み取り専用 JSON / Arrow HTTP API）
+1つのスクレイパーで開催日ごとに1回だけクロールして RaceBook を作り、共有ストアに置いて
+出走表・ライン・結果・オッズを race_id・開催場・日付で返す。モデル・ダッシュボード・ノートブックは
+それぞれスクレイパーを動かす代わりにこのサービスを読めばよく、Kドリームスへの通信は1本にまとまる。
+エンコード済みのレスポンスはキャッシュし、ETag による 304 応答にも対応する。
+
+エンドポイント（GET のみ、date は today / yesterday / YYYYMMDD、既定は today）:
+    /status                                      クロール状況・キャッシュ統計
+    /venues?date=today                           開催場とレース一覧
+    /races/<race_id>?parts=card,lines,results,odds
+    /tables/<card|lines|results|odds>?date=&venue=&race_id=&format=json|arrow
+
+使い方:
+    python kdreams_service.py --port 8780 --date today --refresh 600
+    curl 'http://127.0.0.1:8780/tables/card?venue=奈良'
+    pd.read_json('http://127.0.0.1:8780/tables/results?format=json')
+    pa.ipc.open_stream(urlopen('http://127.0.0.1:8780/tables/card?format=arrow')).read_all()
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pyarrow as pa
+
+from kdreams_governor import request_context
+from kdreams_racebook import KEY_COLUMNS, TABLE_NAMES, RaceBook, RaceBookBuilder
+from kdreams_scraper import KdreamsScraper, ResponseCache
+from kdreams_store import DataStore
+
+
+DATE_TYPES = ('today', 'yesterday')
+ARROW_CONTENT_TYPE = 'application/vnd.apache.arrow.stream'
+JSON_CONTENT_TYPE = 'application/json; charset=utf-8'
+
+_RACE_PATH_RE = re.compile(r'^/races/(\d{16})/?$')
+_TABLE_PATH_RE = re.compile(r'^/tables/([a-z]+)/?$')
+
+
+class QueryError(Exception):
+    """クライアントに返すエラー（HTTPステータス付き）"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def resolve_date(value: Optional[str]) -> str:
+    """date パラメータ（today / yesterday / YYYYMMDD / YYYY-MM-DD）→ 日付タイプ"""
+    if not value or value in DATE_TYPES:
+        return value or 'today'
+    digits = value.replace('-', '')
+    today = date.today()
+    for date_type, day in (('today', today), ('yesterday', today - timedelta(days=1))):
+        if digits == f"{day:%Y%m%d}":
+            return date_type
+    raise QueryError(404, f"{value} のデータはありません（本日・前日のみ）")
+
+
+def _to_json(data) -> bytes:
+    return json.dumps(data, ensure_ascii=False, default=str).encode('utf-8')
+
+
+def _to_arrow_stream(table: pa.Table) -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+
+class QueryService:
+    """
+    クロール済みデータの参照（スレッドセーフ）
+
+    RaceBook は DataStore に ('service_book', 日付タイプ) のキーで置き、同じ日付を同時に要求されても
+    クロールは1回だけ行う。オッズはクロールに含めず、要求されたレースだけ取得する。
+    """
+
+    def __init__(self, scraper: Optional[KdreamsScraper] = None, store: Optional[DataStore] = None,
+                 max_workers: int = 4, book_ttl: Optional[float] = None, cache_ttl: float = 300.0,
+                 cache_entries: int = 2048):
+        """
+        Args:
+            scraper: 取得に使うスクレイパー（省略時は新規作成）
+            store: RaceBook を置くストア（省略時は新規作成）
+            max_workers: クロールの同時取得数
+            book_ttl: RaceBook の有効期限（秒、None なら refresh() するまで保持）
+            cache_ttl: エンコード済みレスポンスの有効期限（秒）
+            cache_entries: エンコード済みレスポンスの最大保持数
+        """
+        self.scraper = scraper or KdreamsScraper()
+        self.store = store or DataStore()
+        self.max_workers = max_workers
+        self.book_ttl = book_ttl
+        self.responses = ResponseCache(ttl=cache_ttl, max_entries=cache_entries)
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    # ── クロール ──────────────────────────────────────
+
+    def _crawl(self, date_type: str) -> Dict:
+        start = time.time()
+        with request_context(client='service', priority='bulk'):
+            venues = self.scraper.get_races(date_type)
+            builder = RaceBookBuilder()
+            self.scraper.crawl(venues, builder, max_workers=self.max_workers)
+        book = builder.build()
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+        print(f"✅ {date_type} のクロール完了: {len(book.venues)}場 {book.num_races}レース ({time.time() - start:.1f}秒)")
+        return {'book': book, 'generation': generation, 'built_at': time.time()}
+
+    def _entry(self, date_type: str) -> Dict:
+        return self.store.get_or_fetch(('service_book', date_type), lambda: self._crawl(date_type), ttl=self.book_ttl)
+
+    def book(self, date_type: str = 'today') -> RaceBook:
+        """日付タイプの RaceBook（未取得ならここでクロールする）"""
+        return self._entry(date_type)['book']
+
+    def refresh(self, date_type: str = 'today') -> RaceBook:
+        """クロールし直して RaceBook を差し替える（差し替えまでは古いデータを返し続ける）"""
+        entry = self._crawl(date_type)
+        self.store.put(('service_book', date_type), entry, ttl=self.book_ttl)
+        return entry['book']
+
+    def _loaded(self) -> Dict[str, Dict]:
+        loaded = {}
+        for date_type in DATE_TYPES:
+            entry = self.store.get(('service_book', date_type))
+            if entry is not None:
+                loaded[date_type] = entry
+        return loaded
+
+    # ── 参照 ──────────────────────────────────────────
+
+    def query(self, path: str, params: Dict[str, str]) -> Tuple[str, bytes]:
+        """
+        1リクエストを処理する（エンコード済みの結果はキャッシュから返す）
+
+        Returns:
+            (Content-Type, 本文)
+
+        Raises:
+            QueryError: パラメータ不正・データなし
+        """
+        if path.rstrip('/') == '/status':
+            return JSON_CONTENT_TYPE, _to_json(self.status())
+
+        entry = self._route_entry(path, params)
+        key = f"{entry['generation']}:{path}?{sorted(params.items())}"
+        cached = self.responses.get(key)
+        if cached is not None:
+            return cached
+        result = self._query(entry['book'], path, params)
+        self.responses.put(key, result)
+        return result
+
+    def _route_entry(self, path: str, params: Dict[str, str]) -> Dict:
+        match = _RACE_PATH_RE.match(path)
+        if match and 'date' not in params:
+            # レースIDだけの指定は読み込み済みの日付から探す
+            for entry in self._loaded().values():
+                if match.group(1) in entry['book']:
+                    return entry
+        return self._entry(resolve_date(params.get('date')))
+
+    def _query(self, book: RaceBook, path: str, params: Dict[str, str]) -> Tuple[str, bytes]:
+        if path.rstrip('/') == '/venues':
+            return JSON_CONTENT_TYPE, _to_json([
+                {'venue': venue, 'races': [{'race_id': race_id, 'race': label} for race_id, label in book.races_of(venue)]}
+                for venue in book.venues
+            ])
+
+        match = _RACE_PATH_RE.match(path)
+        if match:
+            return JSON_CONTENT_TYPE, _to_json(self.race(book, match.group(1), params.get('parts')))
+
+        match = _TABLE_PATH_RE.match(path)
+        if match:
+            name = match.group(1)
+            if name not in TABLE_NAMES:
+                raise QueryError(404, f"不明なテーブル: {name}（{', '.join(TABLE_NAMES)}）")
+            race_id = params.get('race_id')
+            if name == 'odds' and race_id:
+                table = self._odds(book, race_id)
+            else:
+                table = book.table(name, venue=params.get('venue'), race_id=race_id)
+            fmt = params.get('format', 'json')
+            if fmt == 'arrow':
+                return ARROW_CONTENT_TYPE, _to_arrow_stream(table)
+            if fmt != 'json':
+                raise QueryError(400, f"不正な形式: {fmt}（json / arrow）")
+            return JSON_CONTENT_TYPE, _to_json(table.to_pylist())
+
+        raise QueryError(404, f"不明なパス: {path}")
+
+    def race(self, book: RaceBook, race_id: str, parts: Optional[str] = None) -> Dict:
+        """1レース分 {race_id, venue, race, <区分>: 行のリスト}"""
+        if race_id not in book:
+            raise QueryError(404, f"レース {race_id} はありません")
+        names = parts.split(',') if parts else list(TABLE_NAMES)
+        unknown = [n for n in names if n not in TABLE_NAMES]
+        if unknown:
+            raise QueryError(400, f"不明な区分: {', '.join(unknown)}")
+        tables = book.race(race_id)
+        venue, label = book.race_info(race_id)
+        data: Dict = {'race_id': race_id, 'venue': venue, 'race': label}
+        for name in names:
+            table = self._odds(book, race_id) if name == 'odds' else tables.get(name)
+            if table is None or table.num_rows == 0:
+                data[name] = []
+                continue
+            data[name] = table.drop([c for c in KEY_COLUMNS if c in table.column_names]).to_pylist()
+        return data
+
+    def _odds(self, book: RaceBook, race_id: str) -> pa.Table:
+        """オッズ（RaceBook になければそのレースだけ取得する）"""
+        table = book.table('odds', race_id=race_id)
+        if table.num_rows:
+            return table
+        if race_id not in book:
+            raise QueryError(404, f"レース {race_id} はありません")
+        odds = self.scraper.fetch_race(race_id, parts=('odds',))['odds']
+        if odds.empty:
+            return pa.table({})
+        return pa.Table.from_pandas(odds.assign(race_id=race_id)[['race_id'] + list(odds.columns)], preserve_index=False)
+
+    def status(self) -> Dict:
+        dates = {}
+        for date_type, entry in self._loaded().items():
+            book = entry['book']
+            dates[date_type] = {'venues': len(book.venues), 'races': book.num_races,
+                                'size_mb': book.nbytes / 1024 / 1024, 'generation': entry['generation'],
+                                'age_s': time.time() - entry['built_at']}
+        return {'dates': dates, 'responses': {'hits': self.responses.hits, 'misses': self.responses.misses}}
+
+
+class QueryServer:
+    """
+    QueryService をHTTPで配信するサーバー（別スレッドで起動）
+
+    使い方:
+        with QueryServer(QueryService(scraper), port=8780) as server:
+            print(server.url)
+    """
+
+    def __init__(self, service: QueryService, host: str = '127.0.0.1', port: int = 8780,
+                 refresh: Optional[float] = None, date_types: Tuple[str, ...] = ('today',)):
+        """
+        Args:
+            service: 参照サービス
+            host, port: 待ち受けアドレス（port=0 で空きポートを自動選択）
+            refresh: 指定時はこの間隔（秒）で date_types をクロールし直す
+            date_types: 起動時（と refresh ごと）にクロールする日付タイプ
+        """
+        self.service = service
+        self.refresh = refresh
+        self.date_types = tuple(date_types)
+        self.request_count = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._httpd = ThreadingHTTPServer((host, port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self._threads: List[threading.Thread] = []
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with server._lock:
+                    server.request_count += 1
+                parts = urlsplit(self.path)
+                params = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+                try:
+                    content_type, body = server.service.query(unquote(parts.path), params)
+                except QueryError as e:
+                    self._send(e.status, JSON_CONTENT_TYPE, _to_json({'error': str(e)}))
+                    return
+                except Exception as e:
+                    print(f"⚠️ 参照エラー: {self.path} {e}")
+                    self._send(500, JSON_CONTENT_TYPE, _to_json({'error': str(e)}))
+                    return
+                etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+                if self.headers.get('If-None-Match') == etag:
+                    self._send(304, content_type, b'', etag)
+                    return
+                self._send(200, content_type, body, etag)
+
+            def _send(self, status: int, content_type: str, body: bytes, etag: Optional[str] = None):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                if etag:
+                    self.send_header('ETag', etag)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def _warm(self) -> None:
+        for date_type in self.date_types:
+            self.service.book(date_type)
+        while self.refresh and not self._stop.wait(self.refresh):
+            for date_type in self.date_types:
+                try:
+                    self.service.refresh(date_type)
+                except Exception as e:
+                    print(f"⚠️ 再クロールエラー: {date_type} {e}")
+
+    def start(self) -> 'QueryServer':
+        """待ち受けと、起動時のクロール（refresh 指定時は定期クロール）を別スレッドで開始する"""
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=self._httpd.serve_forever, name='kdreams-service', daemon=True),
+            threading.Thread(target=self._warm, name='kdreams-service-crawl', daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> 'QueryServer':
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from kdreams_governor import Governor
+
+    parser = argparse.ArgumentParser(description="クロール済みデータを JSON / Arrow で返すローカルHTTPサービス")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--date", choices=list(DATE_TYPES), action="append",
+                        help="起動時にクロールする日付（複数指定可、既定は today）")
+    parser.add_argument("--refresh", type=float, default=None, help="再クロール間隔（秒）")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--interval", type=float, default=1.0, help="リクエスト間隔（秒）")
+    parser.add_argument("--lock-path", default=None, help="他プロセスとリクエスト予算を共有するロックファイル")
+    parser.add_argument("--base-url", default=None, help="接続先（モックサーバー等）")
+    args = parser.parse_args()
+
+    scraper = KdreamsScraper(rate_limiter=Governor(min_interval=args.interval, lock_path=args.lock_path),
+                             base_url=args.base_url, response_cache=ResponseCache(ttl=300))
+    server = QueryServer(QueryService(scraper, max_workers=args.workers), host=args.host, port=args.port,
+                         refresh=args.refresh, date_types=tuple(args.date or ['today'])).start()
+    print(f"🌐 {server.url} で待ち受け中（Ctrl+C で終了）")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pass
+    server.stop()
@@ -0,0 +1,295 @@
+"""
+データソースの切り替え（フェイルオーバー・ヘッジ）
+開催場一覧と1レース分の出走表・ライン・結果を、サイトに依存しない ID（開催ID 14桁・レースID 16桁）と
+共通のスキーマ（KdreamsScraper と同じ DataFrame / 辞書）で返す「ソース」を複数並べ、
+遅い・エラーになる・空を返すソースを避けて取得する。
+
+  - フェイルオーバー: ソースがエラーか空の結果を返したら、すぐ次のソースに切り替える
+  - ヘッジ: 最初のソースが hedge_after 秒以内に返らなければ、次のソースにも同時に要求して早い方を使う
+  - 遮断: 連続 failure_threshold 回失敗したソースは cooldown 秒のあいだ後回しにする
+
+ソースは Source を継承して races() / race() を実装すれば追加できる。KdreamsSource は KdreamsScraper を
+そのまま使うソースで、base_url を変えればミラーやローカルの代替サーバー（kdreams_mock_server）を指せる。
+
+使い方:
+    primary = KdreamsSource(KdreamsScraper(), name="kdreams")
+    mirror = KdreamsSource(KdreamsScraper(base_url="http://mirror.local"), name="mirror")
+    source = FailoverSource([primary, mirror], hedge_after=1.0)
+    venues = source.races("today")
+    data = source.race(race_ids(venues[0]['kaisai_id'])[0], parts=('card', 'lines'))
+"""
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+
+from kdreams_governor import with_context
+from kdreams_parser import RESULT_COLUMNS
+from kdreams_scraper import KdreamsScraper
+
+
+SOURCE_PARTS = ('card', 'lines', 'results')
+
+_KAISAI_RE = re.compile(r'/(?:racecard|raceresult|racedetail)/(\d{14})')
+
+
+class SourceError(Exception):
+    """ソースから使える結果が得られなかった（エラー・空の結果）"""
+
+
+def race_ids(kaisai_id: str, races: int = 12) -> List[str]:
+    """開催ID（14桁）→ 1R〜races R のレースID（16桁）"""
+    return [f"{kaisai_id}{race_no:02d}" for race_no in range(1, races + 1)]
+
+
+def conform(data: Dict, parts: Sequence[str]) -> Dict:
+    """ソースの結果を共通スキーマにそろえる（ない区分は空、結果は RESULT_COLUMNS の列順）"""
+    out = {'race_id': data.get('race_id', ''), 'source': data.get('source', '')}
+    for part in parts:
+        value = data.get(part)
+        if part == 'lines':
+            out[part] = list(value or [])
+        elif part == 'results':
+            value = value if isinstance(value, pd.DataFrame) else pd.DataFrame()
+            extra = [c for c in value.columns if c not in RESULT_COLUMNS]
+            out[part] = value.reindex(columns=RESULT_COLUMNS + extra)
+        else:
+            out[part] = value if isinstance(value, pd.DataFrame) else pd.DataFrame()
+    return out
+
+
+class Source:
+    """
+    データソースの基底クラス
+
+    races() と race() を実装する。使える結果がない場合（通信エラー・解析結果が空）は SourceError を送出する。
+    """
+
+    name = 'source'
+
+    def races(self, date_type: str = 'today') -> List[Dict]:
+        """
+        開催場一覧（KdreamsScraper.get_races() と同じ形式 + "kaisai_id"）
+
+        "url" はソース固有なので、ソースをまたいで使うのは kaisai_id だけにする。
+        """
+        raise NotImplementedError
+
+    def race(self, race_id: str, parts: Sequence[str] = SOURCE_PARTS) -> Dict:
+        """1レース分 {"race_id", "card": DataFrame, "lines": List[Dict], "results": DataFrame}"""
+        raise NotImplementedError
+
+
+class KdreamsSource(Source):
+    """KdreamsScraper を使うソース（base_url でミラー・代替サーバーも指せる）"""
+
+    def __init__(self, scraper: Optional[KdreamsScraper] = None, name: Optional[str] = None):
+        self.scraper = scraper or KdreamsScraper()
+        self.name = name or self.scraper.BASE_URL
+
+    def races(self, date_type: str = 'today') -> List[Dict]:
+        venues = self.scraper.get_races(date_type)
+        if not venues:
+            raise SourceError(f"{self.name}: 開催場一覧が空です")
+        for venue in venues:
+            match = _KAISAI_RE.search(venue['url'])
+            venue['kaisai_id'] = match.group(1) if match else ''
+            # スラッグと場コードを覚えておく（race_id だけで race() できるようにする）
+            self.scraper.venue_registry.learn_from_url(venue['url'])
+        return venues
+
+    def race(self, race_id: str, parts: Sequence[str] = SOURCE_PARTS) -> Dict:
+        try:
+            data = self.scraper.fetch_race(race_id, parts)
+        except ValueError as e:
+            raise SourceError(f"{self.name}: {e}")
+        if all(len(data.get(part, [])) == 0 for part in parts):
+            raise SourceError(f"{self.name}: {race_id} の {', '.join(parts)} が空です")
+        data['source'] = self.name
+        return conform(data, parts)
+
+
+class _Health:
+    """1ソースの成績（呼び出し元でロックする）"""
+
+    __slots__ = ('latency', 'calls', 'failures', 'consecutive', 'down_until', 'served')
+
+    def __init__(self):
+        self.latency: Optional[float] = None
+        self.calls = 0
+        self.failures = 0
+        self.consecutive = 0
+        self.down_until = 0.0
+        self.served = 0
+
+
+class FailoverSource(Source):
+    """
+    複数のソースを優先順に使い、失敗・遅延時に切り替えるソース（スレッドセーフ）
+
+    優先順は「遮断中でない → 平均応答時間が slow_after 以下 → 指定順」。
+    """
+
+    name = 'failover'
+
+    def __init__(self, sources: Sequence[Source], hedge_after: Optional[float] = 1.0,
+                 failure_threshold: int = 3, cooldown: float = 30.0, slow_after: Optional[float] = None,
+                 max_workers: int = 8):
+        """
+        Args:
+            sources: 優先順のソース
+            hedge_after: この秒数で応答がなければ次のソースにも要求する（None ならヘッジしない）
+            failure_threshold: 連続してこの回数失敗したソースを遮断する
+            cooldown: 遮断する秒数
+            slow_after: 平均応答時間（指数移動平均）がこの秒数を超えたソースを後回しにする（None なら速度で並べ替えない）
+            max_workers: 同時に実行する要求数の上限
+        """
+        if not sources:
+            raise ValueError("ソースが指定されていません")
+        self.sources = list(sources)
+        self.hedge_after = hedge_after
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.slow_after = slow_after
+        self._lock = threading.Lock()
+        self._health: Dict[int, _Health] = {id(s): _Health() for s in self.sources}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='kdreams-source')
+        self.hedged = 0
+        self.failovers = 0
+
+    def races(self, date_type: str = 'today') -> List[Dict]:
+        return self._call(lambda source: source.races(date_type))
+
+    def race(self, race_id: str, parts: Sequence[str] = SOURCE_PARTS) -> Dict:
+        return self._call(lambda source: source.race(race_id, parts))
+
+    # ── 振り分け ──────────────────────────────────────
+
+    def _order(self) -> List[Source]:
+        now = time.monotonic()
+        with self._lock:
+            def rank(item):
+                index, source = item
+                health = self._health[id(source)]
+                down = health.down_until > now
+                slow = (self.slow_after is not None and health.latency is not None
+                        and health.latency > self.slow_after)
+                return (down, slow, index)
+            return [source for _, source in sorted(enumerate(self.sources), key=rank)]
+
+    def _run(self, source: Source, fn: Callable):
+        start = time.monotonic()
+        try:
+            result = fn(source)
+        except Exception:
+            with self._lock:
+                health = self._health[id(source)]
+                health.calls += 1
+                health.failures += 1
+                health.consecutive += 1
+                if health.consecutive >= self.failure_threshold:
+                    health.down_until = time.monotonic() + self.cooldown
+            raise
+        elapsed = time.monotonic() - start
+        with self._lock:
+            health = self._health[id(source)]
+            health.calls += 1
+            health.consecutive = 0
+            health.down_until = 0.0
+            health.latency = elapsed if health.latency is None else 0.8 * health.latency + 0.2 * elapsed
+        return result
+
+    def _call(self, fn: Callable):
+        remaining = self._order()
+        running: Dict = {}
+        errors: List[str] = []
+
+        def launch():
+            source = remaining.pop(0)
+            running[self._executor.submit(with_context(self._run), source, fn)] = source
+
+        launch()
+        while running:
+            timeout = self.hedge_after if remaining and self.hedge_after is not None else None
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                # 応答が遅い: 先に出した要求は待ち続けたまま、次のソースにも要求する
+                with self._lock:
+                    self.hedged += 1
+                launch()
+                continue
+            for future in done:
+                source = running.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(f"{source.name}: {e}")
+                    continue
+                with self._lock:
+                    self._health[id(source)].served += 1
+                return result
+            if remaining:
+                # 失敗したら待たずに次のソースへ
+                with self._lock:
+                    self.failovers += 1
+                launch()
+        raise SourceError("すべてのソースで失敗しました（" + " / ".join(errors) + "）")
+
+    def stats(self) -> List[Dict]:
+        """ソースごとの 応答時間（指数移動平均）・呼び出し数・失敗数・採用数・遮断状態"""
+        now = time.monotonic()
+        with self._lock:
+            return [{
+                'name': source.name,
+                'latency_s': self._health[id(source)].latency,
+                'calls': self._health[id(source)].calls,
+                'failures': self._health[id(source)].failures,
+                'served': self._health[id(source)].served,
+                'down': self._health[id(source)].down_until > now,
+            } for source in self.sources]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    import argparse
+    import contextlib
+    import io
+
+    from kdreams_mock_server import MockKdreamsServer
+    from kdreams_scraper import RateLimiter
+
+    parser = argparse.ArgumentParser(description="2つのローカル代替サーバーでフェイルオーバー・ヘッジを試す")
+    parser.add_argument("--primary-latency", type=float, default=0.0)
+    parser.add_argument("--primary-error-rate", type=float, default=0.3)
+    parser.add_argument("--secondary-latency", type=float, default=0.05)
+    parser.add_argument("--hedge-after", type=float, default=0.5)
+    parser.add_argument("--slow-after", type=float, default=0.5)
+    parser.add_argument("--venues", type=int, default=2)
+    args = parser.parse_args()
+
+    with MockKdreamsServer(venues=args.venues, latency=args.primary_latency, error_rate=args.primary_error_rate) as primary_server, \
+            MockKdreamsServer(venues=args.venues, latency=args.secondary_latency) as secondary_server:
+        sources = [KdreamsSource(KdreamsScraper(rate_limiter=RateLimiter(0.0), base_url=server.url), name=name)
+                   for name, server in (('primary', primary_server), ('secondary', secondary_server))]
+        source = FailoverSource(sources, hedge_after=args.hedge_after, slow_after=args.slow_after)
+        start = time.time()
+        with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+            venues = source.races('today')
+        served = {}
+        for venue in venues:
+            for race_id in race_ids(venue['kaisai_id']):
+                with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                    data = source.race(race_id, ('card', 'lines'))
+                served[data['source']] = served.get(data['source'], 0) + 1
+        print(f"✅ {sum(served.values())}レース取得 ({time.time() - start:.1f}秒) 取得元: {served}")
+        print(f"   ヘッジ {source.hedged}回 / フェイルオーバー {source.failovers}回")
+        for row in source.stats():
+            latency = f"{row['latency_s']:.3f}秒" if row['latency_s'] is not None else "-"
+            print(f"   {row['name']}: 応答 {latency} 呼び出し {row['calls']} 失敗 {row['failures']} "
+                  f"採用 {row['served']}{' 遮断中' if row['down'] else ''}")
+        source.close()
@@ -0,0 +1,191 @@
+"""
+プロセス共有データストア
+取得済みの開催場一覧・一括取得データ・レースデータをキーで共有する、サイズ上限付きのLRUキャッシュ。
+Streamlitでは st.cache_resource で1プロセスに1つだけ作り、各セッションはキーだけを保持する。
+同じ開催場を見ている複数ユーザーは同じ1つのデータを参照する。
+"""
+import itertools
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+
+
+def estimate_size(value: Any) -> int:
+    """値のおおよそのメモリ使用量（バイト）"""
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(deep=True))
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    # Arrow テーブル・RaceBook など、自身のバッファサイズを持つもの
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(value)
+
+
+# 登録のたびに増える世代番号（同じキーに登録し直したかどうかの判定用）
+_generations = itertools.count(1)
+
+
+class _Entry:
+    __slots__ = ('value', 'size', 'expires', 'created', 'generation')
+
+    def __init__(self, value: Any, size: int, expires: Optional[float]):
+        self.value = value
+        self.size = size
+        self.expires = expires
+        self.created = time.time()
+        self.generation = next(_generations)
+
+
+class DataStore:
+    """
+    サイズ上限付きLRUストア（スレッドセーフ）
+
+    合計サイズが max_bytes を超えると、最も長く参照されていないエントリから削除する。
+    エントリごとに有効期限（ttl秒）を指定でき、期限切れは未登録と同じに扱う。
+    """
+
+    def __init__(self, max_bytes: int = 512 * 1024 * 1024,
+                 on_remove: Optional[Callable[[Hashable, Any], None]] = None):
+        """
+        Args:
+            max_bytes: 合計サイズの上限
+            on_remove: エントリを削除したとき（追い出し・期限切れ・置き換え・discard・clear）に
+                       (キー, 値) で呼ぶ関数（一時ファイルの後始末など）
+        """
+        self.max_bytes = max_bytes
+        self.on_remove = on_remove
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[Hashable, _Entry]' = OrderedDict()
+        self._fetch_locks: Dict[Hashable, threading.Lock] = {}
+        self._total = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Optional[Hashable]) -> Any:
+        """値を返す（未登録・期限切れ・削除済みなら None）"""
+        return self.lookup(key)[0]
+
+    def lookup(self, key: Optional[Hashable]) -> Tuple[Any, Optional[int]]:
+        """
+        値と世代番号を返す（未登録・期限切れ・削除済みなら (None, None)）
+
+        世代番号は登録のたびに変わるので、値から作った派生データ（RaceBook・ZIPなど）のキーに含めると、
+        期限切れで取得し直した後に古い派生データを使い続けることがない。
+        """
+        if key is None:
+            return None, None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or (entry.expires is not None and entry.expires < time.time()):
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None, None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry.value, entry.generation
+
+    def put(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> Hashable:
+        """値を登録してキーを返す"""
+        size = estimate_size(value)
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._purge_expired()
+            self._entries[key] = _Entry(value, size, expires)
+            self._total += size
+            self._evict()
+        return key
+
+    def get_or_fetch(self, key: Hashable, fetch: Callable[[], Any], ttl: Optional[float] = None) -> Any:
+        """
+        登録済みならその値を、なければ fetch() の結果を登録して返す
+
+        同じキーを複数セッションが同時に要求しても fetch() は1回だけ実行される。
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(key, threading.Lock())
+        with fetch_lock:
+            value = self.get(key)
+            if value is None:
+                value = fetch()
+                self.put(key, value, ttl=ttl)
+        with self._lock:
+            self._fetch_locks.pop(key, None)
+        return value
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            for key in list(self._entries):
+                self._remove(key)
+            self._total = 0
+
+    def _remove(self, key: Hashable) -> None:
+        entry = self._entries.pop(key)
+        self._total -= entry.size
+        if self.on_remove is not None:
+            try:
+                self.on_remove(key, entry.value)
+            except Exception as e:
+                print(f"⚠️ ストアの削除処理エラー ({key}): {e}")
+
+    def _purge_expired(self) -> None:
+        # 参照されないまま期限切れになったエントリも削除する（on_remove の後始末を遅らせない）
+        now = time.time()
+        for key in [k for k, e in self._entries.items() if e.expires is not None and e.expires < now]:
+            self._remove(key)
+
+    def _evict(self) -> None:
+        # 直前に登録したエントリ（末尾）は上限を超えていても残す
+        while self._total > self.max_bytes and len(self._entries) > 1:
+            key = next(iter(self._entries))
+            self._remove(key)
+            self.evictions += 1
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key) is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total
+
+    def memory_report(self) -> Dict:
+        """メモリ使用状況（合計・上限・ヒット率・エントリごとのサイズ）"""
+        with self._lock:
+            entries = [{'key': str(key), 'size_mb': entry.size / 1024 / 1024,
+                        'age_s': time.time() - entry.created}
+                       for key, entry in reversed(self._entries.items())]
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'total_mb': self._total / 1024 / 1024,
+                'max_mb': self.max_bytes / 1024 / 1024,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'items': entries,
+            }
@@ -0,0 +1,347 @@
+"""
+競輪場レジストリ
+stadium_code_mapping.json（全43場の場名・URLスラッグ・netkeirinコード・Kドリームス場コード）を1回だけ読み込み、
+場名・スラッグ・コードのいずれからでも引けるメモリ上の索引にする。
+トップページを取得しなくても (競輪場, 日付, 開催日目) から開催ID・各ページのURLを組み立てられる。
+
+Kドリームスの場コード（開催IDの先頭2桁）はJKA/netkeirinのコードとは一致しないため、
+確認済みのもの以外は null にしてあり、実際のURLを見たときに learn_from_url() で覚える。
+本番サイトのURLから覚えた場コードは学習ファイル（stadium_code_learned.json）に自動で保存し、次回起動時に読み込む。
+`python kdreams_venues.py learn` でトップページ（本日・前日）の開催場から覚えて stadium_code_mapping.json に書き込める。
+
+レジストリにないスラッグのURLを見た場合も、場コード → スラッグの対応だけは覚えて race_url_for_id() に使う。
+"""
+import json
+import os
+import re
+import threading
+import time
+from datetime import date, datetime
+from typing import Callable, Dict, List, Optional, Union
+
+from kdreams_parser import BASE_URL
+
+
+REGISTRY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stadium_code_mapping.json')
+LEARNED_PATH = os.environ.get('KDREAMS_VENUES_LEARNED',
+                              os.path.join(os.path.dirname(os.path.abspath(__file__)), 'stadium_code_learned.json'))
+REGISTRY_VERSION = 2
+
+_URL_RE = re.compile(r'/([a-z]+)/(racecard|raceresult|racedetail)/(\d{2})\d*/')
+
+DateLike = Union[date, datetime, str]
+
+# 場コードが不明なときにトップページから覚え直す間隔の下限（秒）
+LEARN_RETRY_INTERVAL = 600.0
+
+
+def _to_date(day: DateLike) -> date:
+    """date / datetime / 'YYYYMMDD' / 'YYYY-MM-DD' を date にする"""
+    if isinstance(day, datetime):
+        return day.date()
+    if isinstance(day, date):
+        return day
+    return datetime.strptime(str(day).replace('-', ''), '%Y%m%d').date()
+
+
+def kaisai_id(kdreams_code: str, day: DateLike, nth_day: int) -> str:
+    """開催ID（14桁）= 場コード2桁 + 日付8桁 + 開催日目2桁 + 00"""
+    return f"{kdreams_code}{_to_date(day):%Y%m%d}{nth_day:02d}00"
+
+
+class VenueRegistry:
+    """
+    競輪場の索引（スレッドセーフ）
+
+    各競輪場は {"venue_name", "slug", "prefecture", "netkeirin_code", "kdreams_code"} の辞書。
+    """
+
+    def __init__(self, path: Optional[str] = REGISTRY_PATH, learned_path: Optional[str] = None):
+        """
+        Args:
+            path: レジストリのJSONファイル（None なら空の索引）
+            learned_path: 学習した場コードの保存先（指定時は起動時に読み込み、本番サイトのURLから覚えるたびに保存する）
+        """
+        self.path = path
+        self.learned_path = learned_path
+        self.version = REGISTRY_VERSION
+        self._lock = threading.Lock()
+        self._venues: List[Dict] = []
+        self._by_name: Dict[str, Dict] = {}
+        self._by_slug: Dict[str, Dict] = {}
+        self._by_kdreams: Dict[str, Dict] = {}
+        self._by_netkeirin: Dict[str, Dict] = {}
+        # レジストリにないスラッグのURLで見た 場コード → スラッグ
+        self._observed: Dict[str, str] = {}
+        # 学習ファイルに保存する分（本番サイトのURLから覚えたもの）: {"codes": {スラッグ: 場コード}, "observed": {場コード: スラッグ}}
+        self._learned: Dict[str, Dict[str, str]] = {'codes': {}, 'observed': {}}
+        self.learned = 0
+        self._learn_lock = threading.Lock()
+        self._learn_attempted: Optional[float] = None
+        if path and os.path.exists(path):
+            self._load(path)
+        if learned_path and os.path.exists(learned_path):
+            self._load_learned(learned_path)
+
+    def _load(self, path: str) -> None:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        if 'venues' in data:
+            self.version = data.get('version', REGISTRY_VERSION)
+            venues = data['venues']
+        else:
+            # 旧形式: {"85": {"venue_name": "奈良", "netkeirin_code": "53"}}（キーがKドリームス場コード）
+            self.version = 1
+            venues = [{'kdreams_code': code, **info} for code, info in data.items()]
+        for venue in venues:
+            self._add(dict(venue))
+
+    def _load_learned(self, path: str) -> None:
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"⚠️ 学習済み場コードの読み込みエラー: {e}")
+            return
+        self._learned['codes'].update(data.get('codes', {}))
+        self._learned['observed'].update(data.get('observed', {}))
+        for slug, code in data.get('codes', {}).items():
+            venue = self._by_slug.get(slug)
+            if venue is not None and not venue['kdreams_code']:
+                venue['kdreams_code'] = code
+                self._by_kdreams[code] = venue
+        for code, slug in data.get('observed', {}).items():
+            self._observed.setdefault(code, slug)
+
+    def _save_learned(self) -> None:
+        # 他のプロセスが保存した分と合わせて書き出す（呼び出し元でロックする）
+        data = {'codes': {}, 'observed': {}}
+        if os.path.exists(self.learned_path):
+            try:
+                with open(self.learned_path, encoding='utf-8') as f:
+                    data.update(json.load(f))
+            except (OSError, ValueError):
+                pass
+        data['codes'].update(self._learned['codes'])
+        data['observed'].update(self._learned['observed'])
+        tmp_path = f"{self.learned_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False, indent=4, sort_keys=True)
+                f.write('\n')
+            os.replace(tmp_path, self.learned_path)
+        except OSError as e:
+            print(f"⚠️ 学習済み場コードの保存エラー: {e}")
+
+    def _add(self, venue: Dict) -> None:
+        venue.setdefault('slug', None)
+        venue.setdefault('kdreams_code', None)
+        venue.setdefault('netkeirin_code', None)
+        existing = self._by_name.get(venue['venue_name'])
+        if existing is not None:
+            existing.update({k: v for k, v in venue.items() if v is not None})
+            venue = existing
+        else:
+            self._venues.append(venue)
+        self._by_name[venue['venue_name']] = venue
+        if venue['slug']:
+            self._by_slug[venue['slug']] = venue
+        if venue['kdreams_code']:
+            self._by_kdreams[venue['kdreams_code']] = venue
+        if venue['netkeirin_code']:
+            self._by_netkeirin[venue['netkeirin_code']] = venue
+
+    # ── 参照 ──────────────────────────────────────────
+
+    def get(self, key: str) -> Optional[Dict]:
+        """場名・スラッグ・Kドリームス場コードのいずれかで引く（見つからなければ None）"""
+        key = str(key)
+        with self._lock:
+            return self._by_name.get(key) or self._by_slug.get(key) or self._by_kdreams.get(key)
+
+    def by_kdreams_code(self, code: str) -> Optional[Dict]:
+        with self._lock:
+            return self._by_kdreams.get(str(code)[:2])
+
+    def by_netkeirin_code(self, code: str) -> Optional[Dict]:
+        with self._lock:
+            return self._by_netkeirin.get(str(code))
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            return [dict(v) for v in self._venues]
+
+    def __len__(self) -> int:
+        return len(self._venues)
+
+    def missing(self) -> List[str]:
+        """Kドリームス場コードが未登録の競輪場名"""
+        with self._lock:
+            return [v['venue_name'] for v in self._venues if not v['kdreams_code']]
+
+    def require(self, key: str, learn: Optional[Callable[[], object]] = None) -> Dict:
+        """
+        get() と同じだが、見つからない・場コード不明なら ValueError
+
+        Args:
+            learn: 場コードが不明なときに呼ぶ関数（トップページを取得して learn_from_url() で覚える。
+                   呼ぶのは LEARN_RETRY_INTERVAL 秒に1回まで）
+        """
+        venue = self.get(key)
+        if venue is None:
+            raise ValueError(f"不明な競輪場: {key}")
+        if (not venue['kdreams_code'] or not venue['slug']) and self._learn(learn):
+            venue = self.get(key)
+        if not venue['kdreams_code'] or not venue['slug']:
+            raise ValueError(f"{venue['venue_name']} のKドリームス場コードが未登録です"
+                             f"（本日・前日に開催がある場はトップページから覚えます。"
+                             f"python kdreams_venues.py learn で書き込めます）")
+        return venue
+
+    def _learn(self, learn: Optional[Callable[[], object]]) -> bool:
+        """learn() を呼んで場コードを覚え直す（前回から LEARN_RETRY_INTERVAL 秒以内なら呼ばない）。呼んだら True"""
+        if learn is None:
+            return False
+        with self._learn_lock:
+            now = time.monotonic()
+            if self._learn_attempted is not None and now - self._learn_attempted < LEARN_RETRY_INTERVAL:
+                return False
+            self._learn_attempted = now
+            try:
+                learn()
+            except Exception as e:
+                print(f"⚠️ 場コードの学習エラー: {e}")
+            return True
+
+    # ── 学習 ──────────────────────────────────────────
+
+    def learn_from_url(self, url: str) -> Optional[Dict]:
+        """
+        racecard / raceresult / racedetail のURLからスラッグと場コードの対応を覚える
+
+        スラッグが未登録でも 場コード → スラッグ は覚え、race_url_for_id() で使う。
+        本番サイト（BASE_URL）のURLから新しく覚えたものは learned_path に保存する
+        （モックサーバー等のURLから覚えたものはメモリ上だけ）。
+
+        Returns:
+            対応する競輪場（スラッグが未登録なら None）
+        """
+        m = _URL_RE.search(url)
+        if not m:
+            return None
+        slug, _, code = m.groups()
+        persist = bool(self.learned_path) and url.startswith(BASE_URL)
+        with self._lock:
+            venue = self._by_slug.get(slug)
+            if venue is None:
+                self._observed[code] = slug
+                if persist and self._learned['observed'].get(code) != slug:
+                    self._learned['observed'][code] = slug
+                    self._save_learned()
+                return None
+            if venue['kdreams_code'] != code:
+                if venue['kdreams_code']:
+                    print(f"⚠️ 場コードの不一致: {venue['venue_name']} 登録={venue['kdreams_code']} URL={code}")
+                venue['kdreams_code'] = code
+                self._by_kdreams[code] = venue
+                self.learned += 1
+            if persist and self._learned['codes'].get(slug) != code:
+                self._learned['codes'][slug] = code
+                self._save_learned()
+            return venue
+
+    def save(self, path: Optional[str] = None) -> str:
+        """学習した場コードを含めてJSONに書き出す"""
+        path = path or self.path
+        with self._lock:
+            data = {
+                'version': REGISTRY_VERSION,
+                'updated': date.today().isoformat(),
+                'venues': [dict(v) for v in self._venues],
+            }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=4)
+            f.write('\n')
+        os.replace(tmp_path, path)
+        return path
+
+    # ── URL ───────────────────────────────────────────
+
+    # learn は require() と同じ（場コードが不明ならトップページから覚え直す関数）
+
+    def kaisai_id(self, venue: str, day: DateLike, nth_day: int, learn: Optional[Callable[[], object]] = None) -> str:
+        """(競輪場, 日付, 開催日目) → 開催ID"""
+        return kaisai_id(self.require(venue, learn)['kdreams_code'], day, nth_day)
+
+    def racecard_url(self, venue: str, day: DateLike, nth_day: int, base_url: str = BASE_URL,
+                     learn: Optional[Callable[[], object]] = None) -> str:
+        info = self.require(venue, learn)
+        return f"{base_url.rstrip('/')}/{info['slug']}/racecard/{kaisai_id(info['kdreams_code'], day, nth_day)}/"
+
+    def raceresult_url(self, venue: str, day: DateLike, nth_day: int, base_url: str = BASE_URL,
+                       learn: Optional[Callable[[], object]] = None) -> str:
+        info = self.require(venue, learn)
+        return f"{base_url.rstrip('/')}/{info['slug']}/raceresult/{kaisai_id(info['kdreams_code'], day, nth_day)}/"
+
+    def racedetail_url(self, venue: str, day: DateLike, nth_day: int, race_no: int, base_url: str = BASE_URL,
+                       learn: Optional[Callable[[], object]] = None) -> str:
+        info = self.require(venue, learn)
+        race_id = f"{kaisai_id(info['kdreams_code'], day, nth_day)}{race_no:02d}"
+        return f"{base_url.rstrip('/')}/{info['slug']}/racedetail/{race_id}/"
+
+    def _slug_for_code(self, code: str) -> Optional[str]:
+        venue = self.by_kdreams_code(code)
+        if venue is not None and venue['slug']:
+            return venue['slug']
+        with self._lock:
+            return self._observed.get(str(code)[:2])
+
+    def race_url_for_id(self, race_id: str, base_url: str = BASE_URL,
+                        learn: Optional[Callable[[], object]] = None) -> str:
+        """レースID（16桁）→ racedetail のURL（レジストリにない場は、URLで見たスラッグを使う）"""
+        slug = self._slug_for_code(race_id)
+        if not slug and self._learn(learn):
+            slug = self._slug_for_code(race_id)
+        if not slug:
+            raise ValueError(f"場コード {str(race_id)[:2]} の競輪場が不明です（本日・前日に開催がある場はトップページから覚えます）")
+        return f"{base_url.rstrip('/')}/{slug}/racedetail/{race_id}/"
+
+
+_registry: Optional[VenueRegistry] = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> VenueRegistry:
+    """プロセスで共有するレジストリ（初回呼び出し時に1回だけ読み込む）"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = VenueRegistry(learned_path=LEARNED_PATH)
+        return _registry
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="競輪場レジストリ（Kドリームス場コードの確認・学習）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="登録内容と未登録の場コードを表示する")
+    p_learn = sub.add_parser("learn", help="トップページ（本日・前日）の開催場から場コードを覚えて書き込む")
+    p_learn.add_argument("--output", default=REGISTRY_PATH, help="書き込み先（省略時は stadium_code_mapping.json）")
+    args = parser.parse_args()
+
+    registry = get_registry()
+    if args.command == "learn":
+        from kdreams_scraper import KdreamsScraper
+
+        before = set(registry.missing())
+        KdreamsScraper(venue_registry=registry).get_venue_index(('today', 'yesterday'))
+        learned = sorted(before - set(registry.missing()))
+        registry.save(args.output)
+        print(f"✅ {len(learned)}場の場コードを覚えました: {', '.join(learned) or '-'} → {args.output}")
+    for venue in registry.all():
+        print(f"  {venue['venue_name']:<5} {venue['slug'] or '-':<12} Kドリームス={venue['kdreams_code'] or '未登録'}"
+              f" netkeirin={venue['netkeirin_code'] or '-'}")
+    missing = registry.missing()
+    print(f"未登録 {len(missing)}場" + (f": {', '.join(missing)}" if missing else ""))
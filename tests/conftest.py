@@ -0,0 +1,44 @@
+"""
+テスト共通のフィクスチャ
+リポジトリ直下の kdreams_*.py を読み込めるようにし、ローカルのモックサーバー（kdreams_mock_server）と
+そこに向けたスクレイパーを用意する。
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from kdreams_memo import ParseMemo  # noqa: E402
+from kdreams_mock_server import MockKdreamsServer  # noqa: E402
+from kdreams_scraper import KdreamsScraper, RateLimiter, SingleFlight  # noqa: E402
+from kdreams_venues import VenueRegistry  # noqa: E402
+
+
+@pytest.fixture
+def mock_server():
+    """2開催場（各12レース）のモックサーバー"""
+    with MockKdreamsServer(venues=2) as server:
+        yield server
+
+
+@pytest.fixture
+def make_scraper():
+    """
+    モックサーバーに向けたスクレイパーを作る関数
+
+    解析メモ・同時取得の集約・競輪場レジストリはテストごとに新しく作り、プロセス共有のものを使わない。
+    """
+    def _make(server, **kwargs):
+        kwargs.setdefault('rate_limiter', RateLimiter(0.0))
+        kwargs.setdefault('parse_memo', ParseMemo())
+        kwargs.setdefault('single_flight', SingleFlight())
+        kwargs.setdefault('venue_registry', VenueRegistry())
+        return KdreamsScraper(base_url=server.url, **kwargs)
+    return _make
+
+
+@pytest.fixture
+def scraper(mock_server, make_scraper):
+    return make_scraper(mock_server)
@@ -0,0 +1,76 @@
+"""kdreams_export の Parquet 書き出し（StreamingExporter / ParquetSink）の往復"""
+import os
+
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+from kdreams_export import ParquetSink, StreamingExporter, export_book
+from kdreams_racebook import RaceBookBuilder
+
+
+@pytest.fixture
+def crawled(mock_server, scraper):
+    """モックサーバーの本日の全レースを RaceBook にしたもの"""
+    venues = scraper.get_races('today')
+    builder = RaceBookBuilder()
+    scraper.crawl(venues, builder)
+    return scraper, venues, builder.build()
+
+
+def _sorted(df: pd.DataFrame, keys) -> pd.DataFrame:
+    return df.sort_values(keys, kind='stable').reset_index(drop=True)
+
+
+def test_parquet_sink_round_trip(crawled, tmp_path):
+    scraper, venues, book = crawled
+    with ParquetSink(str(tmp_path), flush_rows=50) as sink:
+        scraper.crawl(venues, sink)
+    assert sink.row_groups > 1
+
+    cards = pq.read_table(sink.path('race_cards')).to_pandas()
+    assert list(cards.columns[:2]) == ['開催場', 'レース']
+    expected = book.to_pandas('card', drop_keys=True)
+    keys = ['開催場', 'レース', '車番']
+    pd.testing.assert_frame_equal(_sorted(cards, keys), _sorted(expected[cards.columns], keys), check_dtype=False)
+    assert sink.rows_written['results_list'] == book.table('results').num_rows
+
+
+def test_streaming_exporter_parquet_per_venue(crawled, tmp_path):
+    scraper, venues, book = crawled
+    with StreamingExporter(str(tmp_path), fmt='parquet') as exporter:
+        scraper.crawl(venues, exporter)
+    for venue in book.venues:
+        cards = pq.read_table(os.path.join(tmp_path, venue, '出走表.parquet')).to_pandas()
+        assert len(cards) == book.table('card', venue=venue).num_rows
+        assert set(cards['レース']) == {label for _, label in book.races_of(venue)}
+
+
+def test_export_book_csv_zip(crawled, tmp_path):
+    _, _, book = crawled
+    path = export_book(book, str(tmp_path / 'book.zip'), fmt='csv')
+    import zipfile
+    with zipfile.ZipFile(path) as zf:
+        names = zf.namelist()
+    assert sorted(names) == sorted(f"{venue}/{table}.csv" for venue in book.venues
+                                   for table in ('出走表', 'ライン情報', 'レース結果'))
+
+
+def test_all_null_column_then_values(tmp_path):
+    with StreamingExporter(str(tmp_path), fmt='parquet') as exporter:
+        exporter.write('race_cards', pd.DataFrame({'車番': [1, 2], 'メモ': [None, None]}))
+        exporter.write('race_cards', pd.DataFrame({'車番': [3], 'メモ': [1.5]}))
+        exporter.write('race_cards', pd.DataFrame({'車番': [4], 'メモ': ['先行']}))
+    table = pq.read_table(os.path.join(tmp_path, '出走表.parquet'))
+    assert str(table.schema.field('メモ').type) == 'string'
+    assert table.column('メモ').to_pylist() == [None, None, '1.5', '先行']
+
+
+def test_unknown_columns_are_reported(tmp_path, capsys):
+    with ParquetSink(str(tmp_path), flush_rows=1) as sink:
+        sink.write('race_cards', pd.DataFrame({'車番': [1]}))
+        sink.write('race_cards', pd.DataFrame({'車番': [2], '追加': ['x']}))
+        sink.write('race_cards', pd.DataFrame({'車番': [3], '追加': ['y']}))
+    out = capsys.readouterr().out
+    assert out.count('スキーマにない列') == 1 and '追加' in out
+    assert pq.read_table(sink.path('race_cards')).column('車番').to_pylist() == [1, 2, 3]
@@ -0,0 +1,55 @@
+"""kdreams_formation のライン構成の配列表現（符号化・復元・出走表との結合）"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from kdreams_formation import (MAX_BIBS, decode, encode, encode_batch, from_lines_frame, join_to_cards,
+                               line_sizes, to_text)
+
+LINES = [{'line': 1, 'bibs': [7, 1, 3]}, {'line': 2, 'bibs': [2, 6]}, {'line': 3, 'bibs': [4]}]
+
+
+def test_encode_decode_round_trip():
+    row = encode(LINES)
+    assert row.dtype == np.int8 and row.shape == (MAX_BIBS,)
+    assert row[7 - 1] == 11 and row[3 - 1] == 13 and row[5 - 1] == 0
+    assert decode(row) == LINES
+    assert to_text(row) == '7-1-3 / 2-6 / 4'
+    assert line_sizes(row).tolist() == [3, 2, 3, 1, 0, 2, 3, 0, 0]
+
+
+def test_mock_race_lines_round_trip(mock_server, scraper):
+    races = [race_id for _, race_id in mock_server.site.race_ids('today')[:6]]
+    lines = [scraper.fetch_race(race_id, ('lines',))['lines'] for race_id in races]
+    formations = encode_batch(lines)
+    assert formations.shape == (len(races), MAX_BIBS)
+    for row, race_lines in zip(formations, lines):
+        assert decode(row) == [{'line': ln['line'], 'bibs': ln['bibs']} for ln in race_lines]
+
+
+def test_from_lines_frame_and_join(mock_server, scraper):
+    bulk = scraper.get_all_venues_data('today', max_workers=4)
+    races, formations = from_lines_frame(bulk['lines_list'])
+    assert len(races) == len(mock_server.site.race_ids('today'))
+
+    cards = join_to_cards(bulk['race_cards'], races, formations)
+    assert len(cards) == len(bulk['race_cards'])
+    # 各選手のライン番号・ライン内位置が lines_list の '7-1-3' と一致する
+    for (venue, race, line_no), bibs in bulk['lines_list'].set_index(['開催場', 'レース', 'ライン番号'])['車番'].items():
+        for pos, bib in enumerate(str(bibs).split('-'), 1):
+            row = cards[(cards['開催場'] == venue) & (cards['レース'] == race) & (cards['車番'] == int(bib))]
+            assert row[['ライン番号', 'ライン内位置']].values.tolist() == [[line_no, pos]]
+
+
+def test_join_without_lines_keeps_zero():
+    lines = pd.DataFrame({'開催場': ['平塚'], 'レース': ['1R'], 'ライン番号': [1], '車番': ['1-2']})
+    races, formations = from_lines_frame(lines)
+    cards = pd.DataFrame({'開催場': ['平塚', '平塚', '奈良'], 'レース': ['1R', '1R', '1R'], '車番': [2, 3, 1]})
+    joined = join_to_cards(cards, races, formations)
+    assert joined[['ライン番号', 'ライン内位置']].values.tolist() == [[1, 2], [0, 0], [0, 0]]
+
+
+def test_join_without_race_keys_raises():
+    races, formations = from_lines_frame(pd.DataFrame())
+    with pytest.raises(ValueError):
+        join_to_cards(pd.DataFrame({'車番': [1]}), races, formations)
@@ -0,0 +1,83 @@
+"""kdreams_governor.Governor の割り当て順（優先度・クライアント間のラウンドロビン）"""
+import threading
+import time
+
+import pytest
+
+from kdreams_governor import Governor, request_context
+
+
+def _grant_order(governor, requests):
+    """
+    送信枠をふさいだ状態で requests [(クライアント, 優先度)] の順に待たせ、割り当てられた順を返す
+    """
+    governor.acquire_for('warmup')
+    order, lock = [], threading.Lock()
+
+    def wait_for(client, priority):
+        governor.acquire_for(client, priority)
+        with lock:
+            order.append((client, priority))
+
+    threads = []
+    for client, priority in requests:
+        waiting = sum(governor.stats()['waiting'].values())
+        thread = threading.Thread(target=wait_for, args=(client, priority))
+        thread.start()
+        threads.append(thread)
+        # 並ぶ順番を固定するため、待ち行列に入るまで次を出さない
+        while sum(governor.stats()['waiting'].values()) == waiting:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join(timeout=10)
+    return order
+
+
+def test_higher_priority_first():
+    governor = Governor(min_interval=0.2)
+    order = _grant_order(governor, [('a', 'background'), ('b', 'bulk'), ('c', 'interactive')])
+    assert order == [('c', 'interactive'), ('b', 'bulk'), ('a', 'background')]
+
+
+def test_round_robin_between_clients():
+    governor = Governor(min_interval=0.2)
+    order = _grant_order(governor, [('a', 'bulk'), ('a', 'bulk'), ('a', 'bulk'), ('b', 'bulk')])
+    # a が先に3件並んでいても、b は a の2件目より先に割り当てられる
+    assert [client for client, _ in order] == ['a', 'b', 'a', 'a']
+
+
+def test_stats_record_grants():
+    governor = Governor(min_interval=0.0)
+    with request_context(client='s1', priority='bulk'):
+        governor.acquire()
+    stats = governor.stats()
+    assert stats['priorities']['bulk']['granted'] == 1
+    assert stats['clients']['s1/bulk']['granted'] == 1
+    assert sum(stats['waiting'].values()) == 0
+
+
+def test_client_stats_are_bounded():
+    governor = Governor(min_interval=0.0, max_clients=3)
+    for no in range(10):
+        governor.acquire_for(f"client{no}")
+    assert list(governor.stats()['clients']) == ['client7/interactive', 'client8/interactive', 'client9/interactive']
+
+
+def test_unknown_priority():
+    with pytest.raises(ValueError):
+        Governor(min_interval=0.0).acquire_for('a', 'urgent')
+
+
+def test_failed_wait_leaves_no_ticket():
+    governor = Governor(min_interval=0.0)
+    reserve = governor._reserve
+
+    def broken(now):
+        raise OSError('lock file')
+    governor._reserve = broken
+    with pytest.raises(OSError):
+        governor.acquire_for('a')
+    assert sum(governor.stats()['waiting'].values()) == 0
+    # 後続のリクエストは詰まらない
+    governor._reserve = reserve
+    governor.acquire_for('b')
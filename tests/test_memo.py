@@ -0,0 +1,69 @@
+"""kdreams_memo.ParseMemo の再利用（ヒット）と変更検出"""
+import pandas as pd
+
+from kdreams_memo import ParseMemo
+
+URL = 'http://example.test/hiratsuka/racedetail/3520260101020001/'
+
+
+def _parser(calls):
+    def parse(body: bytes) -> pd.DataFrame:
+        calls.append(body)
+        return pd.DataFrame({'車番': [int(c) for c in body.decode().split(',') if c]})
+    return parse
+
+
+def test_same_body_is_parsed_once():
+    memo, calls = ParseMemo(), []
+    first = memo.parse(URL, 'card', b'1,2,3', _parser(calls))
+    second = memo.parse(URL, 'card', b'1,2,3', _parser(calls))
+    assert len(calls) == 1
+    assert memo.stats()['hits'] == 1 and memo.stats()['misses'] == 1
+    pd.testing.assert_frame_equal(first, second)
+    # 返すのはコピーなので、書き換えてもメモは変わらない
+    second['車番'] = 0
+    assert memo.parse(URL, 'card', b'1,2,3', _parser(calls))['車番'].tolist() == [1, 2, 3]
+
+
+def test_change_events():
+    memo = ParseMemo()
+    parse = _parser([])
+    memo.parse(URL, 'card', b'1,2,3', parse)
+    events, cursor = memo.poll_changes()
+    assert [(str(e['race_id']), e['section'], e['kind']) for e in events] == [('3520260101020001', 'card', 'new')]
+
+    # 本文は変わったが解析結果が同じ（末尾の区切りだけ違う）ならイベントなし
+    memo.parse(URL, 'card', b'1,2,3,', parse)
+    assert memo.poll_changes(cursor) == ([], cursor)
+
+    memo.parse(URL, 'card', b'1,2,4', parse)
+    events, cursor = memo.poll_changes(cursor)
+    assert [e['kind'] for e in events] == ['changed']
+    assert memo.poll_changes(cursor, sections=('lines',)) == ([], cursor)
+
+
+def test_entries_are_bounded():
+    memo = ParseMemo(max_entries=2, max_urls=2)
+    parse = _parser([])
+    for no in range(1, 5):
+        memo.parse(f"{URL[:-3]}{no:02d}/", 'card', str(no).encode(), parse)
+    stats = memo.stats()
+    assert stats['entries'] == 2 and stats['urls'] == 2
+
+
+def test_scraper_reuses_parse_for_unchanged_page(mock_server, scraper):
+    race_id = mock_server.site.race_ids('today')[0][1]
+    memo = scraper.parse_memo
+    first = scraper.fetch_race(race_id, ('card',))
+    misses = memo.stats()['misses']
+    second = scraper.fetch_race(race_id, ('card',))
+    assert memo.stats()['misses'] == misses
+    assert memo.stats()['hits'] >= 1
+    pd.testing.assert_frame_equal(first['card'], second['card'])
+
+    # サイトの内容が変わったら解析し直して変更イベントを出す
+    _, cursor = scraper.poll_changes(0)
+    mock_server.site.seed += 1
+    scraper.fetch_race(race_id, ('card',))
+    events, _ = scraper.poll_changes(cursor)
+    assert [(str(e['race_id']), e['kind']) for e in events] == [(race_id, 'changed')]
@@ -0,0 +1,101 @@
+"""kdreams_queue.JobQueue の貸し出し・リース切れ・失敗・再試行と、Worker によるモックサーバーからの取得"""
+import time
+
+import pyarrow.parquet as pq
+import pytest
+
+from kdreams_export import ParquetSink
+from kdreams_queue import JobQueue, Worker
+
+
+def _jobs(n):
+    return [{'race_id': f"35202601010200{no:02d}", 'url': '', 'venue_name': '平塚'} for no in range(1, n + 1)]
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / 'queue.db'), max_attempts=2, retry_delay=0.0)
+
+
+def test_enqueue_ignores_duplicates(queue):
+    assert queue.enqueue(_jobs(3)) == 3
+    assert queue.enqueue(_jobs(5)) == 2
+    assert queue.stats()['pending'] == 5
+
+
+def test_lease_is_exclusive_until_expiry(queue):
+    queue.enqueue(_jobs(3))
+    leased = queue.lease('a', limit=2, lease_seconds=0.2)
+    assert [job['race_id'] for job in leased] == [job['race_id'] for job in _jobs(2)]
+    assert all(job['attempts'] == 1 for job in leased)
+    # 貸し出し中のジョブは他のワーカーに貸さない
+    assert [job['race_id'] for job in queue.lease('b', limit=5)] == [_jobs(3)[2]['race_id']]
+    time.sleep(0.3)
+    # リース切れは別のワーカーが取り直す
+    retaken = queue.lease('b', limit=5)
+    assert sorted(job['race_id'] for job in retaken) == [job['race_id'] for job in leased]
+    assert all(job['attempts'] == 2 for job in retaken)
+
+
+def test_extend_keeps_lease(queue):
+    queue.enqueue(_jobs(1))
+    leased = queue.lease('a', limit=1, lease_seconds=0.2)
+    queue.extend([leased[0]['race_id']], 'a', lease_seconds=60)
+    time.sleep(0.3)
+    assert queue.lease('b', limit=1) == []
+
+
+def test_fail_then_retry(queue):
+    queue.enqueue(_jobs(1))
+    race_id = queue.lease('a', limit=1)[0]['race_id']
+    # 試行回数が残っていれば未着手に戻る
+    assert queue.fail(race_id, 'a', 'boom') is False
+    assert queue.stats()['pending'] == 1
+    assert queue.lease('a', limit=1)[0]['attempts'] == 2
+    # 使い切ったら failed
+    assert queue.fail(race_id, 'a', 'boom') is True
+    assert queue.stats()['failed'] == 1
+    assert queue.lease('a', limit=1) == []
+    assert queue.next_available() is None
+    assert queue.retry_failed() == 1
+    assert queue.lease('a', limit=1)[0]['attempts'] == 1
+
+
+def test_fail_by_other_owner_is_ignored(queue):
+    queue.enqueue(_jobs(1))
+    race_id = queue.lease('a', limit=1)[0]['race_id']
+    assert queue.fail(race_id, 'b', 'boom') is False
+    assert queue.stats()['leased'] == 1
+
+
+def test_expired_lease_past_max_attempts_fails(queue):
+    queue.enqueue(_jobs(1))
+    for _ in range(2):
+        queue.lease('a', limit=1, lease_seconds=0.05)
+        time.sleep(0.1)
+    assert queue.lease('a', limit=1) == []
+    assert queue.stats()['failed'] == 1
+
+
+def test_complete(queue):
+    queue.enqueue(_jobs(2))
+    leased = queue.lease('a', limit=2)
+    assert queue.complete([job['race_id'] for job in leased], 'a') == 2
+    assert queue.complete([job['race_id'] for job in leased], 'a') == 0
+    assert queue.stats()['done'] == 2
+
+
+def test_worker_crawls_mock_server(queue, mock_server, scraper, tmp_path):
+    kaisai_id = mock_server.site.kaisai_ids('today')[0][2]
+    count, rejected = queue.enqueue_ids(scraper, [kaisai_id, 'abc'])
+    assert count == 12
+    assert len(rejected) == 1
+
+    with ParquetSink(str(tmp_path / 'out')) as sink:
+        worker = Worker(queue, scraper, sink, owner='w1', batch=5, lease_seconds=30)
+        assert worker.run() == 12
+    stats = queue.stats()
+    assert stats['done'] == 12 and stats['pending'] == 0 and stats['leased'] == 0
+    cards = pq.read_table(sink.path('race_cards')).to_pandas()
+    assert cards['開催場'].nunique() == 1
+    assert len(cards) == 12 * mock_server.site.riders
@@ -0,0 +1,65 @@
+"""kdreams_racebook.RaceBook の作成・参照・一括取得データとの往復"""
+import pandas as pd
+import pytest
+
+from kdreams_racebook import RaceBook, RaceBookBuilder
+
+
+@pytest.fixture
+def bulk(mock_server, scraper):
+    """モックサーバーの本日の全開催場の一括取得データ"""
+    return scraper.get_all_venues_data('today', max_workers=4)
+
+
+def test_builder_matches_site(mock_server, scraper):
+    venues = scraper.get_races('today')
+    builder = RaceBookBuilder()
+    scraper.crawl(venues, builder)
+    book = builder.build()
+
+    site_races = [race_id for _, race_id in mock_server.site.race_ids('today')]
+    assert sorted(book.race_ids) == sorted(site_races)
+    # 開催場は開催場一覧の順（名前の文字コード順ではない）
+    assert book.venues == [venue['velodrome'] for venue in venues]
+    race_id = site_races[0]
+    race = book.race(race_id)
+    assert race['card'].num_rows == mock_server.site.riders
+    assert set(race['card'].column('race_id').to_pylist()) == {race_id}
+    assert book.race_info(race_id) == (venues[0]['velodrome'], '1R')
+
+
+def test_slices_are_contiguous(bulk):
+    book = RaceBook.from_bulk(bulk)
+    total = 0
+    for venue, tables in book.iter_venues():
+        card = tables['card']
+        assert set(card.column('開催場').to_pylist()) == {venue}
+        total += card.num_rows
+        for race_id, label in book.races_of(venue):
+            assert set(book.table('card', race_id=race_id).column('レース').to_pylist()) == {label}
+    assert total == book.table('card').num_rows
+    assert book.table('card', venue='存在しない').num_rows == 0
+    with pytest.raises(ValueError):
+        book.table('unknown')
+
+
+def test_bulk_round_trip(bulk):
+    book = RaceBook.from_bulk(bulk)
+    again = book.to_bulk()
+    for key in ('race_cards', 'lines_list', 'results_list'):
+        original = bulk[key]
+        restored = again[key][original.columns]
+        keys = [c for c in ('開催場', 'レース', '車番', 'ライン番号') if c in original.columns]
+        pd.testing.assert_frame_equal(original.sort_values(keys).reset_index(drop=True),
+                                      restored.sort_values(keys).reset_index(drop=True), check_dtype=False)
+    # to_bulk() から作り直しても同じ内容
+    rebuilt = RaceBook.from_bulk(again)
+    assert rebuilt.race_ids == book.race_ids
+    assert rebuilt.table('card').equals(book.table('card'))
+
+
+def test_venue_order_from_bulk():
+    cards = pd.DataFrame({'開催場': ['平塚', '奈良', '小倉'], 'レース': ['1R'] * 3, '車番': [1, 2, 3]})
+    book = RaceBook.from_bulk({'race_cards': cards, 'venue_name': '全開催場'})
+    assert book.venues == ['平塚', '奈良', '小倉']
+    assert 'venue_order' not in book.table('card').column_names
@@ -0,0 +1,112 @@
+"""kdreams_sources.FailoverSource のフェイルオーバー・ヘッジ・遮断"""
+import pytest
+
+from kdreams_mock_server import MockKdreamsServer
+from kdreams_sources import FailoverSource, KdreamsSource, SourceError, race_ids
+
+
+@pytest.fixture
+def servers():
+    """(primary, secondary) の作成関数。作ったサーバーはテスト後に止める"""
+    started = []
+
+    def _make(primary_kwargs, secondary_kwargs=None):
+        for kwargs in (primary_kwargs, secondary_kwargs or {}):
+            started.append(MockKdreamsServer(venues=1, **kwargs).start())
+        return started[-2], started[-1]
+    yield _make
+    for server in started:
+        server.stop()
+
+
+def _failover(make_scraper, primary, secondary, **kwargs):
+    sources = [KdreamsSource(make_scraper(primary), name='primary'),
+               KdreamsSource(make_scraper(secondary), name='secondary')]
+    return FailoverSource(sources, **kwargs)
+
+
+def _first_race_id(server) -> str:
+    return server.site.race_ids('today')[0][1]
+
+
+def test_healthy_primary_serves(servers, make_scraper):
+    primary, secondary = servers({})
+    source = _failover(make_scraper, primary, secondary, hedge_after=None)
+    try:
+        venues = source.races('today')
+        data = source.race(race_ids(venues[0]['kaisai_id'])[0], ('card', 'lines'))
+    finally:
+        source.close()
+    assert data['source'] == 'primary'
+    assert not data['card'].empty
+    assert secondary.request_count == 0
+    assert source.failovers == 0
+
+
+def test_failover_on_errors(servers, make_scraper):
+    primary, secondary = servers({'error_rate': 1.0})
+    source = _failover(make_scraper, primary, secondary, hedge_after=None)
+    try:
+        data = source.race(_first_race_id(secondary), ('card', 'lines'))
+    finally:
+        source.close()
+    assert data['source'] == 'secondary'
+    assert source.failovers == 1
+    primary_stats, secondary_stats = source.stats()
+    assert primary_stats['failures'] == 1
+    assert secondary_stats['served'] == 1
+
+
+def test_all_sources_failing_raises(servers, make_scraper):
+    primary, secondary = servers({'error_rate': 1.0}, {'error_rate': 1.0})
+    source = _failover(make_scraper, primary, secondary, hedge_after=None)
+    try:
+        with pytest.raises(SourceError):
+            source.race(_first_race_id(primary), ('card',))
+    finally:
+        source.close()
+
+
+def test_hedge_to_faster_source(servers, make_scraper):
+    primary, secondary = servers({'latency': 0.5})
+    source = _failover(make_scraper, primary, secondary, hedge_after=0.05)
+    try:
+        data = source.race(_first_race_id(secondary), ('card', 'lines'))
+    finally:
+        source.close()
+    assert data['source'] == 'secondary'
+    assert source.hedged >= 1
+    assert source.failovers == 0
+
+
+def test_cooldown_skips_failing_source(servers, make_scraper):
+    primary, secondary = servers({'error_rate': 1.0})
+    source = _failover(make_scraper, primary, secondary, hedge_after=None, failure_threshold=2, cooldown=60.0)
+    race_id = _first_race_id(secondary)
+    try:
+        for _ in range(2):
+            assert source.race(race_id, ('card',))['source'] == 'secondary'
+        assert source.stats()[0]['down']
+        calls = source.stats()[0]['calls']
+        # 遮断中は primary を後回しにするので、secondary が成功すれば primary には要求しない
+        assert source.race(race_id, ('card',))['source'] == 'secondary'
+        assert source.stats()[0]['calls'] == calls
+    finally:
+        source.close()
+
+
+def test_cooldown_expires(servers, make_scraper):
+    primary, secondary = servers({})
+    source = _failover(make_scraper, primary, secondary, hedge_after=None, failure_threshold=1, cooldown=0.0)
+    race_id = _first_race_id(secondary)
+    try:
+        # 場コードは止まる前に覚えておく（学習の再試行は間隔を空けるため）
+        source.sources[0].scraper.learn_venues()
+        primary.error_rate = 1.0
+        source.race(race_id, ('card',))
+        # 遮断時間が過ぎたら primary を先頭に戻す
+        assert not source.stats()[0]['down']
+        primary.error_rate = 0.0
+        assert source.race(race_id, ('card',))['source'] == 'primary'
+    finally:
+        source.close()
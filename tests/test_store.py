@@ -0,0 +1,86 @@
+"""kdreams_store.DataStore のLRU追い出し・有効期限・世代番号"""
+import threading
+import time
+
+from kdreams_store import DataStore, estimate_size
+
+BLOCK = b'x' * 1000
+SIZE = estimate_size(BLOCK)
+
+
+def test_lru_evicts_least_recently_used():
+    removed = []
+    store = DataStore(max_bytes=SIZE * 2, on_remove=lambda key, value: removed.append(key))
+    store.put('a', BLOCK)
+    store.put('b', BLOCK)
+    # a を参照したので、次に追い出されるのは b
+    assert store.get('a') is BLOCK
+    store.put('c', BLOCK)
+    assert 'b' not in store
+    assert 'a' in store and 'c' in store
+    assert removed == ['b']
+    assert store.evictions == 1
+    assert store.total_bytes == SIZE * 2
+
+
+def test_oversized_entry_is_kept_alone():
+    store = DataStore(max_bytes=SIZE // 2)
+    store.put('a', BLOCK)
+    store.put('b', BLOCK)
+    assert len(store) == 1
+    assert store.get('b') is BLOCK
+
+
+def test_ttl_expiry():
+    removed = []
+    store = DataStore(on_remove=lambda key, value: removed.append(key))
+    store.put('short', BLOCK, ttl=0.05)
+    store.put('long', BLOCK, ttl=60)
+    assert store.get('short') is BLOCK
+    time.sleep(0.1)
+    assert store.lookup('short') == (None, None)
+    assert store.get('long') is BLOCK
+    assert removed == ['short']
+    assert store.total_bytes == SIZE
+
+
+def test_expired_entries_are_purged_on_put():
+    removed = []
+    store = DataStore(on_remove=lambda key, value: removed.append(key))
+    store.put('short', BLOCK, ttl=0.05)
+    time.sleep(0.1)
+    store.put('other', BLOCK)
+    assert removed == ['short']
+    assert len(store) == 1
+
+
+def test_generation_changes_on_put():
+    store = DataStore()
+    store.put('k', 1)
+    _, first = store.lookup('k')
+    assert store.lookup('k')[1] == first
+    store.put('k', 2)
+    value, second = store.lookup('k')
+    assert value == 2 and second != first
+
+
+def test_get_or_fetch_runs_fetch_once():
+    store = DataStore()
+    calls = []
+    started = threading.Barrier(4)
+
+    def fetch():
+        calls.append(1)
+        time.sleep(0.05)
+        return BLOCK
+
+    def worker():
+        started.wait()
+        assert store.get_or_fetch('k', fetch) is BLOCK
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(calls) == 1
@@ -0,0 +1,36 @@
+"""kdreams_venues.VenueRegistry の場コード・URL組み立てと、トップページからの学習"""
+from datetime import date
+
+import pytest
+
+from kdreams_venues import VenueRegistry
+
+
+def test_known_code_builds_urls():
+    registry = VenueRegistry()
+    assert registry.kaisai_id('奈良', date(2026, 10, 19), 2) == '85202610190200'
+    url = registry.racedetail_url('奈良', '20261019', 2, 5, base_url='http://example.test')
+    assert url == 'http://example.test/nara/racedetail/8520261019020005/'
+
+
+def test_unknown_venue():
+    with pytest.raises(ValueError):
+        VenueRegistry().require('存在しない競輪場')
+
+
+def test_missing_code_is_learned_once(mock_server, scraper):
+    # モックの平塚の場コードはレジストリにないので、最初の1回だけトップページから覚える
+    assert scraper.venue_registry.get('平塚')['kdreams_code'] in (None, '')
+    url = scraper.venue_url('平塚', mock_server.site.today, 2)
+    assert url == f"{mock_server.url}/hiratsuka/racecard/{mock_server.site.kaisai_ids('today')[0][2]}/"
+    requests = mock_server.request_count
+    assert requests == 1
+
+    race_id = mock_server.site.race_ids('today')[-1][1]
+    assert scraper.race_url_for(race_id).endswith(f"/racedetail/{race_id}/")
+    assert mock_server.request_count == requests
+
+    # 一覧にない場は覚えられない（直前に覚え直したばかりなので、トップページは取り直さない）
+    with pytest.raises(ValueError):
+        scraper.venue_url('函館', mock_server.site.today, 1)
+    assert mock_server.request_count == requests